@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Per-endpoint throughput and latency percentiles for backend_api on a
+synthetic dataset (setup_demo_data.py), through two drivers:
+
+    testclient  Flask's test client in this process, one request at a time:
+                handler and SQL cost without any network or server overhead
+    http        a real server (werkzeug or asgi, as in bench_serving.py)
+                driven by --concurrency keep-alive client processes
+
+Each endpoint runs on its own for --duration seconds after a short warm-up,
+with ids drawn at random from the dataset. The JSON report (--json) holds
+the environment, the dataset and one row per (driver, endpoint); pass a
+previous report as --compare to flag endpoints whose p95 grew, or whose
+throughput fell, by more than --threshold, with a non-zero exit status.
+
+    python benchmarks/bench_api.py [--users 20000] [--db existing.db] [--drivers testclient,http]
+                                   [--server werkzeug] [--endpoints feed,search] [--duration 5]
+                                   [--concurrency 8] [--json out.json] [--compare base.json]
+"""
+
+import argparse
+import datetime
+import http.client
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_serving import free_port, percentile, start_server
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+BACKEND = os.path.join(ROOT, 'src', 'backend')
+sys.path.insert(0, ROOT)
+
+import setup_demo_data  # noqa: E402
+import tournament_app_db  # noqa: E402
+
+# name: (method, path, body); {user}, {other}, {tournament}, {discussion} and {word} are drawn per request
+ENDPOINTS = {
+    'health': ('GET', '/api/health', None),
+    'tournaments': ('GET', '/api/tournaments?limit=50', None),
+    'participants': ('GET', '/api/tournaments/{tournament}/participants?limit=100', None),
+    'matches': ('GET', '/api/tournaments/{tournament}/matches?limit=50', None),
+    'standings': ('GET', '/api/tournaments/{tournament}/standings?limit=50', None),
+    'discussions': ('GET', '/api/tournaments/{tournament}/discussions?limit=50', None),
+    'replies': ('GET', '/api/discussions/{discussion}/replies?limit=50', None),
+    'users': ('GET', '/api/users?limit=50', None),
+    'connections': ('GET', '/api/users/{user}/connections?limit=20', None),
+    'feed': ('GET', '/api/users/{user}/feed?limit=20', None),
+    'recommendations': ('GET', '/api/users/{user}/recommendations', None),
+    'notifications': ('GET', '/api/users/{user}/notifications?limit=20', None),
+    'leaderboard': ('GET', '/api/leaderboard?limit=50', None),
+    'ratings': ('GET', '/api/ratings?limit=50', None),
+    'search': ('GET', '/api/search?q={word}', None),
+    'follow': ('POST', '/api/users/follow', {'follower_id': '{user}', 'following_id': '{other}'}),
+    'create_post': ('POST', '/api/posts', {'user_id': '{user}', 'content': 'benchmark post {word}'}),
+    'create_reply': ('POST', '/api/discussions/{discussion}/replies',
+                     {'authorName': 'user{user}', 'content': 'benchmark reply {word}'}),
+}
+
+# Background jobs would compete with the measured requests
+SERVER_ENV = {'LOG_LEVEL': 'WARNING', 'COUNTER_RECONCILE_SECONDS': '0', 'FEED_TRIM_SECONDS': '0',
+              'GRAPH_REFRESH_SECONDS': '0'}
+WARMUP_SECONDS = 0.5
+
+
+def make_request(name, rng, size):
+    """(method, path, JSON body or None) for one request to endpoint `name`"""
+    method, path, body = ENDPOINTS[name]
+    values = {
+        'user': rng.randint(1, size['users']),
+        'other': rng.randint(1, size['users']),
+        'tournament': rng.randint(1, size['tournaments']),
+        'discussion': rng.randint(1, size['discussions']),
+        'word': rng.choice(setup_demo_data.WORDS)[:rng.randint(2, 5)],
+    }
+    if body is not None:
+        body = {key: (int(value.format(**values)) if value.startswith('{') and value.endswith('}')
+                      else value.format(**values)) for key, value in body.items()}
+    return method, path.format(**values), body
+
+
+def create_database(path, n_users, seed, log=print):
+    """A fresh database seeded with n_users; returns the rows written per table"""
+    conn = sqlite3.connect(path)
+    # A throwaway file: no crash safety needed
+    conn.execute('PRAGMA journal_mode = OFF')
+    tournament_app_db.migrate(conn)
+    counts = setup_demo_data.seed(conn, n_users, seed, log=log)
+    conn.close()
+    return counts
+
+
+def summarize(driver, name, latencies, errors, seconds):
+    latencies.sort()
+    return {
+        'driver': driver,
+        'endpoint': name,
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / seconds, 1) if seconds else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3) if latencies else 0.0,
+    }
+
+
+# Test client
+
+def run_testclient(database, names, size, args):
+    os.environ.update(SERVER_ENV, DATABASE=database)
+    sys.path.insert(0, BACKEND)
+    import backend_api
+
+    client = backend_api.app.test_client()
+    rng = random.Random(args.seed)
+    results = []
+    for name in names:
+        for duration, record in ((WARMUP_SECONDS, False), (args.duration, True)):
+            latencies, errors = [], 0
+            started = time.perf_counter()
+            deadline = started + duration
+            while time.perf_counter() < deadline:
+                method, path, body = make_request(name, rng, size)
+                sent = time.perf_counter()
+                response = client.open(path, method=method, json=body)
+                response.get_data()
+                latencies.append(time.perf_counter() - sent)
+                errors += response.status_code >= 500
+            if record:
+                results.append(summarize('testclient', name, latencies, errors, time.perf_counter() - started))
+        report_line(results[-1])
+    backend_api.notifier.stop()
+    return results
+
+
+# HTTP
+
+def http_client(task):
+    port, name, size, duration, seed = task
+    rng = random.Random(seed)
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        method, path, body = make_request(name, rng, size)
+        payload = json.dumps(body).encode() if body is not None else None
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        started = time.perf_counter()
+        try:
+            connection.request(method, path, payload, headers)
+            response = connection.getresponse()
+            response.read()
+            errors += response.status >= 500
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            connection.close()
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - started)
+    connection.close()
+    return latencies, errors
+
+
+def run_http(database, names, size, args):
+    os.environ.update(SERVER_ENV)
+    port = free_port()
+    server = start_server(args.server, port, database, args.workers)
+    results = []
+    try:
+        with multiprocessing.Pool(args.concurrency) as pool:
+            for index, name in enumerate(names):
+                seeds = [args.seed + 1000 * index + i for i in range(args.concurrency)]
+                pool.map(http_client, [(port, name, size, WARMUP_SECONDS, seed) for seed in seeds])
+                started = time.perf_counter()
+                outcomes = pool.map(http_client, [(port, name, size, args.duration, seed) for seed in seeds])
+                seconds = time.perf_counter() - started
+                latencies = [value for values, _ in outcomes for value in values]
+                results.append(summarize(f'http-{args.server}', name, latencies,
+                                         sum(errors for _, errors in outcomes), seconds))
+                report_line(results[-1])
+    finally:
+        server.terminate()
+        server.wait()
+    return results
+
+
+# Report
+
+def report_line(result):
+    print(f"{result['driver']:<15} {result['endpoint']:<16} {result['rps']:>9.1f} req/s  "
+          f"p50 {result['p50_ms']:>8.2f}  p95 {result['p95_ms']:>8.2f}  p99 {result['p99_ms']:>8.2f} ms  "
+          f"errors {result['errors']}")
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare(results, baseline_path, threshold):
+    """Print changes against a previous report; returns the regressed (driver, endpoint) pairs"""
+    with open(baseline_path) as f:
+        baseline = {(row['driver'], row['endpoint']): row for row in json.load(f)['results']}
+    regressions = []
+    print(f'\nAgainst {baseline_path} (threshold {threshold:.0%}):')
+    for result in results:
+        before = baseline.get((result['driver'], result['endpoint']))
+        if before is None or not before['rps'] or not before['p95_ms']:
+            continue
+        rps_change = result['rps'] / before['rps'] - 1
+        p95_change = result['p95_ms'] / before['p95_ms'] - 1
+        regressed = rps_change < -threshold or p95_change > threshold
+        if regressed:
+            regressions.append((result['driver'], result['endpoint']))
+        print(f"{result['driver']:<15} {result['endpoint']:<16} req/s {rps_change:+7.1%}  "
+              f"p95 {p95_change:+7.1%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--users', type=int, default=20_000, help='dataset size when --db is not given')
+    parser.add_argument('--db', help='benchmark a copy of this database instead of generating one')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--drivers', default='testclient,http')
+    parser.add_argument('--server', choices=('werkzeug', 'asgi'), default='werkzeug')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS))
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--json', help='write the report to this file')
+    parser.add_argument('--compare', help='a previous --json report to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.2)
+    args = parser.parse_args()
+
+    names = args.endpoints.split(',')
+    unknown = [name for name in names if name not in ENDPOINTS]
+    if unknown:
+        sys.exit(f"unknown endpoint(s): {', '.join(unknown)}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = os.path.join(tmp, 'bench.db')
+        if args.db:
+            shutil.copyfile(args.db, database)
+        else:
+            create_database(database, args.users, args.seed)
+        conn = sqlite3.connect(database)
+        size = {table: conn.execute(f'SELECT MAX(id) FROM {source}').fetchone()[0] or 1 for table, source in (
+            ('users', 'users'), ('tournaments', 'tournaments'), ('discussions', 'tournament_discussions'))}
+        rows = {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0] for table in (
+            'users', 'tournaments', 'user_connections', 'social_posts', 'match_results', 'discussion_replies')}
+        conn.close()
+
+        results = []
+        # Drivers each get a fresh copy: the write endpoints change the data
+        for driver in args.drivers.split(','):
+            copy = os.path.join(tmp, f'{driver}.db')
+            shutil.copyfile(database, copy)
+            if driver == 'testclient':
+                results += run_testclient(copy, names, size, args)
+            elif driver == 'http':
+                results += run_http(copy, names, size, args)
+            else:
+                sys.exit(f'unknown driver: {driver}')
+
+    report = {
+        'environment': environment(),
+        'dataset': {'source': args.db or f'setup_demo_data --users {args.users} --seed {args.seed}', 'rows': rows},
+        'settings': {'duration': args.duration, 'concurrency': args.concurrency, 'server': args.server,
+                     'workers': args.workers},
+        'results': results,
+    }
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
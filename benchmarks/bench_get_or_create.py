@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Multi-threaded load test for resolving usernames in the write handlers.
+
+Compares the old SELECT + generate_unique_email + INSERT sequence with
+users.get_or_create_user (with and without the username cache). Each worker
+thread has its own connection and commits after every lookup, like a
+request would. Reports throughput, errors and duplicate rows.
+
+    python benchmarks/bench_get_or_create.py [--threads 8] [--ops 2000]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'src', 'backend'))
+
+import tournament_app_db  # noqa: E402
+import users  # noqa: E402
+
+
+def legacy_get_or_create(conn, username):
+    """The sequence the handlers used to inline"""
+    user = conn.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone()
+    if user:
+        return user[0]
+    email = f'{username}@example.com'
+    if conn.execute('SELECT id FROM users WHERE email = ?', (email,)).fetchone():
+        email = f'{username}_{int(time.time())}@example.com'
+        if conn.execute('SELECT id FROM users WHERE email = ?', (email,)).fetchone():
+            email = f'{username}_{int(time.time())}_{random.randint(1000, 9999)}@example.com'
+    cursor = conn.execute('INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)',
+                          (username, email, 'demo_hash'))
+    return cursor.lastrowid
+
+
+def new_get_or_create(conn, username):
+    user_id, created = users.get_or_create_user(conn, username)
+    return user_id
+
+
+def connect(path):
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute('PRAGMA busy_timeout = 30000')
+    return conn
+
+
+def run(path, resolve, names, threads, ops, seed):
+    errors = []
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        conn = connect(path)
+        barrier.wait()
+        for _ in range(ops):
+            try:
+                resolve(conn, rng.choice(names))
+                conn.commit()
+            except sqlite3.Error as e:
+                conn.rollback()
+                errors.append(type(e).__name__ + ': ' + str(e))
+        conn.close()
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return threads * ops / elapsed, errors
+
+
+def fresh_database(directory, name, existing):
+    path = os.path.join(directory, name)
+    conn = sqlite3.connect(path)
+    tournament_app_db.migrate(conn)
+    conn.executemany('INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)',
+                     ((n, f'{n}@example.com', 'x') for n in existing))
+    conn.commit()
+    conn.close()
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--ops', type=int, default=2000, help='lookups per thread')
+    parser.add_argument('--names', type=int, default=5000, help='distinct usernames requested')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    names = [f'player{i}' for i in range(args.names)]
+    existing = names[::2]  # half the names already exist
+    directory = tempfile.mkdtemp()
+
+    variants = [
+        ('legacy select/probe/insert', legacy_get_or_create, None),
+        ('get_or_create_user, no cache', new_get_or_create, 0),
+        ('get_or_create_user, cached', new_get_or_create, 10000),
+    ]
+    for label, resolve, cache_size in variants:
+        users.username_cache.clear()
+        if cache_size is not None:
+            users.username_cache.maxsize = cache_size
+        path = fresh_database(directory, label.replace(' ', '_').replace('/', '_') + '.db', existing)
+        throughput, errors = run(path, resolve, names, args.threads, args.ops, args.seed)
+
+        conn = sqlite3.connect(path)
+        total = conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+        conn.close()
+        print(f"{label:32} {throughput:10.0f} ops/s  errors {len(errors):5}  users {total}")
+        for message in sorted(set(errors))[:3]:
+            print(f"    {message}")
+
+
+if __name__ == '__main__':
+    main()
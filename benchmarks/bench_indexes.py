@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Query plans and latencies for the backend's hot lookups, before and after the
+index migration, on a seeded database (~1M rows by default).
+
+    python benchmarks/bench_indexes.py [--scale 1.0] [--db path] [--runs 50]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import tournament_app_db  # noqa: E402
+
+# Same statements the handlers in src/backend/backend_api.py run
+QUERIES = [
+    ('user by username',
+     'SELECT id FROM users WHERE username = ?',
+     lambda r, n: (f"user{r.randrange(n['users'])}",)),
+    ('participant duplicate check',
+     'SELECT id FROM tournament_participants WHERE tournament_id = ? AND user_id = ?',
+     lambda r, n: (r.randrange(1, n['tournaments'] + 1), r.randrange(1, n['users'] + 1))),
+    ('participants list',
+     '''SELECT tp.*, u.username FROM tournament_participants tp
+        JOIN users u ON tp.user_id = u.id
+        WHERE tp.tournament_id = ? ORDER BY tp.registration_date DESC''',
+     lambda r, n: (r.randrange(1, n['tournaments'] + 1),)),
+    ('followers',
+     '''SELECT uc.*, u.username FROM user_connections uc
+        JOIN users u ON uc.follower_id = u.id
+        WHERE uc.following_id = ? AND uc.connection_type = 'accepted'
+        ORDER BY uc.created_at DESC''',
+     lambda r, n: (r.randrange(1, n['users'] + 1),)),
+    ('incoming pending',
+     '''SELECT uc.*, u.username FROM user_connections uc
+        JOIN users u ON uc.follower_id = u.id
+        WHERE uc.following_id = ? AND uc.connection_type = 'pending'
+        ORDER BY uc.created_at DESC''',
+     lambda r, n: (r.randrange(1, n['users'] + 1),)),
+    ('discussions list',
+     '''SELECT td.*, u.username FROM tournament_discussions td
+        JOIN users u ON td.creator_id = u.id
+        WHERE td.tournament_id = ? ORDER BY td.is_pinned DESC, td.created_at DESC''',
+     lambda r, n: (r.randrange(1, n['tournaments'] + 1),)),
+    ('replies count',
+     'SELECT COUNT(*) FROM discussion_replies WHERE discussion_id = ?',
+     lambda r, n: (r.randrange(1, n['discussions'] + 1),)),
+    ('matches list',
+     'SELECT * FROM match_results WHERE tournament_id = ? ORDER BY match_date DESC',
+     lambda r, n: (r.randrange(1, n['tournaments'] + 1),)),
+]
+
+
+def row_counts(scale):
+    base = {
+        'users': 100_000,
+        'tournaments': 2_000,
+        'participants': 300_000,
+        'connections': 400_000,
+        'discussions': 40_000,
+        'replies': 160_000,
+        'matches': 100_000,
+    }
+    return {name: max(1, int(count * scale)) for name, count in base.items()}
+
+
+def random_date(rng):
+    return f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:00:00"
+
+
+def seed(conn, n, rng):
+    conn.execute('BEGIN')
+    conn.executemany(
+        'INSERT INTO users (id, username, email, password_hash, created_at) VALUES (?, ?, ?, ?, ?)',
+        ((i + 1, f'user{i}', f'user{i}@example.com', 'x', random_date(rng)) for i in range(n['users'])))
+    conn.executemany(
+        'INSERT INTO tournaments (id, title, game_type, organizer_id, start_date) VALUES (?, ?, ?, ?, ?)',
+        ((i + 1, f'Tournament {i}', 'chess', rng.randint(1, n['users']), random_date(rng))
+         for i in range(n['tournaments'])))
+    conn.executemany(
+        'INSERT INTO tournament_participants (tournament_id, user_id, team_name, registration_date) VALUES (?, ?, ?, ?)',
+        ((rng.randint(1, n['tournaments']), rng.randint(1, n['users']), 'team', random_date(rng))
+         for _ in range(n['participants'])))
+    conn.executemany(
+        'INSERT OR IGNORE INTO user_connections (follower_id, following_id, connection_type, created_at) VALUES (?, ?, ?, ?)',
+        ((rng.randint(1, n['users']), rng.randint(1, n['users']),
+          'accepted' if rng.random() < 0.8 else 'pending', random_date(rng))
+         for _ in range(n['connections'])))
+    conn.executemany(
+        'INSERT INTO tournament_discussions (id, tournament_id, creator_id, title, is_pinned, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+        ((i + 1, rng.randint(1, n['tournaments']), rng.randint(1, n['users']), f'Topic {i}',
+          1 if rng.random() < 0.05 else 0, random_date(rng)) for i in range(n['discussions'])))
+    conn.executemany(
+        'INSERT INTO discussion_replies (discussion_id, user_id, content, created_at) VALUES (?, ?, ?, ?)',
+        ((rng.randint(1, n['discussions']), rng.randint(1, n['users']), 'gg', random_date(rng))
+         for _ in range(n['replies'])))
+    conn.executemany(
+        '''INSERT INTO match_results (tournament_id, team1_name, team2_name, winner_name,
+                                      score_team1, score_team2, match_date) VALUES (?, ?, ?, ?, ?, ?, ?)''',
+        ((rng.randint(1, n['tournaments']), 'a', 'b', 'a', 2, 1, random_date(rng))
+         for _ in range(n['matches'])))
+    conn.execute('COMMIT')
+
+
+def query_plan(conn, sql, params):
+    return '; '.join(row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params))
+
+
+def measure(conn, n, runs, seed_value):
+    results = {}
+    for name, sql, make_params in QUERIES:
+        rng = random.Random(seed_value)
+        timings = []
+        for _ in range(runs):
+            params = make_params(rng, n)
+            started = time.perf_counter()
+            conn.execute(sql, params).fetchall()
+            timings.append((time.perf_counter() - started) * 1000)
+        results[name] = {
+            'plan': query_plan(conn, sql, make_params(rng, n)),
+            'p50_ms': statistics.median(timings),
+            'max_ms': max(timings),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=float, default=1.0, help='multiplier for the ~1.1M seeded rows')
+    parser.add_argument('--runs', type=int, default=50, help='executions per query')
+    parser.add_argument('--db', help='database file to create (default: temporary file)')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), 'bench_indexes.db')
+    if os.path.exists(path):
+        sys.exit(f'{path} already exists')
+
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = OFF')
+    tournament_app_db.migrate(conn, target=1)
+
+    n = row_counts(args.scale)
+    started = time.perf_counter()
+    seed(conn, n, random.Random(args.seed))
+    print(f"Seeded {sum(n.values()):,} rows in {time.perf_counter() - started:.1f}s ({path})")
+
+    before = measure(conn, n, args.runs, args.seed)
+    started = time.perf_counter()
+    tournament_app_db.migrate(conn)
+    print(f"Built indexes in {time.perf_counter() - started:.1f}s")
+    after = measure(conn, n, args.runs, args.seed)
+
+    for name, _, _ in QUERIES:
+        b, a = before[name], after[name]
+        speedup = b['p50_ms'] / a['p50_ms'] if a['p50_ms'] else float('inf')
+        print(f"\n{name}")
+        print(f"  before  p50 {b['p50_ms']:9.3f} ms  max {b['max_ms']:9.3f} ms  | {b['plan']}")
+        print(f"  after   p50 {a['p50_ms']:9.3f} ms  max {a['max_ms']:9.3f} ms  | {a['plan']}")
+        print(f"  speedup x{speedup:.1f}")
+
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
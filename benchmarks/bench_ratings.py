@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Full rating recompute (src/backend/ratings.py) over a synthetic match
+history: the plain loop against the NumPy wave replay, on the same
+database. Player activity is skewed (a few players play most matches), as
+in a real ladder.
+
+    python benchmarks/bench_ratings.py [--matches 1000000] [--players 50000] [--json out.json]
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'src', 'backend'))
+
+import tournament_app_db  # noqa: E402
+import ratings  # noqa: E402
+
+
+def seed(path, n_matches, n_players, rng):
+    conn = sqlite3.connect(path)
+    tournament_app_db.migrate(conn)
+    conn.execute('BEGIN')
+    conn.executemany(
+        'INSERT INTO users (id, username, email, password_hash) VALUES (?, ?, ?, ?)',
+        ((i, f'user{i}', f'user{i}@example.com', 'x') for i in range(1, n_players + 1)))
+    conn.execute("INSERT INTO tournaments (id, title, game_type, organizer_id) VALUES (1, 'Ladder', 'chess', 1)")
+
+    def player():
+        # Density falling off as id^(-2/3): the busiest player is in ~3% of the matches
+        return int(n_players * rng.random() ** 3) + 1
+
+    def matches():
+        for _ in range(n_matches):
+            player1 = player()
+            player2 = rng.randint(1, n_players)
+            if player2 == player1:
+                player2 = player1 % n_players + 1
+            score1, score2 = rng.randint(0, 3), rng.randint(0, 3)
+            yield (1, player1, player2, player2 if score2 > score1 else player1, score1, score2)
+
+    conn.executemany('''
+        INSERT INTO match_results (tournament_id, player1_id, player2_id, winner_id, score_player1, score_player2)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', matches())
+    conn.execute('COMMIT')
+    return conn
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--matches', type=int, default=1_000_000)
+    parser.add_argument('--players', type=int, default=50_000)
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    methods = [('loop', False)] + ([('vectorized', True)] if ratings.np is not None else [])
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = seed(os.path.join(tmp, 'bench.db'), args.matches, args.players, random.Random(42))
+        for name, vectorize in methods:
+            started = time.perf_counter()
+            result = ratings.recompute(conn, vectorize=vectorize)
+            result['total_seconds'] = round(time.perf_counter() - started, 3)
+            results.append(result)
+            print(f"{name:<10} {result['matches']} matches  load {result['load_seconds']:>6.2f}s  "
+                  f"rate {result['rate_seconds']:>6.2f}s  write {result['write_seconds']:>6.2f}s  "
+                  f"total {result['total_seconds']:>6.2f}s")
+        conn.close()
+    if ratings.np is None:
+        print('numpy is not installed: only the loop was measured')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
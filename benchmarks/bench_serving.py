@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Requests per second and latency percentiles for the two serving modes on the
+same routes and the same seeded database:
+
+    werkzeug  Flask's threaded development server (python backend_api.py)
+    asgi      src/backend/asgi.py under uvicorn, with --workers processes
+
+Each client process holds one keep-alive connection and cycles through
+ROUTES for the given duration.
+
+    python benchmarks/bench_serving.py [--modes werkzeug,asgi] [--concurrency 32]
+                                       [--duration 10] [--workers 4] [--json out.json]
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+BACKEND = os.path.join(ROOT, 'src', 'backend')
+sys.path.insert(0, ROOT)
+
+import tournament_app_db  # noqa: E402
+
+ROUTES = [
+    '/api/health',
+    '/api/tournaments?limit=50',
+    '/api/tournaments/{tournament}/participants?limit=100',
+    '/api/tournaments/{tournament}/discussions?limit=50',
+    '/api/users?limit=50',
+]
+
+N_USERS = 5000
+N_TOURNAMENTS = 50
+
+
+def seed(path, rng):
+    conn = sqlite3.connect(path)
+    tournament_app_db.migrate(conn)
+    conn.execute('BEGIN')
+    conn.executemany(
+        'INSERT INTO users (id, username, email, password_hash) VALUES (?, ?, ?, ?)',
+        ((i, f'user{i}', f'user{i}@example.com', 'x') for i in range(1, N_USERS + 1)))
+    conn.executemany(
+        'INSERT INTO tournaments (id, title, game_type, organizer_id, start_date) VALUES (?, ?, ?, ?, ?)',
+        ((i, f'Tournament {i}', 'chess', rng.randint(1, N_USERS), f'2026-01-{i % 28 + 1:02d}')
+         for i in range(1, N_TOURNAMENTS + 1)))
+    conn.executemany(
+        'INSERT OR IGNORE INTO tournament_participants (tournament_id, user_id, team_name) VALUES (?, ?, ?)',
+        ((rng.randint(1, N_TOURNAMENTS), rng.randint(1, N_USERS), 'team') for _ in range(10000)))
+    conn.executemany(
+        'INSERT OR IGNORE INTO tournament_discussions (tournament_id, creator_id, title) VALUES (?, ?, ?)',
+        ((rng.randint(1, N_TOURNAMENTS), rng.randint(1, N_USERS), f'Topic {i}') for i in range(1000)))
+    conn.execute('COMMIT')
+    conn.close()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(mode, port, database, workers):
+    env = dict(os.environ, DATABASE=database, LOG_LEVEL='WARNING', COUNTER_RECONCILE_SECONDS='0')
+    if mode == 'werkzeug':
+        command = [sys.executable, '-c',
+                   f'import backend_api; backend_api.app.run(port={port}, threaded=True)']
+    else:
+        command = [sys.executable, '-m', 'uvicorn', 'asgi:app', '--port', str(port),
+                   '--workers', str(workers), '--log-level', 'warning', '--no-access-log']
+    process = subprocess.Popen(command, cwd=BACKEND, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/api/health')
+            if connection.getresponse().status == 200:
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f'{mode} server did not start')
+
+
+def client(args):
+    port, duration, seed_value = args
+    rng = random.Random(seed_value)
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        path = rng.choice(ROUTES).format(tournament=rng.randint(1, N_TOURNAMENTS))
+        started = time.perf_counter()
+        try:
+            connection.request('GET', path)
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            connection.close()
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - started)
+    connection.close()
+    return latencies, errors
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def run(mode, database, args):
+    port = free_port()
+    server = start_server(mode, port, database, args.workers)
+    try:
+        # Warm up connections and caches
+        with multiprocessing.Pool(args.concurrency) as pool:
+            pool.map(client, [(port, 1, i) for i in range(args.concurrency)])
+            results = pool.map(client, [(port, args.duration, 1000 + i) for i in range(args.concurrency)])
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies = sorted(value for values, _ in results for value in values)
+    return {
+        'mode': mode,
+        'workers': args.workers if mode == 'asgi' else 1,
+        'concurrency': args.concurrency,
+        'requests': len(latencies),
+        'errors': sum(errors for _, errors in results),
+        'rps': round(len(latencies) / args.duration, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2) if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--modes', default='werkzeug,asgi')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = os.path.join(tmp, 'bench.db')
+        seed(database, random.Random(42))
+        results = []
+        for mode in args.modes.split(','):
+            result = run(mode, database, args)
+            results.append(result)
+            print(f"{mode:<9} workers={result['workers']:<2} {result['rps']:>8.1f} req/s  "
+                  f"p50 {result['p50_ms']:>7.2f} ms  p99 {result['p99_ms']:>7.2f} ms  "
+                  f"errors {result['errors']}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
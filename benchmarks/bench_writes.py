@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Contended write throughput: a transaction per request vs group commit.
+
+Worker threads stand in for concurrent requests and run the writes of
+create_post (insert + push to followers' timelines), follow_user and
+create_reply, picked at random, on a setup_demo_data.py dataset:
+
+    per-request   each thread has its own connection (the pool's settings,
+                  busy_timeout included) and commits after every write,
+                  as the handlers used to
+    group commit  threads hand their writes to write_queue.WriteQueue and
+                  wait for the group they landed in to commit
+
+Reports writes/s, p50/p99 latency and errors ("database is locked" once
+busy_timeout runs out). --synchronous FULL adds an fsync per commit.
+
+    python benchmarks/bench_writes.py [--users 20000] [--threads 16] [--duration 5] [--synchronous NORMAL]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'src', 'backend'))
+
+import db_pool  # noqa: E402
+import feeds  # noqa: E402
+import write_queue  # noqa: E402
+from bench_api import create_database  # noqa: E402
+from bench_serving import percentile  # noqa: E402
+
+
+def create_post(conn, user_id, other_id):
+    post_id = conn.execute('INSERT INTO social_posts (user_id, content) VALUES (?, ?)',
+                           (user_id, 'benchmark post')).lastrowid
+    feeds.publish_post(conn, post_id, user_id)
+
+
+def follow(conn, user_id, other_id):
+    if not conn.execute('SELECT id FROM user_connections WHERE follower_id = ? AND following_id = ?',
+                        (user_id, other_id)).fetchone():
+        conn.execute("INSERT INTO user_connections (follower_id, following_id, connection_type) "
+                     "VALUES (?, ?, 'pending')", (user_id, other_id))
+
+
+def create_reply(conn, user_id, discussion_id):
+    conn.execute('INSERT INTO discussion_replies (discussion_id, user_id, content) VALUES (?, ?, ?)',
+                 (discussion_id, user_id, 'benchmark reply'))
+
+
+OPERATIONS = (create_post, follow, create_reply)
+
+
+def run(pool, write, threads, duration, size, seed):
+    """write(conn, operation, *args) per request from `threads` threads; returns (latencies, errors, seconds)"""
+    latencies, errors = [], []
+    barrier = threading.Barrier(threads + 1)
+    lock = threading.Lock()
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        conn = pool.connect()
+        mine, failed = [], []
+        barrier.wait()
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            operation = rng.choice(OPERATIONS)
+            other = rng.randint(1, size['discussions'] if operation is create_reply else size['users'])
+            started = time.perf_counter()
+            try:
+                write(conn, operation, rng.randint(1, size['users']), other)
+                mine.append(time.perf_counter() - started)
+            except sqlite3.Error as e:
+                if conn.in_transaction:
+                    conn.rollback()
+                failed.append(f'{type(e).__name__}: {e}')
+        conn.close()
+        with lock:
+            latencies.extend(mine)
+            errors.extend(failed)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    return latencies, errors, time.perf_counter() - started
+
+
+def per_request(pool):
+    def write(conn, operation, *args):
+        operation(conn, *args)
+        conn.commit()
+    return write, None
+
+
+def group_commit(pool):
+    writer = write_queue.WriteQueue(pool.connect)
+    writer.start()
+
+    def write(conn, operation, *args):
+        writer.run(operation, *args)
+    return write, writer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20_000)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--synchronous', choices=('OFF', 'NORMAL', 'FULL'), default='NORMAL')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    template = os.path.join(directory, 'template.db')
+    create_database(template, args.users, args.seed, log=lambda line: None)
+    conn = sqlite3.connect(template)
+    size = {'users': conn.execute('SELECT MAX(id) FROM users').fetchone()[0],
+            'discussions': conn.execute('SELECT MAX(id) FROM tournament_discussions').fetchone()[0]}
+    conn.close()
+
+    pragmas = tuple((name, args.synchronous if name == 'synchronous' else value)
+                    for name, value in db_pool.DEFAULT_PRAGMAS)
+    print(f'{args.threads} threads, synchronous={args.synchronous}')
+    for label, variant in (('per-request', per_request), ('group commit', group_commit)):
+        path = os.path.join(directory, label.replace(' ', '_') + '.db')
+        shutil.copyfile(template, path)
+        pool = db_pool.ConnectionPool(path, pragmas=pragmas)
+        write, writer = variant(pool)
+        latencies, errors, seconds = run(pool, write, args.threads, args.duration, size, args.seed)
+        if writer is not None:
+            writer.stop()
+        latencies.sort()
+        print(f'{label:14} {len(latencies) / seconds:9.0f} writes/s  '
+              f'p50 {percentile(latencies, 0.50) * 1000:8.2f} ms  p99 {percentile(latencies, 0.99) * 1000:8.2f} ms  '
+              f'errors {len(errors)}'
+              + (f"  (average group {writer.stats()['average_group']})" if writer is not None else ''))
+        for message in sorted(set(errors))[:3]:
+            print(f'    {message}')
+    shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
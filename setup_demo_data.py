@@ -1,103 +1,444 @@
 #!/usr/bin/env python3
 """
-Quick setup script to add demo users and friend requests
+Seed a database with demo data: a synthetic community of any size, plus
+the named demo users with friend requests waiting for one account.
+
+The community is shaped like a real one rather than uniform:
+
+  - follows: out-degrees are heavy-tailed around --follows, and targets are
+    drawn by popularity, so follower counts follow a power law (a few
+    accounts with thousands of followers, most with a handful); some
+    follows are followed back, a few are pending or blocked;
+  - tournaments: 70% completed, 10% in progress, 20% upcoming; mostly
+    small (8-16 slots), a few of 128-256, filled to 40-100%; frequent
+    players join far more tournaments than casual ones;
+  - matches: completed tournaments play out a single-elimination bracket,
+    active ones stop part way; each player has a fixed hidden skill, so
+    results (and ratings) are consistent instead of coin flips;
+  - discussions, replies, posts and likes: heavy-tailed counts.
+
+Rows are generated as a stream and written with executemany() in large
+transactions, each batch sorted into key order. Secondary indexes and
+triggers of the seeded tables are dropped for the load and recreated once
+at the end; reply and like counters are written with the rows, and what
+the triggers and handlers maintain (full-text indexes, standings, ratings,
+timelines, cache versions) is rebuilt in bulk afterwards. Follow
+notifications and the graph change log are not written. With
+synchronous=OFF and a large page cache that is tens of millions of rows in
+minutes. Don't seed the database of a running server; restart it after.
+
+The same --seed always gives the same community (dates are relative to the
+day of the run).
+
+    python setup_demo_data.py [database] [--users 1000] [--seed 42] [--demo-user ID]
+                              [--follows 20] [--tournaments 10] [--posts 2] [--likes 5]
+                              [--discussions 3] [--replies 8]
 """
 
-import sqlite3
+import argparse
 import hashlib
-from datetime import datetime
-
-def setup_demo_data():
-    """Add demo users and create sample friend requests"""
-    
-    print("🚀 Setting up demo data for friend requests...")
-    
-    # Connect to database
-    conn = sqlite3.connect('tournament_app.db')
-    cursor = conn.cursor()
-    
-    # Demo users to add
-    demo_users = [
-        {'username': 'Alex_Gamer', 'email': 'alex@example.com', 'bio': 'Pro FPS player'},
-        {'username': 'Sarah_Pro', 'email': 'sarah@example.com', 'bio': 'Tournament organizer'},
-        {'username': 'Mike_Champion', 'email': 'mike@example.com', 'bio': 'Rocket League champion'},
-        {'username': 'Luna_Streamer', 'email': 'luna@example.com', 'bio': 'Content creator'},
-    ]
-    
-    # Add users if they don't exist
+import math
+import os
+import random
+import sqlite3
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, 'src', 'backend'))
+
+import tournament_app_db  # noqa: E402
+import feeds  # noqa: E402
+import ratings  # noqa: E402
+import search  # noqa: E402
+import standings  # noqa: E402
+
+BATCH_SIZE = 100000
+COMMIT_ROWS = 1000000
+# Pareto shape for the heavy-tailed counts (smaller is heavier)
+TAIL_SHAPE = 1.8
+# rank = n * random() ** SKEW: 3 gives follower counts falling off as a power law
+POPULARITY_SKEW = 3
+ACTIVITY_SKEW = 2
+# Large prime; rank * STRIDE mod n spreads popular ranks over the id range
+STRIDE = 2654435761
+DAY = 86400
+HISTORY_DAYS = 730
+
+# (slots, weight)
+TOURNAMENT_SIZES = ((8, 30), (16, 30), (32, 20), (64, 12), (128, 6), (256, 2))
+STATUSES, STATUS_WEIGHTS = ('completed', 'active', 'upcoming'), (70, 10, 20)
+GAMES = ('chess', 'valorant', 'league of legends', 'rocket league', 'fifa', 'street fighter', 'dota 2',
+         'counter-strike', 'overwatch', 'smash bros')
+ADJECTIVES = ('Swift', 'Silent', 'Crimson', 'Lucky', 'Frozen', 'Iron', 'Shadow', 'Cosmic', 'Wild', 'Golden',
+              'Rapid', 'Clever', 'Brave', 'Neon', 'Stormy', 'Mighty')
+NOUNS = ('Falcon', 'Tiger', 'Wizard', 'Knight', 'Ninja', 'Phoenix', 'Viper', 'Ranger', 'Golem', 'Otter',
+         'Comet', 'Dragon', 'Panda', 'Raven', 'Titan', 'Fox')
+WORDS = ('great', 'match', 'round', 'final', 'team', 'play', 'clutch', 'comeback', 'strategy', 'map',
+         'ranked', 'bracket', 'seed', 'upset', 'draft', 'meta', 'patch', 'skill', 'practice', 'win',
+         'opening', 'defense', 'rush', 'timing', 'scrim', 'lineup', 'coach', 'stream', 'highlight', 'rematch')
+
+# Means per user (per 1000 users for tournaments, per tournament for
+# discussions, per discussion for replies, per post for likes)
+DEFAULTS = {'follows': 20, 'tournaments': 10, 'posts': 2, 'likes': 5, 'discussions': 3, 'replies': 8}
+
+DEMO_USERS = [
+    {'username': 'Alex_Gamer', 'email': 'alex@example.com', 'bio': 'Pro FPS player'},
+    {'username': 'Sarah_Pro', 'email': 'sarah@example.com', 'bio': 'Tournament organizer'},
+    {'username': 'Mike_Champion', 'email': 'mike@example.com', 'bio': 'Rocket League champion'},
+    {'username': 'Luna_Streamer', 'email': 'luna@example.com', 'bio': 'Content creator'},
+]
+DEMO_PASSWORD_HASH = hashlib.sha256('demo123'.encode()).hexdigest()
+
+# Tables written in bulk; their secondary indexes and triggers are rebuilt after the load
+SEEDED_TABLES = ('users', 'user_connections', 'tournaments', 'tournament_participants', 'match_results',
+                 'tournament_discussions', 'discussion_replies', 'social_posts', 'post_likes')
+
+
+def heavy_tail(rng, mean, cap):
+    """Pareto-distributed count with the given mean, at most cap"""
+    scale = mean * (TAIL_SHAPE - 1) / TAIL_SHAPE
+    return min(cap, int(scale * rng.paretovariate(TAIL_SHAPE)))
+
+
+def skewed(rng, n, skew):
+    """0-based index, low ranks far more likely, scattered over 0..n-1"""
+    return int(n * rng.random() ** skew) * STRIDE % n
+
+
+def text(rng, n_words):
+    return ' '.join(rng.choices(WORDS, k=n_words))
+
+
+def skill(user_id):
+    """Hidden, fixed player strength in [0, 1)"""
+    return (user_id * STRIDE) % 1000003 / 1000003
+
+
+class BulkWriter:
+    """Buffers rows per statement and writes them with executemany, committing every COMMIT_ROWS"""
+
+    def __init__(self, conn, batch_size=BATCH_SIZE, commit_rows=COMMIT_ROWS):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.commit_rows = commit_rows
+        self.buffers = {}
+        self.counts = {}
+        self.uncommitted = 0
+
+    def add(self, table, sql, row):
+        buffer = self.buffers.setdefault((table, sql), [])
+        buffer.append(row)
+        if len(buffer) >= self.batch_size:
+            self._write(table, sql, buffer)
+
+    def _write(self, table, sql, buffer):
+        # Rows in key order turn the unique-index inserts into appends
+        buffer.sort()
+        self.conn.executemany(sql, buffer)
+        self.counts[table] = self.counts.get(table, 0) + len(buffer)
+        self.uncommitted += len(buffer)
+        buffer.clear()
+        if self.uncommitted >= self.commit_rows:
+            self.conn.commit()
+            self.uncommitted = 0
+
+    def flush(self):
+        for (table, sql), buffer in self.buffers.items():
+            if buffer:
+                self._write(table, sql, buffer)
+        self.conn.commit()
+        self.uncommitted = 0
+
+
+def next_id(conn, table):
+    return conn.execute(f'SELECT COALESCE(MAX(id), 0) + 1 FROM {table}').fetchone()[0]
+
+
+def drop_secondary(conn):
+    """Drop non-unique indexes and triggers of the seeded tables; returns the SQL to recreate them"""
+    # Unique indexes stay: INSERT OR IGNORE relies on them
+    objects = conn.execute(f'''
+        SELECT type, name, sql FROM sqlite_master
+        WHERE type IN ('index', 'trigger') AND sql IS NOT NULL AND sql NOT LIKE 'CREATE UNIQUE%'
+          AND tbl_name IN ({', '.join('?' * len(SEEDED_TABLES))})
+    ''', SEEDED_TABLES).fetchall()
+    for kind, name, _ in objects:
+        conn.execute(f'DROP {kind.upper()} {name}')
+    conn.commit()
+    return [sql for _, _, sql in objects]
+
+
+def generate(conn, writer, n_users, options, rng_seed, now):
+    """Write the synthetic community; ids continue after the rows already present"""
+    def rng_for(part):
+        return random.Random(f'{rng_seed}:{part}')
+
+    user_base = next_id(conn, 'users') - 1
+    start = now - HISTORY_DAYS * DAY
+
+    def user(index):
+        return user_base + index + 1
+
+    # Users
+    rng = rng_for('users')
+    for index in range(n_users):
+        user_id = user(index)
+        username = f'{rng.choice(ADJECTIVES)}_{rng.choice(NOUNS)}{user_id}'
+        joined = start + rng.random() * HISTORY_DAYS * DAY
+        writer.add('users', '''
+            INSERT INTO users (id, username, email, password_hash, bio, created_at, last_login, is_active)
+            VALUES (?, ?, ?, ?, ?, datetime(?, 'unixepoch'), datetime(?, 'unixepoch'), ?)
+        ''', (user_id, username, f'{username.lower()}@example.com', DEMO_PASSWORD_HASH,
+              f'{rng.choice(GAMES).title()} player. {text(rng, 6).capitalize()}.', joined,
+              joined + rng.random() * (now - joined), 1))
+
+    # Follows: heavy-tailed out-degree, popularity-weighted targets
+    rng = rng_for('follows')
+    follow_sql = '''
+        INSERT OR IGNORE INTO user_connections (follower_id, following_id, connection_type, created_at)
+        VALUES (?, ?, ?, datetime(?, 'unixepoch'))
+    '''
+    cap = min(n_users - 1, 5000)
+    for index in range(n_users if n_users > 1 else 0):
+        follower = user(index)
+        targets = set()
+        for _ in range(heavy_tail(rng, options['follows'], cap)):
+            target = skewed(rng, n_users, POPULARITY_SKEW)
+            if target != index:
+                targets.add(target)
+        for target in targets:
+            draw = rng.random()
+            state = 'accepted' if draw < 0.9 else 'pending' if draw < 0.98 else 'blocked'
+            created = now - rng.random() * HISTORY_DAYS * DAY
+            writer.add('user_connections', follow_sql, (follower, user(target), state, created))
+            # Accepting a request follows back (update_connection_status does the same)
+            if state == 'accepted' and draw < 0.3:
+                writer.add('user_connections', follow_sql, (user(target), follower, 'accepted', created))
+
+    # Tournaments, participants and matches
+    rng = rng_for('tournaments')
+    n_tournaments = max(1, n_users * options['tournaments'] // 1000)
+    tournament_base = next_id(conn, 'tournaments') - 1
+    slots, weights = zip(*TOURNAMENT_SIZES)
+    participant_id = next_id(conn, 'tournament_participants')
+    discussion_id = next_id(conn, 'tournament_discussions')
+    for index in range(n_tournaments):
+        tournament_id = tournament_base + index + 1
+        capacity = rng.choices(slots, weights)[0]
+        status = rng.choices(STATUSES, STATUS_WEIGHTS)[0]
+        days = rng.randint(1, 30) * DAY
+        if status == 'completed':
+            begins = now - days - rng.random() * HISTORY_DAYS * DAY
+        elif status == 'active':
+            begins = now - rng.random() * days
+        else:
+            begins = now + rng.random() * 90 * DAY
+        ends = begins + days
+        writer.add('tournaments', '''
+            INSERT INTO tournaments (id, title, description, game_type, entry_fee, prize_pool, max_participants,
+                                     start_date, end_date, status, organizer_id, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, datetime(?, 'unixepoch'), datetime(?, 'unixepoch'), ?, ?,
+                    datetime(?, 'unixepoch'))
+        ''', (tournament_id, f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} Cup #{tournament_id}',
+              text(rng, 15).capitalize() + '.', rng.choice(GAMES), rng.choice((0, 0, 5, 10, 25)),
+              capacity * rng.choice((0, 10, 50)), capacity, begins, ends, status,
+              user(skewed(rng, n_users, ACTIVITY_SKEW)), begins - rng.randint(7, 60) * DAY))
+
+        players = set()
+        wanted = min(n_users, max(2, int(capacity * rng.uniform(0.4, 1.0))))
+        while len(players) < wanted:
+            players.add(user(skewed(rng, n_users, ACTIVITY_SKEW)))
+        players = sorted(players)
+        for player in players:
+            writer.add('tournament_participants', '''
+                INSERT INTO tournament_participants (id, tournament_id, user_id, team_name, registration_date, status)
+                VALUES (?, ?, ?, ?, datetime(?, 'unixepoch'), ?)
+            ''', (participant_id, tournament_id, player, f'Team {player}',
+                  begins - rng.random() * 14 * DAY, 'confirmed' if status != 'upcoming' else 'registered'))
+            participant_id += 1
+
+        if status == 'upcoming' or len(players) < 2:
+            continue
+        # Single elimination from a random draw; with an odd field one player gets a bye
+        rounds = math.ceil(math.log2(len(players)))
+        played_rounds = rounds if status == 'completed' else rng.randint(0, rounds - 1)
+        alive = players[:]
+        rng.shuffle(alive)
+        for match_round in range(1, played_rounds + 1):
+            kind = 'final' if len(alive) == 2 else 'semifinal' if len(alive) <= 4 else 'standard'
+            played = begins + (ends - begins) * match_round / (rounds + 1)
+            winners = [alive.pop()] if len(alive) % 2 else []
+            for player1, player2 in zip(alive[::2], alive[1::2]):
+                p1_wins = rng.random() < 1 / (1 + 10 ** ((skill(player2) - skill(player1)) * 2))
+                winners.append(player1 if p1_wins else player2)
+                winner_score, loser_score = rng.randint(2, 3), rng.randint(0, 1)
+                score1, score2 = (winner_score, loser_score) if p1_wins else (loser_score, winner_score)
+                writer.add('match_results', '''
+                    INSERT INTO match_results (tournament_id, player1_id, player2_id, winner_id, score_player1,
+                                               score_player2, match_date, match_round, match_type)
+                    VALUES (?, ?, ?, ?, ?, ?, datetime(?, 'unixepoch'), ?, ?)
+                ''', (tournament_id, player1, player2, winners[-1], score1, score2, played, match_round, kind))
+            alive = winners
+
+        # Discussions with their replies; replies_count is known here
+        for number in range(heavy_tail(rng, options['discussions'], 50)):
+            opened = begins - 7 * DAY + rng.random() * (ends - begins + 14 * DAY)
+            n_replies = heavy_tail(rng, options['replies'], 500)
+            writer.add('tournament_discussions', '''
+                INSERT INTO tournament_discussions (id, tournament_id, creator_id, title, description, is_pinned,
+                                                    replies_count, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, datetime(?, 'unixepoch'))
+            ''', (
+                discussion_id, tournament_id, rng.choice(players), f'{text(rng, 4).capitalize()} #{number + 1}',
+                text(rng, 25).capitalize() + '.', int(rng.random() < 0.05), n_replies, opened))
+            for _ in range(n_replies):
+                writer.add('discussion_replies', '''
+                    INSERT INTO discussion_replies (discussion_id, user_id, content, created_at)
+                    VALUES (?, ?, ?, datetime(?, 'unixepoch'))
+                ''', (discussion_id, rng.choice(players), text(rng, rng.randint(3, 30)).capitalize() + '.',
+                      opened + rng.random() * 14 * DAY))
+            discussion_id += 1
+
+    # Posts with their likes; likes_count is known here
+    rng = rng_for('posts')
+    post_id = next_id(conn, 'social_posts')
+    for index in range(n_users):
+        author = user(index)
+        for _ in range(heavy_tail(rng, options['posts'], 1000)):
+            likers = set()
+            for _ in range(heavy_tail(rng, options['likes'], min(n_users, 2000))):
+                likers.add(user(skewed(rng, n_users, ACTIVITY_SKEW)))
+            posted = now - rng.random() * HISTORY_DAYS * DAY
+            writer.add('social_posts', '''
+                INSERT INTO social_posts (id, user_id, content, post_type, likes_count, created_at)
+                VALUES (?, ?, ?, ?, ?, datetime(?, 'unixepoch'))
+            ''', (post_id, author, text(rng, rng.randint(5, 40)).capitalize() + '.',
+                  rng.choice(('general', 'general', 'general', 'achievement', 'tournament_update')),
+                  len(likers), posted))
+            for liker in likers:
+                writer.add('post_likes', '''
+                    INSERT INTO post_likes (post_id, user_id, created_at) VALUES (?, ?, datetime(?, 'unixepoch'))
+                ''', (post_id, liker, posted + rng.random() * 3 * DAY))
+            post_id += 1
+    writer.flush()
+
+
+def rebuild_derived(conn, log):
+    """Recompute what the dropped triggers and the handlers would have maintained"""
+    for label, step in (
+            ('search', search.rebuild),
+            ('standings', standings.rebuild),
+            ('ratings', ratings.recompute),
+            ('feeds', feeds.rebuild)):
+        started = time.perf_counter()
+        step(conn)
+        log(f'   {label:<12} {time.perf_counter() - started:7.1f}s')
+    # Cached responses from before the load are stale
+    conn.execute('UPDATE cache_versions SET version = version + 1')
+    conn.execute('PRAGMA analysis_limit = 1000')
+    conn.execute('ANALYZE')
+    conn.commit()
+
+
+def seed(conn, n_users, rng_seed=42, now=None, log=print, **sizes):
+    """Bulk-load a community of n_users into an up-to-date schema; returns rows written per table"""
+    options = {**DEFAULTS, **sizes}
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('PRAGMA cache_size = -524288')  # 512 MB
+    conn.execute('PRAGMA temp_store = MEMORY')
+    # The generated rows reference each other consistently
+    conn.execute('PRAGMA foreign_keys = OFF')
+    now = now if now is not None else time.time()
+
+    started = time.perf_counter()
+    recreate = drop_secondary(conn)
+    writer = BulkWriter(conn)
+    try:
+        generate(conn, writer, n_users, options, rng_seed, now)
+    finally:
+        conn.commit()
+        log(f'   {"rows":<12} {time.perf_counter() - started:7.1f}s')
+        started = time.perf_counter()
+        for sql in recreate:
+            conn.execute(sql)
+        conn.commit()
+        log(f'   {"indexes":<12} {time.perf_counter() - started:7.1f}s')
+    rebuild_derived(conn, log)
+    return writer.counts
+
+
+def add_demo_users(conn, demo_user_id):
+    """The named demo accounts, each with a pending friend request to demo_user_id"""
     user_ids = []
-    for user in demo_users:
-        try:
-            existing = cursor.execute('SELECT id FROM users WHERE username = ?', (user['username'],)).fetchone()
-            if existing:
-                user_ids.append(existing[0])
-                print(f"✅ User {user['username']} already exists (ID: {existing[0]})")
-            else:
-                password_hash = hashlib.sha256("demo123".encode()).hexdigest()
-                cursor.execute('''
-                    INSERT INTO users (username, email, password_hash, bio, created_at, is_active)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (user['username'], user['email'], password_hash, user['bio'], 
-                      datetime.now().isoformat(), 1))
-                user_ids.append(cursor.lastrowid)
-                print(f"✅ Added user: {user['username']} (ID: {cursor.lastrowid})")
-        except Exception as e:
-            print(f"❌ Error with user {user['username']}: {e}")
-    
-    # Create friend requests (assuming current user is ID 1)
-    current_user_id = 1
-    
-    # Create some pending friend requests TO user 1
-    if len(user_ids) >= 3:
-        try:
-            # User 2 sends request to User 1
-            cursor.execute('''
-                INSERT OR REPLACE INTO user_connections 
-                (follower_id, following_id, connection_type, created_at)
-                VALUES (?, ?, ?, ?)
-            ''', (user_ids[0], current_user_id, 'pending', datetime.now().isoformat()))
-            
-            # User 3 sends request to User 1  
-            cursor.execute('''
-                INSERT OR REPLACE INTO user_connections 
-                (follower_id, following_id, connection_type, created_at)
-                VALUES (?, ?, ?, ?)
-            ''', (user_ids[1], current_user_id, 'pending', datetime.now().isoformat()))
-            
-            # User 4 sends request to User 1
-            cursor.execute('''
-                INSERT OR REPLACE INTO user_connections 
-                (follower_id, following_id, connection_type, created_at)
-                VALUES (?, ?, ?, ?)
-            ''', (user_ids[2], current_user_id, 'pending', datetime.now().isoformat()))
-            
-            print(f"✅ Created friend requests to user {current_user_id}")
-            
-        except Exception as e:
-            print(f"❌ Error creating friend requests: {e}")
-    
-    # Commit changes
+    for user in DEMO_USERS:
+        existing = conn.execute('SELECT id FROM users WHERE username = ?', (user['username'],)).fetchone()
+        if existing:
+            user_ids.append(existing[0])
+            print(f"✅ User {user['username']} already exists (ID: {existing[0]})")
+            continue
+        cursor = conn.execute('''
+            INSERT INTO users (username, email, password_hash, bio, is_active) VALUES (?, ?, ?, ?, ?)
+        ''', (user['username'], user['email'], DEMO_PASSWORD_HASH, user['bio'], 1))
+        user_ids.append(cursor.lastrowid)
+        print(f"✅ Added user: {user['username']} (ID: {cursor.lastrowid})")
+
+    conn.executemany('''
+        INSERT OR IGNORE INTO user_connections (follower_id, following_id, connection_type)
+        VALUES (?, ?, 'pending')
+    ''', [(user_id, demo_user_id) for user_id in user_ids if user_id != demo_user_id])
     conn.commit()
-    
-    # Show pending requests
-    print("\n📬 Pending friend requests for user 1:")
-    pending = cursor.execute('''
-        SELECT uc.*, u.username as follower_username, u.email as follower_email
-        FROM user_connections uc
+
+    pending = conn.execute('''
+        SELECT uc.id, u.username FROM user_connections uc
         JOIN users u ON uc.follower_id = u.id
         WHERE uc.following_id = ? AND uc.connection_type = 'pending'
-    ''', (current_user_id,)).fetchall()
-    
-    for request in pending:
-        print(f"   📬 {request[4]} wants to follow you (Request ID: {request[0]})")
-    
+        ORDER BY uc.id
+    ''', (demo_user_id,)).fetchall()
+    print(f"\n📬 Pending friend requests for user {demo_user_id}:")
+    for request_id, username in pending[-10:]:
+        print(f"   📬 {username} wants to follow you (Request ID: {request_id})")
+    if len(pending) > 10:
+        print(f"   ... and {len(pending) - 10} more")
+    return len(pending)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('database', nargs='?', default='tournament_app.db')
+    parser.add_argument('--users', type=int, default=1000, help='synthetic users to add (0 for demo users only)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--demo-user', type=int, help='account that receives the demo friend requests '
+                                                      '(default: the first user)')
+    for name, value in DEFAULTS.items():
+        parser.add_argument(f'--{name}', type=type(value), default=value)
+    args = parser.parse_args()
+
+    print(f"🚀 Seeding {args.database}...")
+    conn = sqlite3.connect(args.database)
+    tournament_app_db.migrate(conn)
+
+    if args.users > 0:
+        started = time.perf_counter()
+        counts = seed(conn, args.users, args.seed, **{name: getattr(args, name) for name in DEFAULTS})
+        elapsed = time.perf_counter() - started
+        print(f"✅ {sum(counts.values()):,} rows in {elapsed:.1f}s "
+              f"({sum(counts.values()) / elapsed:,.0f} rows/s): "
+              + ', '.join(f'{table} {count:,}' for table, count in counts.items()))
+
+    demo_user_id = args.demo_user or conn.execute('SELECT MIN(id) FROM users').fetchone()[0]
+    if demo_user_id is None:
+        # Empty database and no synthetic users: the first demo user receives the requests
+        demo_user_id = 1
+    pending = add_demo_users(conn, demo_user_id)
+    conn.close()
+
     print(f"\n🎯 Demo setup complete!")
     print(f"   1. Start server: python backend_api.py")
     print(f"   2. Open src/index.html")
     print(f"   3. Look for '📬 Friend Requests' section")
-    print(f"   4. You should see {len(pending)} pending requests!")
-    
-    conn.close()
+    print(f"   4. You should see {pending} pending requests for user {demo_user_id}!")
+
 
 if __name__ == "__main__":
-    setup_demo_data()
+    main()
@@ -0,0 +1,319 @@
+"""
+ASGI serving mode for the backend.
+
+Runs the Flask app behind any ASGI server with worker processes:
+
+    uvicorn asgi:app --workers 4 --port 5000
+    python asgi.py [--workers 4] [--port 5000]
+
+Each request is handed to a bounded thread pool (DB_WORKERS, sized like the
+connection pool) that runs the unchanged synchronous Flask handler and its
+sqlite3 calls; the event loop only moves bytes. Requests beyond
+DB_WORKERS + MAX_PENDING are refused with 503 instead of queueing without
+bound.
+
+/api/events is served natively on the event loop: an idle SSE subscriber
+costs a Subscription and a coroutine, not a thread.
+
+Every worker process has its own connection pool, caches and event hub;
+event streams only see writes handled by the same worker, so run them on
+a single-worker deployment (or pin /api/events to one) when they matter.
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+from flask import jsonify
+
+import backend_api
+import db_pool
+import events
+import metrics
+import request_log as log
+
+DB_WORKERS = int(os.environ.get('DB_WORKERS', 8))
+MAX_PENDING = int(os.environ.get('MAX_PENDING', 256))
+# Request bodies larger than this are spooled to a temporary file
+SPOOL_BYTES = 1024 * 1024
+FLUSH_BYTES = 64 * 1024
+
+
+def build_environ(scope, body):
+    """PEP 3333 environ for an ASGI http scope"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('latin1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin1').upper().replace('-', '_')
+        value = value.decode('latin1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f'HTTP_{name}'
+        environ[name] = f'{environ[name]},{value}' if name in environ else value
+    # The body is fully spooled, so its length is known even for chunked requests
+    # (without it Werkzeug reads those as empty)
+    body.seek(0, os.SEEK_END)
+    environ['CONTENT_LENGTH'] = str(body.tell())
+    body.seek(0)
+    environ['wsgi.input_terminated'] = True
+    return environ
+
+
+async def read_body(receive):
+    body = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        body.write(message.get('body', b''))
+        if not message.get('more_body'):
+            body.seek(0)
+            return body
+
+
+async def send_error(send, status, message):
+    body = json.dumps({'error': message}).encode()
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json'),
+                            (b'content-length', str(len(body)).encode())]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+class WsgiBridge:
+    """Run a WSGI app for ASGI http requests on a bounded executor"""
+
+    def __init__(self, wsgi_app, workers=DB_WORKERS, max_pending=MAX_PENDING):
+        self.wsgi_app = wsgi_app
+        self.workers = workers
+        self.max_pending = max_pending
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='wsgi')
+        self.in_flight = 0
+        self.rejected = 0
+
+    async def __call__(self, scope, receive, send):
+        if self.in_flight >= self.workers + self.max_pending:
+            self.rejected += 1
+            await send_error(send, 503, 'Server busy')
+            return
+
+        self.in_flight += 1
+        try:
+            body = await read_body(receive)
+            if body is None:
+                return
+            disconnected = threading.Event()
+
+            async def watch_disconnect():
+                while (await receive())['type'] != 'http.disconnect':
+                    pass
+                disconnected.set()
+
+            watcher = asyncio.ensure_future(watch_disconnect())
+            try:
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(
+                    self.executor, self.run, build_environ(scope, body), send, loop, disconnected)
+            finally:
+                watcher.cancel()
+                body.close()
+        finally:
+            self.in_flight -= 1
+
+    def run(self, environ, send, loop, disconnected):
+        """Executor side: call the app and push its output through the loop.
+
+        Output is buffered up to FLUSH_BYTES, so a typical response crosses
+        to the event loop once (start and body together).
+        """
+        state = {}
+        pending = []
+        buffered = 0
+
+        async def send_all(messages):
+            for message in messages:
+                await send(message)
+
+        def flush(more_body):
+            nonlocal buffered
+            if not state.get('started'):
+                state['started'] = True
+                pending.insert(0, {'type': 'http.response.start', 'status': state['status'],
+                                   'headers': state['headers']})
+            body = b''.join(message for message in pending if isinstance(message, bytes))
+            messages = [message for message in pending if isinstance(message, dict)]
+            messages.append({'type': 'http.response.body', 'body': body, 'more_body': more_body})
+            pending.clear()
+            buffered = 0
+            # Blocks this worker until the server has taken the data (flow control)
+            asyncio.run_coroutine_threadsafe(send_all(messages), loop).result()
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and state.get('started'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            state['status'] = int(status.split(' ', 1)[0])
+            state['headers'] = [(name.lower().encode('latin1'), value.encode('latin1'))
+                                for name, value in headers]
+            return lambda data: None
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            for chunk in result:
+                if disconnected.is_set():
+                    return
+                if chunk:
+                    pending.append(chunk)
+                    buffered += len(chunk)
+                    if buffered >= FLUSH_BYTES:
+                        flush(True)
+            flush(False)
+        finally:
+            # Runs Flask teardown, which returns the pooled connection
+            if hasattr(result, 'close'):
+                result.close()
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            'in_flight': self.in_flight,
+            'rejected': self.rejected,
+        }
+
+
+async def event_stream(scope, receive, send):
+    """Native /api/events: same contract as backend_api.event_stream"""
+    started = time.perf_counter()
+    headers = {name.decode('latin1').lower(): value.decode('latin1') for name, value in scope['headers']}
+    request_id = headers.get('x-request-id') or uuid.uuid4().hex
+    query = dict(parse_qsl(scope['query_string'].decode('latin1')))
+    try:
+        channels = events.parse_channels(query.get('channels'))
+        last_event_id = headers.get('last-event-id') or query.get('last_event_id')
+    except ValueError as e:
+        await send_error(send, 400, str(e))
+        return
+
+    loop = asyncio.get_running_loop()
+    wake = asyncio.Event()
+    try:
+        subscription = events.hub.subscribe(channels, last_event_id)
+    except events.TooManySubscribers as e:
+        await send_error(send, 503, str(e))
+        return
+    # Publishers run on executor threads
+    subscription.notify = lambda: loop.call_soon_threadsafe(wake.set)
+    wake.set()
+
+    async def watch_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    watcher = asyncio.ensure_future(watch_disconnect())
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+            (b'access-control-allow-origin', b'*'),
+            (b'x-request-id', request_id.encode('latin1')),
+        ]})
+        opener = f'retry: 5000\n: subscribed {",".join(sorted(channels))}\n\n'
+        await send({'type': 'http.response.body', 'body': opener.encode(), 'more_body': True})
+        while not watcher.done():
+            try:
+                await asyncio.wait_for(wake.wait(), backend_api.EVENT_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                await send({'type': 'http.response.body', 'body': b': keepalive\n\n', 'more_body': True})
+                continue
+            wake.clear()
+            chunks = []
+            event = subscription.get_nowait()
+            while event is not None:
+                chunks.append(event.to_sse())
+                event = subscription.get_nowait()
+            if chunks:
+                await send({'type': 'http.response.body', 'body': ''.join(chunks).encode(), 'more_body': True})
+    finally:
+        watcher.cancel()
+        subscription.close()
+        log.info('request', method='GET', path=scope['path'], endpoint='event_stream', status=200,
+                 request_id=request_id, duration_ms=round((time.perf_counter() - started) * 1000, 3))
+
+
+class Application:
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.bridge = WsgiBridge(flask_app.wsgi_app)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            if scope['path'] == '/api/events' and scope['method'] == 'GET':
+                await event_stream(scope, receive, send)
+            else:
+                await self.bridge(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.bridge.executor.shutdown(wait=True)
+                backend_api.writer.stop()
+                backend_api.notifier.stop()
+                db_pool.get_pool(self.flask_app).close_all()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+app = Application(backend_api.app)
+
+
+# Executor occupancy and load shedding
+@backend_api.app.route('/api/metrics/asgi', methods=['GET'])
+def asgi_metrics():
+    return jsonify(app.bridge.stats())
+
+metrics.register_gauges('asgi', lambda: app.bridge.stats())
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=1)
+    args = parser.parse_args()
+
+    try:
+        import uvicorn
+    except ImportError:
+        sys.exit('The ASGI serving mode needs an ASGI server: pip install uvicorn')
+    uvicorn.run('asgi:app', host=args.host, port=args.port, workers=args.workers, log_level='warning')
@@ -1,73 +1,112 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
 import sqlite3
 import datetime
 import json
-import time
-import random
+import atexit
+import os
+
+import brackets
+import counters
+import db_pool
+import events
+import feeds
+import metrics
+import notifications
+import ratings
+import recommendations
+import request_log as log
+import search
+import standings
+import write_queue
+from bulk_import import BulkParseError, is_bulk_body, iter_records
+from db_pool import get_db_connection
+from pagination import (InvalidPageRequest, ListQuery, decode_cursor, encode_cursor,
+                        page_response, parse_limit)
+from request_log import request_debug
+from response_cache import cached, response_cache
+from streaming import stream_response
+from users import get_or_create_user, get_or_create_users, username_cache
 
 app = Flask(__name__)
-CORS(app)  # Enable CORS for frontend
+CORS(app, expose_headers=['ETag', 'X-Next-Cursor', 'X-Request-ID'])  # Enable CORS for frontend
 
-DATABASE = '../../tournament_app.db'
+DATABASE = os.environ.get('DATABASE', '../../tournament_app.db')
+COUNTER_RECONCILE_SECONDS = int(os.environ.get('COUNTER_RECONCILE_SECONDS', 3600))
+FEED_TRIM_SECONDS = int(os.environ.get('FEED_TRIM_SECONDS', 600))
+GRAPH_REFRESH_SECONDS = int(os.environ.get('GRAPH_REFRESH_SECONDS', 60))
 
-def get_db_connection():
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    # Enable foreign key constraints
-    conn.execute('PRAGMA foreign_keys = ON')
-    return conn
+# Connections are pooled and returned automatically when the request ends;
+# their statements are timed for /api/metrics
+db_pool.init_app(app, DATABASE, max_size=8, factory=metrics.connection_factory())
+# JSON logs with request ids and timings
+log.init_app(app)
+# Per-route latency histograms
+metrics.init_app(app)
+# Counters are trigger-maintained; periodically repair any drift
+if COUNTER_RECONCILE_SECONDS > 0:
+    counters.start_reconciler(db_pool.get_pool(app), COUNTER_RECONCILE_SECONDS)
+# Timelines grow on every post; cut them back to feeds.TIMELINE_SIZE
+if FEED_TRIM_SECONDS > 0:
+    feeds.start_trimmer(db_pool.get_pool(app), FEED_TRIM_SECONDS)
+# Request writes go through one writer thread that group-commits them
+writer = write_queue.WriteQueue(db_pool.get_pool(app).connect)
+writer.start()
+atexit.register(writer.stop)
+# Handlers only queue notifications; a background worker batches the writes
+notifier = notifications.Notifier(db_pool.get_pool(app))
+notifier.start()
+atexit.register(notifier.stop)
+# In-memory follow graph for recommendations, caught up from graph_changes
+social_graph = recommendations.SocialGraph()
+if GRAPH_REFRESH_SECONDS > 0:
+    recommendations.start_refresher(social_graph, db_pool.get_pool(app), GRAPH_REFRESH_SECONDS)
 
 def dict_factory(cursor, row):
     """Convert sqlite3.Row to dictionary"""
     return {col[0]: row[idx] for idx, col in enumerate(cursor.description)}
 
-def generate_unique_email(username, conn):
-    """Generate a unique email for a user to avoid UNIQUE constraint violations"""
-    # Try the basic format first
-    basic_email = f"{username}@example.com"
-    existing = conn.execute('SELECT id FROM users WHERE email = ?', (basic_email,)).fetchone()
-    
-    if not existing:
-        return basic_email
-    
-    # If basic email exists, add timestamp
-    timestamp_email = f"{username}_{int(time.time())}@example.com"
-    existing = conn.execute('SELECT id FROM users WHERE email = ?', (timestamp_email,)).fetchone()
-    
-    if not existing:
-        return timestamp_email
-    
-    # If timestamp email also exists (very rare), add random number
-    unique_email = f"{username}_{int(time.time())}_{random.randint(1000,9999)}@example.com"
-    return unique_email
-
 # ==================== TOURNAMENTS CRUD ====================
 
+# List endpoints take ?limit=, ?cursor= (from the X-Next-Cursor header) and
+# ?fields= (comma separated subset of the fields below).
+
+TOURNAMENT_LIST = ListQuery(
+    source='tournaments',
+    fields={name: name for name in (
+        'id', 'title', 'description', 'game_type', 'prize_pool', 'max_participants',
+        'start_date', 'end_date', 'status', 'organizer_id', 'created_at')},
+    sort_keys=("COALESCE(start_date, '')", 'id'),
+)
+
+# Email is deliberately not exposed by the list endpoint
+USER_LIST = ListQuery(
+    source='users',
+    fields={name: name for name in ('id', 'username', 'bio', 'created_at', 'is_active')},
+    sort_keys=("COALESCE(created_at, '')", 'id'),
+    descending=True,
+)
+
 @app.route('/api/tournaments', methods=['GET'])
+@cached(lambda: [('tournaments', 0)])
 def get_all_tournaments():
     conn = get_db_connection()
-    tournaments = conn.execute('''
-        SELECT id, title, description, game_type, prize_pool, max_participants, 
-               start_date, end_date, status, organizer_id, created_at
-        FROM tournaments
-        ORDER BY start_date ASC
-    ''').fetchall()
-    conn.close()
+    try:
+        tournaments, next_cursor = TOURNAMENT_LIST.fetch_page(conn, request.args)
+    except InvalidPageRequest as e:
+        return jsonify({'error': str(e)}), 400
     
-    return jsonify([dict(row) for row in tournaments])
+    return page_response(tournaments, next_cursor)
 
 @app.route('/api/users', methods=['GET'])
 def get_all_users():
     conn = get_db_connection()
-    users = conn.execute('''
-        SELECT id, username, email, bio, created_at, is_active
-        FROM users
-        ORDER BY created_at DESC
-    ''').fetchall()
-    conn.close()
+    try:
+        users, next_cursor = USER_LIST.fetch_page(conn, request.args)
+    except InvalidPageRequest as e:
+        return jsonify({'error': str(e)}), 400
     
-    return jsonify([dict(row) for row in users])
+    return page_response(users, next_cursor)
 
 @app.route('/api/user/<userid>', methods=['GET'])
 def profile(userid):
@@ -77,7 +116,6 @@ def profile(userid):
         FROM users
         WHERE id = ?
     ''', (userid,)).fetchone()
-    conn.close()
     
     if user:
         return jsonify(dict(user))
@@ -86,27 +124,45 @@ def profile(userid):
 
 # ==================== TOURNAMENT PARTICIPANTS CRUD ====================
 
+PARTICIPANT_LIST = ListQuery(
+    source='tournament_participants tp JOIN users u ON tp.user_id = u.id',
+    fields={
+        'id': 'tp.id',
+        'tournament_id': 'tp.tournament_id',
+        'user_id': 'tp.user_id',
+        'team_name': 'tp.team_name',
+        'registration_date': 'tp.registration_date',
+        'status': 'tp.status',
+        'placement': 'tp.placement',
+        'username': 'u.username',
+    },
+    sort_keys=("COALESCE(tp.registration_date, '')", 'tp.id'),
+    descending=True,
+)
+
 @app.route('/api/tournaments/<tournament_id>/participants', methods=['GET'])
+@cached(lambda tournament_id: [('participants', tournament_id), ('users', 0)])
 def get_tournament_participants(tournament_id):
     conn = get_db_connection()
-    participants = conn.execute('''
-        SELECT tp.*, u.username 
-        FROM tournament_participants tp
-        JOIN users u ON tp.user_id = u.id
-        WHERE tp.tournament_id = ?
-        ORDER BY tp.registration_date DESC
-    ''', (tournament_id,)).fetchall()
-    conn.close()
+    try:
+        participants, next_cursor = PARTICIPANT_LIST.fetch_page(
+            conn, request.args, 'tp.tournament_id = ?', (tournament_id,))
+    except InvalidPageRequest as e:
+        return jsonify({'error': str(e)}), 400
     
-    return jsonify([dict(row) for row in participants])
+    return page_response(participants, next_cursor)
 
 @app.route('/api/tournaments/<tournament_id>/participants', methods=['POST'])
 def join_tournament(tournament_id):
+    # CSV, NDJSON or JSON array bodies are roster imports
+    if is_bulk_body(request):
+        return import_roster(tournament_id)
+    
     data = request.get_json()
     username = data.get('username')
     team_name = data.get('teamName', '')
     
-    print(f"🔍 DEBUG: Joining tournament {tournament_id} with username: {username}, team: {team_name}")
+    log.debug('join_tournament.start', tournament_id=tournament_id, username=username, team_name=team_name)
     
     conn = get_db_connection()
     
@@ -114,81 +170,187 @@ def join_tournament(tournament_id):
         # First, check if tournament exists
         tournament = conn.execute('SELECT id FROM tournaments WHERE id = ?', (tournament_id,)).fetchone()
         if not tournament:
-            print(f"🔍 DEBUG: Tournament {tournament_id} does not exist!")
-            
-            # List existing tournaments for debugging
-            existing_tournaments = conn.execute('SELECT id, title FROM tournaments').fetchall()
-            print(f"🔍 DEBUG: Available tournaments: {[dict(t) for t in existing_tournaments]}")
+            if request_debug():
+                # Diagnostic only: list what does exist
+                existing_tournaments = conn.execute('SELECT id, title FROM tournaments').fetchall()
+                log.debug('join_tournament.unknown_tournament', tournament_id=tournament_id,
+                          available=[dict(t) for t in existing_tournaments])
             
-            conn.close()
             return jsonify({'error': f'Tournament {tournament_id} does not exist'}), 404
         
-        print(f"🔍 DEBUG: Tournament {tournament_id} exists")
-        
-        # Check if user exists by username first
-        user = conn.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone()
-        if not user:
-            # Generate a unique email to avoid conflicts
-            unique_email = generate_unique_email(username, conn)
-            print(f"🔍 DEBUG: Creating new user with email: {unique_email}")
+        def join(conn):
+            # Find the user by username, creating them if needed
+            user_id, new_user = get_or_create_user(conn, username)
+            
+            # Check if already joined
+            existing = conn.execute('''
+                SELECT id FROM tournament_participants 
+                WHERE tournament_id = ? AND user_id = ?
+            ''', (tournament_id, user_id)).fetchone()
+            
+            if existing:
+                return user_id, new_user, existing['id'], False
             
+            # Join tournament
             cursor = conn.execute('''
-                INSERT INTO users (username, email, password_hash)
+                INSERT INTO tournament_participants (tournament_id, user_id, team_name)
                 VALUES (?, ?, ?)
-            ''', (username, unique_email, "demo_hash"))
-            user_id = cursor.lastrowid
-            print(f"🔍 DEBUG: Created user with ID: {user_id}")
-        else:
-            user_id = user['id']
-            print(f"🔍 DEBUG: Found existing user with ID: {user_id}")
+            ''', (tournament_id, user_id, team_name))
+            return user_id, new_user, cursor.lastrowid, True
         
-        # Check if already joined
-        existing = conn.execute('''
-            SELECT id FROM tournament_participants 
-            WHERE tournament_id = ? AND user_id = ?
-        ''', (tournament_id, user_id)).fetchone()
-        
-        if existing:
-            print(f"🔍 DEBUG: User already joined tournament")
-            conn.close()
+        user_id, new_user, participant_id, joined = writer.run(join)
+        log.debug('join_tournament.user', user_id=user_id, created=new_user)
+        username_cache.put(username, user_id)
+        if not joined:
+            log.debug('join_tournament.already_joined', participant_id=participant_id)
             return jsonify({'error': 'Already joined tournament'}), 400
         
-        # Join tournament
-        print(f"🔍 DEBUG: Inserting participant: tournament_id={tournament_id}, user_id={user_id}, team_name={team_name}")
-        cursor = conn.execute('''
-            INSERT INTO tournament_participants (tournament_id, user_id, team_name)
-            VALUES (?, ?, ?)
-        ''', (tournament_id, user_id, team_name))
+        log.debug('join_tournament.committed', participant_id=participant_id)
+        events.publish(f'tournament:{tournament_id}', 'participant_joined',
+                       participant_id=participant_id, user_id=user_id, username=username, team_name=team_name)
         
-        participant_id = cursor.lastrowid
-        print(f"🔍 DEBUG: Created participant with ID: {participant_id}")
+        return jsonify({'success': True, 'message': 'Successfully joined tournament'})
+    except Exception as e:
+        log.error('join_tournament.failed', exc_info=True, tournament_id=tournament_id)
+        return jsonify({'error': str(e)}), 500
+
+ROSTER_BATCH_SIZE = 500
+ROSTER_MAX_ITEMS = 50000
+ROSTER_MAX_ERRORS = 100
+
+def import_roster(tournament_id):
+    """Register many participants from a CSV (username, team_name) or NDJSON body.
+
+    The whole body is read and validated first, names deduplicated in
+    memory; only then is one write queued, so a slow upload never holds the
+    write lock. It upserts users in batches of ROSTER_BATCH_SIZE, skips
+    existing registrations and enforces max_participants. Only counts and
+    the first errors are kept.
+    """
+    summary = {'registered': 0, 'duplicates': 0, 'already_registered': 0, 'rejected_full': 0, 'invalid': 0}
+    errors = []
+    
+    def add_error(index, message):
+        summary['invalid'] += 1
+        if len(errors) < ROSTER_MAX_ERRORS:
+            errors.append({'index': index, 'error': message})
+    
+    seen = set()
+    rows = []
+    try:
+        for index, record in iter_records(request, max_items=ROSTER_MAX_ITEMS):
+            if not isinstance(record, dict):
+                add_error(index, 'Row must be an object')
+                continue
+            username = record.get('username')
+            if username is not None and not isinstance(username, str):
+                add_error(index, 'username must be a string')
+                continue
+            username = (username or '').strip()
+            if not username:
+                add_error(index, 'username is required')
+                continue
+            team_name = record.get('team_name', record.get('teamName', '')) or ''
+            if not isinstance(team_name, str):
+                add_error(index, 'team_name must be a string')
+                continue
+            if username in seen:
+                summary['duplicates'] += 1
+                continue
+            seen.add(username)
+            rows.append((username, team_name))
+    except BulkParseError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def register(conn):
+        """Returns (counts, {username: user_id} resolved), or None if there is no such tournament"""
+        tournament = conn.execute(
+            'SELECT max_participants FROM tournaments WHERE id = ?', (tournament_id,)).fetchone()
+        if not tournament:
+            return None
         
-        conn.commit()
-        print(f"🔍 DEBUG: Transaction committed successfully")
-        conn.close()
+        capacity = None
+        if tournament['max_participants']:
+            registered = conn.execute(
+                'SELECT COUNT(*) FROM tournament_participants WHERE tournament_id = ?',
+                (tournament_id,)).fetchone()[0]
+            capacity = max(tournament['max_participants'] - registered, 0)
         
-        return jsonify({'success': True, 'message': 'Successfully joined tournament'})
+        counts = {'registered': 0, 'already_registered': 0, 'rejected_full': 0}
+        resolved = {}
+        for start in range(0, len(rows), ROSTER_BATCH_SIZE):
+            batch = rows[start:start + ROSTER_BATCH_SIZE]
+            if capacity == 0:
+                # Full: don't create users that can't be registered anyway, but
+                # still tell registered ones apart from rejected ones
+                names = json.dumps([username for username, _ in batch])
+                already = conn.execute('''
+                    SELECT COUNT(*) FROM tournament_participants tp JOIN users u ON u.id = tp.user_id
+                    WHERE tp.tournament_id = ? AND u.username IN (SELECT value FROM json_each(?))
+                ''', (tournament_id, names)).fetchone()[0]
+                counts['already_registered'] += already
+                counts['rejected_full'] += len(batch) - already
+                continue
+            user_ids, _ = get_or_create_users(conn, (username for username, _ in batch))
+            resolved.update(user_ids)
+            joined = {row[0] for row in conn.execute('''
+                SELECT user_id FROM tournament_participants
+                WHERE tournament_id = ? AND user_id IN (SELECT value FROM json_each(?))
+            ''', (tournament_id, json.dumps(list(user_ids.values()))))}
+            
+            inserts = []
+            for username, team_name in batch:
+                user_id = user_ids[username]
+                if user_id in joined:
+                    counts['already_registered'] += 1
+                elif capacity is not None and len(inserts) >= capacity:
+                    counts['rejected_full'] += 1
+                else:
+                    inserts.append((tournament_id, user_id, team_name))
+            conn.executemany('''
+                INSERT INTO tournament_participants (tournament_id, user_id, team_name)
+                VALUES (?, ?, ?)
+            ''', inserts)
+            counts['registered'] += len(inserts)
+            if capacity is not None:
+                capacity -= len(inserts)
+        return counts, resolved
+    
+    try:
+        outcome = writer.run(register)
     except Exception as e:
-        print(f"🔍 DEBUG: Exception occurred: {str(e)}")
-        conn.close()
+        log.error('import_roster.failed', exc_info=True, tournament_id=tournament_id)
         return jsonify({'error': str(e)}), 500
+    if outcome is None:
+        return jsonify({'error': f'Tournament {tournament_id} does not exist'}), 404
+    
+    counts, resolved = outcome
+    summary.update(counts)
+    for username, user_id in resolved.items():
+        username_cache.put(username, user_id)
+    if summary['registered']:
+        # One summary event instead of one per row
+        events.publish(f'tournament:{tournament_id}', 'participants_imported', registered=summary['registered'])
+    return jsonify({'success': True, **summary, 'errors': errors})
+
+class UsernameTaken(Exception):
+    """Raised inside a write to roll it back when a rename would collide"""
 
 @app.route('/api/participants/<int:participant_id>', methods=['PUT'])
 def update_participant(participant_id):
     data = request.get_json()
     
-    conn = get_db_connection()
-    try:
-        # Get the current participant to find the user_id
+    def update(conn):
+        # Get the current participant to find the user_id (and name, for the cache)
         participant = conn.execute('''
-            SELECT user_id FROM tournament_participants WHERE id = ?
+            SELECT tp.user_id, tp.tournament_id, u.username
+            FROM tournament_participants tp
+            JOIN users u ON tp.user_id = u.id
+            WHERE tp.id = ?
         ''', (participant_id,)).fetchone()
         
         if not participant:
-            conn.close()
-            return jsonify({'error': 'Participant not found'}), 404
-        
-        user_id = participant['user_id']
+            return None, False
         
         # Update team name in tournament_participants
         if 'teamName' in data:
@@ -203,143 +365,182 @@ def update_participant(participant_id):
             # Check if the new username already exists for a different user
             existing_user = conn.execute('''
                 SELECT id FROM users WHERE username = ? AND id != ?
-            ''', (data['username'], user_id)).fetchone()
+            ''', (data['username'], participant['user_id'])).fetchone()
             
             if existing_user:
-                conn.close()
-                return jsonify({'error': 'Username already exists'}), 400
+                raise UsernameTaken()
             
             conn.execute('''
                 UPDATE users 
                 SET username = ?
                 WHERE id = ?
-            ''', (data['username'], user_id))
+            ''', (data['username'], participant['user_id']))
+            return participant, True
+        return participant, False
+    
+    try:
+        participant, renamed = writer.run(update)
+        if not participant:
+            return jsonify({'error': 'Participant not found'}), 404
         
-        conn.commit()
-        conn.close()
+        user_id = participant['user_id']
+        if renamed:
+            username_cache.invalidate(participant['username'])
+            username_cache.put(data['username'], user_id)
+        events.publish(f"tournament:{participant['tournament_id']}", 'participant_updated',
+                       participant_id=participant_id, user_id=user_id)
         
         return jsonify({'success': True, 'message': 'Participant updated'})
+    except UsernameTaken:
+        # The team name change is rolled back with it
+        return jsonify({'error': 'Username already exists'}), 400
     except Exception as e:
-        conn.close()
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/participants/<int:participant_id>', methods=['DELETE'])
 def remove_participant(participant_id):
-    print(f"🔍 DEBUG: Attempting to delete participant with ID: {participant_id} (type: {type(participant_id)})")
     conn = get_db_connection()
+    # Diagnostics (table counts, id listing, re-check) only run for debug requests
+    diagnose = request_debug()
     try:
-        # Check current participants count
-        total_before = conn.execute('SELECT COUNT(*) FROM tournament_participants').fetchone()[0]
-        print(f"🔍 DEBUG: Total participants before deletion: {total_before}")
+        if diagnose:
+            total_before = conn.execute('SELECT COUNT(*) FROM tournament_participants').fetchone()[0]
         
-        # Check if participant exists before deletion
-        existing = conn.execute('SELECT * FROM tournament_participants WHERE id = ?', (participant_id,)).fetchone()
-        if existing:
-            print(f"🔍 DEBUG: Found participant: {dict(existing)}")
-        else:
-            print(f"🔍 DEBUG: No participant found with ID {participant_id}")
-            
-            # Let's also check what IDs exist
-            all_ids = conn.execute('SELECT id FROM tournament_participants ORDER BY id').fetchall()
-            print(f"🔍 DEBUG: All existing participant IDs: {[row[0] for row in all_ids]}")
-            
-            conn.close()
-            return jsonify({'error': 'Participant not found'}), 404
-        
-        # Delete the participant
-        print(f"🔍 DEBUG: Executing DELETE for participant ID: {participant_id}")
-        cursor = conn.execute('DELETE FROM tournament_participants WHERE id = ?', (participant_id,))
-        rows_affected = cursor.rowcount
-        print(f"🔍 DEBUG: Rows affected by DELETE: {rows_affected}")
+        deleted = writer.execute('''
+            DELETE FROM tournament_participants WHERE id = ? RETURNING tournament_id
+        ''', (participant_id,)).rows
+        rows_affected = len(deleted)
         
         if rows_affected == 0:
-            print(f"🔍 DEBUG: WARNING: No rows were affected by DELETE operation!")
-            conn.close()
-            return jsonify({'error': 'No rows deleted'}), 400
-        
-        # Commit the transaction
-        conn.commit()
-        print(f"🔍 DEBUG: Delete transaction committed successfully")
-        
-        # Verify deletion by counting again
-        total_after = conn.execute('SELECT COUNT(*) FROM tournament_participants').fetchone()[0]
-        print(f"🔍 DEBUG: Total participants after deletion: {total_after}")
-        
-        # Double check specific participant is gone
-        check = conn.execute('SELECT * FROM tournament_participants WHERE id = ?', (participant_id,)).fetchone()
-        if check:
-            print(f"🔍 DEBUG: ERROR: Participant still exists after deletion: {dict(check)}")
-            conn.close()
-            return jsonify({'error': 'Deletion failed - participant still exists'}), 500
-        else:
-            print(f"🔍 DEBUG: SUCCESS: Participant {participant_id} successfully removed from database")
+            if diagnose:
+                all_ids = conn.execute('SELECT id FROM tournament_participants ORDER BY id').fetchall()
+                log.debug('remove_participant.not_found', participant_id=participant_id,
+                          existing_ids=[row[0] for row in all_ids])
+            return jsonify({'error': 'Participant not found'}), 404
         
-        conn.close()
+        log.debug('remove_participant.committed', participant_id=participant_id, rows_affected=rows_affected)
+        events.publish(f"tournament:{deleted[0]['tournament_id']}", 'participant_removed',
+                       participant_id=participant_id)
         
-        return jsonify({
+        result = {
             'success': True, 
             'message': 'Participant removed',
-            'participants_before': total_before,
-            'participants_after': total_after,
             'rows_affected': rows_affected
-        })
+        }
+        
+        if diagnose:
+            total_after = conn.execute('SELECT COUNT(*) FROM tournament_participants').fetchone()[0]
+            still_there = conn.execute(
+                'SELECT 1 FROM tournament_participants WHERE id = ?', (participant_id,)).fetchone()
+            log.debug('remove_participant.verified', participant_id=participant_id,
+                      participants_before=total_before, participants_after=total_after,
+                      still_exists=bool(still_there))
+            result['participants_before'] = total_before
+            result['participants_after'] = total_after
+        
+        return jsonify(result)
     except Exception as e:
-        print(f"🔍 DEBUG: Exception during deletion: {str(e)}")
-        import traceback
-        print(f"🔍 DEBUG: Traceback: {traceback.format_exc()}")
-        conn.close()
+        log.error('remove_participant.failed', exc_info=True, participant_id=participant_id)
         return jsonify({'error': str(e)}), 500
 
 # ==================== USER CONNECTIONS CRUD ====================
 
+# Connection buckets: (name, column matching the user, other side, state, username key)
+CONNECTION_BUCKETS = [
+    ('followers', 'following_id', 'follower_id', 'accepted', 'follower_username'),
+    ('following', 'follower_id', 'following_id', 'accepted', 'following_username'),
+    ('incoming_pending', 'following_id', 'follower_id', 'pending', 'requester_username'),
+    ('outgoing_pending', 'follower_id', 'following_id', 'pending', 'target_username'),
+]
+
 @app.route('/api/users/<int:user_id>/connections', methods=['GET'])
 def get_user_connections(user_id):
+    """One page per bucket (newest first) plus total counts, streamed as JSON.
+
+    Query params: limit (per bucket) and <bucket>_cursor from next_cursors.
+    """
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        cursors = {name: decode_cursor(request.args.get(f'{name}_cursor'), 2)
+                   for name, *_ in CONNECTION_BUCKETS}
+    except InvalidPageRequest as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Each bucket is an index range scan on (<side>, connection_type, created_at)
+    # that stops after limit + 1 rows; users are joined only for the page.
+    branches = []
+    params = {'user_id': user_id, 'fetch': limit + 1}
+    for index, (name, side, other, state, _) in enumerate(CONNECTION_BUCKETS):
+        keyset = ''
+        if cursors[name]:
+            keyset = f'AND (uc.created_at, uc.id) < (:ts{index}, :id{index})'
+            params[f'ts{index}'], params[f'id{index}'] = cursors[name]
+        branches.append(f"""
+            SELECT * FROM (
+                SELECT {index} AS bucket, uc.id, uc.follower_id, uc.following_id,
+                       uc.connection_type, uc.created_at, uc.{other} AS other_id
+                FROM user_connections uc
+                WHERE uc.{side} = :user_id AND uc.connection_type = '{state}' {keyset}
+                ORDER BY uc.created_at DESC, uc.id DESC
+                LIMIT :fetch
+            )""")
+    page_sql = f"""
+        SELECT page.*, u.username AS other_username
+        FROM ({' UNION ALL '.join(branches)}) page
+        JOIN users u ON u.id = page.other_id
+        ORDER BY page.bucket, page.created_at DESC, page.id DESC
+    """
+
     conn = get_db_connection()
-    
-    # Get followers (people following this user)
-    followers = conn.execute('''
-        SELECT uc.*, u.username as follower_username, u.email as follower_email
-        FROM user_connections uc
-        JOIN users u ON uc.follower_id = u.id
-        WHERE uc.following_id = ? AND uc.connection_type = 'accepted'
-        ORDER BY uc.created_at DESC
-    ''', (user_id,)).fetchall()
-    
-    # Get following (people this user follows)
-    following = conn.execute('''
-        SELECT uc.*, u.username as following_username, u.email as following_email
-        FROM user_connections uc
-        JOIN users u ON uc.following_id = u.id
-        WHERE uc.follower_id = ? AND uc.connection_type = 'accepted'
-        ORDER BY uc.created_at DESC
-    ''', (user_id,)).fetchall()
-    
-    # Get incoming pending requests (people wanting to follow this user)
-    incoming_pending = conn.execute('''
-        SELECT uc.*, u.username as requester_username, u.email as requester_email
-        FROM user_connections uc
-        JOIN users u ON uc.follower_id = u.id
-        WHERE uc.following_id = ? AND uc.connection_type = 'pending'
-        ORDER BY uc.created_at DESC
-    ''', (user_id,)).fetchall()
-    
-    # Get outgoing pending requests (requests this user sent)
-    outgoing_pending = conn.execute('''
-        SELECT uc.*, u.username as target_username, u.email as target_email
-        FROM user_connections uc
-        JOIN users u ON uc.following_id = u.id
-        WHERE uc.follower_id = ? AND uc.connection_type = 'pending'
-        ORDER BY uc.created_at DESC
-    ''', (user_id,)).fetchall()
-    
-    conn.close()
-    
-    return jsonify({
-        'followers': [dict(row) for row in followers],
-        'following': [dict(row) for row in following],
-        'incoming_pending': [dict(row) for row in incoming_pending],
-        'outgoing_pending': [dict(row) for row in outgoing_pending]
-    })
+    counts = {name: 0 for name, *_ in CONNECTION_BUCKETS}
+    for row in conn.execute('''
+        SELECT following_id = :user_id AS incoming, connection_type, COUNT(*) AS total
+        FROM user_connections
+        WHERE following_id = :user_id OR follower_id = :user_id
+        GROUP BY incoming, connection_type
+    ''', {'user_id': user_id}):
+        for name, side, _, state, _ in CONNECTION_BUCKETS:
+            if row['connection_type'] == state and row['incoming'] == (side == 'following_id'):
+                counts[name] = row['total']
+
+    def generate():
+        yield '{"user_id": %d, "counts": %s' % (user_id, json.dumps(counts))
+        next_cursors = {}
+        rows = conn.execute(page_sql, params)
+        current = -1
+        emitted = 0
+        for row in rows:
+            bucket = row['bucket']
+            while current < bucket:
+                if current >= 0:
+                    yield ']'
+                current += 1
+                emitted = 0
+                yield ', "%s": [' % CONNECTION_BUCKETS[current][0]
+            if emitted == limit:
+                # The extra row only tells us another page exists
+                next_cursors[CONNECTION_BUCKETS[bucket][0]] = encode_cursor(last)
+                continue
+            name_key = CONNECTION_BUCKETS[bucket][4]
+            item = {
+                'id': row['id'],
+                'follower_id': row['follower_id'],
+                'following_id': row['following_id'],
+                'connection_type': row['connection_type'],
+                'created_at': row['created_at'],
+                name_key: row['other_username'],
+            }
+            yield (', ' if emitted else '') + json.dumps(item)
+            last = (row['created_at'], row['id'])
+            emitted += 1
+        while current < len(CONNECTION_BUCKETS) - 1:
+            if current >= 0:
+                yield ']'
+            current += 1
+            yield ', "%s": [' % CONNECTION_BUCKETS[current][0]
+        yield '], "next_cursors": %s}' % json.dumps(next_cursors)
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
 
 @app.route('/api/users/follow', methods=['POST'])
 def follow_user():
@@ -347,9 +548,7 @@ def follow_user():
     follower_id = data.get('follower_id')
     following_id = data.get('following_id')
 
-    conn = get_db_connection()
-    
-    try:
+    def follow(conn):
         # Check if connection already exists
         existing = conn.execute('''
             SELECT id FROM user_connections 
@@ -357,21 +556,26 @@ def follow_user():
         ''', (follower_id, following_id)).fetchone()
         
         if existing:
-            conn.close()
-            return jsonify({'error': 'Connection already exists'}), 400
+            return None
         
         # Create follow request
-        conn.execute('''
+        return conn.execute('''
             INSERT INTO user_connections (follower_id, following_id, connection_type)
             VALUES (?, ?, 'pending')
-        ''', (follower_id, following_id))
+        ''', (follower_id, following_id)).lastrowid
+    
+    try:
+        connection_id = writer.run(follow)
+        if connection_id is None:
+            return jsonify({'error': 'Connection already exists'}), 400
         
-        conn.commit()
-        conn.close()
+        events.publish(f'user:{following_id}', 'connection_requested',
+                       connection_id=connection_id, follower_id=follower_id, following_id=following_id)
+        notifier.notify(following_id, 'new_follower', actor_id=follower_id,
+                        related_type='user', related_id=follower_id)
         
         return jsonify({'success': True, 'message': 'Follow request sent'})
     except Exception as e:
-        conn.close()
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/connections/<int:connection_id>/status', methods=['PUT'])
@@ -379,17 +583,14 @@ def update_connection_status(connection_id):
     data = request.get_json()
     new_status = data.get('status')  # 'accepted', 'blocked'
     
-    conn = get_db_connection()
-    
-    try:
+    def update(conn):
         # Get connection details for mutual follow logic
         connection = conn.execute('''
             SELECT * FROM user_connections WHERE id = ?
         ''', (connection_id,)).fetchone()
         
         if not connection:
-            conn.close()
-            return jsonify({'error': 'Connection not found'}), 404
+            return None, False
         
         # Update connection status
         conn.execute('''
@@ -399,7 +600,9 @@ def update_connection_status(connection_id):
         ''', (new_status, connection_id))
         
         # If accepting, create mutual follow
+        followed_back = False
         if new_status == 'accepted':
+            feeds.follow(conn, connection['follower_id'], connection['following_id'])
             # Check if mutual connection already exists
             mutual_exists = conn.execute('''
                 SELECT id FROM user_connections 
@@ -411,31 +614,134 @@ def update_connection_status(connection_id):
                     INSERT INTO user_connections (follower_id, following_id, connection_type)
                     VALUES (?, ?, 'accepted')
                 ''', (connection['following_id'], connection['follower_id']))
+                feeds.follow(conn, connection['following_id'], connection['follower_id'])
+                followed_back = True
+        else:
+            feeds.unfollow(conn, connection['follower_id'], connection['following_id'])
+        return connection, followed_back
+    
+    try:
+        connection, followed_back = writer.run(update)
+        if not connection:
+            return jsonify({'error': 'Connection not found'}), 404
         
-        conn.commit()
-        conn.close()
+        for user_id in (connection['follower_id'], connection['following_id']):
+            events.publish(f'user:{user_id}', 'connection_updated', connection_id=connection_id,
+                           follower_id=connection['follower_id'], following_id=connection['following_id'],
+                           status=new_status)
+        if followed_back:
+            notifier.notify(connection['follower_id'], 'new_follower', actor_id=connection['following_id'],
+                            related_type='user', related_id=connection['following_id'])
         
         return jsonify({'success': True, 'message': f'Connection {new_status}'})
     except Exception as e:
-        conn.close()
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/connections/<int:connection_id>', methods=['DELETE'])
 def remove_connection(connection_id):
-    conn = get_db_connection()
+    def remove(conn):
+        deleted = conn.execute('''
+            DELETE FROM user_connections WHERE id = ? RETURNING follower_id, following_id
+        ''', (connection_id,)).fetchone()
+        if deleted:
+            feeds.unfollow(conn, deleted['follower_id'], deleted['following_id'])
+        return deleted
+    
     try:
-        conn.execute('DELETE FROM user_connections WHERE id = ?', (connection_id,))
-        conn.commit()
-        conn.close()
+        deleted = writer.run(remove)
+        if deleted:
+            for user_id in (deleted['follower_id'], deleted['following_id']):
+                events.publish(f'user:{user_id}', 'connection_removed', connection_id=connection_id,
+                               follower_id=deleted['follower_id'], following_id=deleted['following_id'])
         
         return jsonify({'success': True, 'message': 'Connection removed'})
     except Exception as e:
-        conn.close()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/users/<int:user_id>/recommendations', methods=['GET'])
+def get_recommendations(user_id):
+    """People you may know: friends of friends, most mutual connections first"""
+    try:
+        limit = parse_limit(request.args.get('limit'), default=recommendations.DEFAULT_LIMIT,
+                            maximum=recommendations.MAX_LIMIT)
+    except InvalidPageRequest as e:
+        return jsonify({'error': str(e)}), 400
+    
+    conn = get_db_connection()
+    if not conn.execute('SELECT 1 FROM users WHERE id = ?', (user_id,)).fetchone():
+        return jsonify({'error': 'User not found'}), 404
+    
+    return jsonify({'user_id': user_id,
+                    'recommendations': recommendations.recommend(social_graph, conn, user_id, limit)})
+
+# ==================== SOCIAL POSTS & FEED ====================
+
+POST_FIELDS = ('id', 'user_id', 'tournament_id', 'content', 'image_url', 'post_type',
+               'likes_count', 'comments_count', 'created_at')
+
+@app.route('/api/posts', methods=['POST'])
+def create_post():
+    data = request.get_json() or {}
+    if not data.get('user_id') or not data.get('content'):
+        return jsonify({'error': 'user_id and content are required'}), 400
+    
+    def create(conn):
+        post_id = conn.execute('''
+            INSERT INTO social_posts (user_id, tournament_id, content, image_url, post_type)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (data['user_id'], data.get('tournament_id'), data['content'], data.get('image_url'),
+              data.get('post_type', 'general'))).lastrowid
+        # Pushed into followers' timelines in the same transaction
+        return post_id, feeds.publish_post(conn, post_id, data['user_id'])
+    
+    try:
+        post_id, delivered = writer.run(create)
+        events.publish(f"user:{data['user_id']}", 'post_created', post_id=post_id)
+        
+        return jsonify({'success': True, 'post_id': post_id, 'delivered': delivered})
+    except sqlite3.IntegrityError:
+        return jsonify({'error': 'Unknown user, tournament or post type'}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/posts/<int:post_id>', methods=['DELETE'])
+def delete_post(post_id):
+    try:
+        # Timeline entries go with it (foreign key cascade)
+        deleted = writer.execute('DELETE FROM social_posts WHERE id = ? RETURNING user_id', (post_id,)).rows
+        if not deleted:
+            return jsonify({'error': 'Post not found'}), 404
+        events.publish(f"user:{deleted[0]['user_id']}", 'post_deleted', post_id=post_id)
+        
+        return jsonify({'success': True, 'message': 'Post deleted'})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/users/<int:user_id>/feed', methods=['GET'])
+def get_user_feed(user_id):
+    """Home timeline, newest first: followed users' posts and the user's own"""
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        cursor = decode_cursor(request.args.get('cursor'), 1)
+    except InvalidPageRequest as e:
+        return jsonify({'error': str(e)}), 400
+    
+    conn = get_db_connection()
+    post_ids = feeds.timeline_page(conn, user_id, limit + 1, cursor[0] if cursor else None)
+    next_cursor = encode_cursor(post_ids[limit - 1:limit]) if len(post_ids) > limit else None
+    posts = conn.execute(f'''
+        SELECT {', '.join(f'p.{name}' for name in POST_FIELDS)}, u.username
+        FROM social_posts p JOIN users u ON p.user_id = u.id
+        WHERE p.id IN (SELECT value FROM json_each(?))
+        ORDER BY p.id DESC
+    ''', (json.dumps(post_ids[:limit]),)).fetchall()
+    
+    return page_response(posts, next_cursor)
+
 # ==================== MATCH RESULTS CRUD ====================
 
 @app.route('/api/tournaments/<tournament_id>/matches', methods=['GET'])
+@cached(lambda tournament_id: [('matches', tournament_id), ('users', 0)])
 def get_tournament_matches(tournament_id):
     conn = get_db_connection()
     matches = conn.execute('''
@@ -449,50 +755,28 @@ def get_tournament_matches(tournament_id):
         JOIN users w ON mr.winner_id = w.id
         WHERE mr.tournament_id = ?
         ORDER BY mr.match_date DESC
-    ''', (tournament_id,)).fetchall()
-    conn.close()
+    ''', (tournament_id,))
     
-    return jsonify([dict(row) for row in matches])
+    return stream_response(matches)
 
 @app.route('/api/tournaments/<tournament_id>/matches', methods=['POST'])
 def report_match_result(tournament_id):
     data = request.get_json()
     
-    conn = get_db_connection()
-    
+    # Validated up front, so bad input fails with a 400 before any user is created
+    today = datetime.datetime.now().strftime('%Y-%m-%d')
     try:
-        # Find or create users
-        player1_name = data.get('player1')
-        player2_name = data.get('player2')
-        
-        # Get or create player 1
-        player1 = conn.execute('SELECT id FROM users WHERE username = ?', (player1_name,)).fetchone()
-        if not player1:
-            unique_email = generate_unique_email(player1_name, conn)
-            cursor1 = conn.execute('''
-                INSERT INTO users (username, email, password_hash)
-                VALUES (?, ?, ?)
-            ''', (player1_name, unique_email, "demo_hash"))
-            player1_id = cursor1.lastrowid
-        else:
-            player1_id = player1['id']
-        
-        # Get or create player 2
-        player2 = conn.execute('SELECT id FROM users WHERE username = ?', (player2_name,)).fetchone()
-        if not player2:
-            unique_email = generate_unique_email(player2_name, conn)
-            cursor2 = conn.execute('''
-                INSERT INTO users (username, email, password_hash)
-                VALUES (?, ?, ?)
-            ''', (player2_name, unique_email, "demo_hash"))
-            player2_id = cursor2.lastrowid
-        else:
-            player2_id = player2['id']
+        player1_name, player2_name, score1, score2, match_date, match_round = parse_match_item(data, today)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def report(conn):
+        # Get or create both players
+        player1_id, _ = get_or_create_user(conn, player1_name)
+        player2_id, _ = get_or_create_user(conn, player2_name)
+        players = [(player1_name, player1_id), (player2_name, player2_id)]
         
         # Determine winner
-        score1 = int(data.get('score1', 0))
-        score2 = int(data.get('score2', 0))
-        
         if score1 > score2:
             winner_id = player1_id
         elif score2 > score1:
@@ -501,7 +785,7 @@ def report_match_result(tournament_id):
             winner_id = player1_id  # Default to player1 for draws
         
         # Insert match result
-        conn.execute('''
+        cursor = conn.execute('''
             INSERT INTO match_results (
                 tournament_id, player1_id, player2_id, winner_id,
                 score_player1, score_player2, match_date, match_round
@@ -513,31 +797,184 @@ def report_match_result(tournament_id):
             winner_id,
             score1,
             score2,
-            data.get('date', datetime.datetime.now().strftime('%Y-%m-%d')),
-            data.get('match_round', 1)
+            match_date,
+            match_round
         ))
+        reported = {
+            'id': cursor.lastrowid, 'tournament_id': tournament_id,
+            'player1_id': player1_id, 'player2_id': player2_id,
+            'winner_id': winner_id, 'score_player1': score1, 'score_player2': score2,
+        }
+        standings.apply(conn, [(reported, 1)])
+        ratings.rate_matches(conn, [reported])
         
-        conn.commit()
-        conn.close()
+        # A result between the two players of a ready bracket match completes it
+        bracket_match_id = brackets.find_ready_match(conn, tournament_id, player1_id, player2_id)
+        ready = None
+        if bracket_match_id:
+            ready = brackets.record_result(conn, bracket_match_id, cursor.lastrowid, winner_id)
+        
+        return reported, players, bracket_match_id, ready
+    
+    try:
+        reported, players, bracket_match_id, ready = writer.run(report)
+        for name, user_id in players:
+            username_cache.put(name, user_id)
+        events.publish(f'tournament:{tournament_id}', 'match_reported', match_id=reported['id'],
+                       player1_id=reported['player1_id'], player2_id=reported['player2_id'],
+                       winner_id=reported['winner_id'], score1=reported['score_player1'],
+                       score2=reported['score_player2'])
+        if bracket_match_id:
+            events.publish(f'tournament:{tournament_id}', 'bracket_advanced',
+                           completed=bracket_match_id, ready=ready)
+        notify_match_players(reported)
         
         return jsonify({'success': True, 'message': 'Match result reported'})
     except Exception as e:
-        conn.close()
         return jsonify({'error': str(e)}), 500
 
+def notify_match_players(match):
+    """Tell both players a result was reported; grouped per tournament"""
+    for user_id, opponent_id in ((match['player1_id'], match['player2_id']),
+                                 (match['player2_id'], match['player1_id'])):
+        notifier.notify(user_id, 'match_result', actor_id=opponent_id,
+                        related_type='tournament', related_id=int(match['tournament_id']))
+
+def _item_int(item, name, default):
+    """An integer field of a bulk item; digit strings are accepted, floats and booleans are not"""
+    value = item.get(name, default)
+    if isinstance(value, str) and value.strip().lstrip('-').isdigit():
+        return int(value)
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(f'{name} must be an integer')
+    return value
+
+def parse_match_item(item, default_date):
+    """Validate one bulk match item; returns (player1, player2, score1, score2, date, round)"""
+    if not isinstance(item, dict):
+        raise ValueError('Item must be an object')
+    players = []
+    for name in ('player1', 'player2'):
+        player = item.get(name)
+        if not isinstance(player, str) or not player.strip():
+            raise ValueError('player1 and player2 must be non-empty strings')
+        players.append(player.strip())
+    score1 = _item_int(item, 'score1', 0)
+    score2 = _item_int(item, 'score2', 0)
+    match_round = _item_int(item, 'match_round', 1)
+    date = item.get('date', default_date)
+    if date is not None and not isinstance(date, str):
+        raise ValueError('date must be a string')
+    return (players[0], players[1], score1, score2, date, match_round)
+
+@app.route('/api/tournaments/<tournament_id>/matches/bulk', methods=['POST'])
+def bulk_report_match_results(tournament_id):
+    """Report many matches at once (JSON array or NDJSON body).
+
+    Every item is validated on its own and reported in `results`; once the
+    body is read, all valid matches are inserted in one write.
+    """
+    conn = get_db_connection()
+    if not conn.execute('SELECT 1 FROM tournaments WHERE id = ?', (tournament_id,)).fetchone():
+        return jsonify({'error': f'Tournament {tournament_id} does not exist'}), 404
+
+    today = datetime.datetime.now().strftime('%Y-%m-%d')
+    results = []
+    valid = []
+    try:
+        for index, item in iter_records(request):
+            try:
+                valid.append((index,) + parse_match_item(item, today))
+                results.append(None)
+            except ValueError as e:
+                results.append({'index': index, 'error': str(e)})
+    except BulkParseError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def report(conn):
+        # All player names resolved (and missing ones created) in one pass
+        user_ids, _ = get_or_create_users(
+            conn, (name for item in valid for name in (item[1], item[2])))
+
+        rows = []
+        for index, player1_name, player2_name, score1, score2, match_date, match_round in valid:
+            player1_id = user_ids[player1_name]
+            player2_id = user_ids[player2_name]
+            # Same rule as report_match_result: draws go to player 1
+            winner_id = player2_id if score2 > score1 else player1_id
+            rows.append((tournament_id, player1_id, player2_id, winner_id,
+                         score1, score2, match_date, match_round))
+
+        # The writer holds the write lock, so every id above this one is ours
+        last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM match_results').fetchone()[0]
+        conn.executemany('''
+            INSERT INTO match_results (
+                tournament_id, player1_id, player2_id, winner_id,
+                score_player1, score_player2, match_date, match_round
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        new_ids = [row[0] for row in conn.execute(
+            'SELECT id FROM match_results WHERE id > ? ORDER BY id', (last_id,))]
+        # rows start with the columns standings.apply() reads
+        reported = [{'id': match_id, **dict(zip(standings.MATCH_COLUMNS, row))}
+                    for match_id, row in zip(new_ids, rows)]
+        standings.apply(conn, ((match, 1) for match in reported))
+        ratings.rate_matches(conn, reported)
+
+        # Advance the bracket in report order
+        advanced = []
+        for match_id, row in zip(new_ids, rows):
+            bracket_match_id = brackets.find_ready_match(conn, tournament_id, row[1], row[2])
+            if bracket_match_id:
+                brackets.record_result(conn, bracket_match_id, match_id, row[3])
+                advanced.append(bracket_match_id)
+        return user_ids, new_ids, reported, advanced
+
+    try:
+        # The whole body is parsed by now: one write for the whole batch
+        user_ids, new_ids, reported, advanced = writer.run(report)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    for name, user_id in user_ids.items():
+        username_cache.put(name, user_id)
+
+    if new_ids:
+        events.publish(f'tournament:{tournament_id}', 'matches_reported', match_ids=new_ids)
+    if advanced:
+        events.publish(f'tournament:{tournament_id}', 'bracket_advanced', completed=advanced)
+    for match in reported:
+        notify_match_players(match)
+
+    new_ids = iter(new_ids)
+    for item in valid:
+        results[item[0]] = {'index': item[0], 'id': next(new_ids)}
+
+    return jsonify({
+        'success': True,
+        'created': len(valid),
+        'failed': len(results) - len(valid),
+        'results': results
+    })
+
 @app.route('/api/matches/<int:match_id>', methods=['PUT'])
 def update_match_result(match_id):
     data = request.get_json()
-    
-    conn = get_db_connection()
-    
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Body must be an object'}), 400
     try:
-        # Update match result
-        score1 = int(data.get('score1', 0))
-        score2 = int(data.get('score2', 0))
-        
+        score1 = _item_int(data, 'score1', 0)
+        score2 = _item_int(data, 'score2', 0)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def update(conn):
         # Determine winner based on current player IDs
-        match = conn.execute('SELECT player1_id, player2_id FROM match_results WHERE id = ?', (match_id,)).fetchone()
+        match = conn.execute('''
+            SELECT tournament_id, player1_id, player2_id, winner_id, score_player1, score_player2
+            FROM match_results WHERE id = ?
+        ''', (match_id,)).fetchone()
+        if not match:
+            return None
         if score1 > score2:
             winner_id = match['player1_id']
         elif score2 > score1:
@@ -550,168 +987,470 @@ def update_match_result(match_id):
             SET score_player1 = ?, score_player2 = ?, winner_id = ?, match_date = ?
             WHERE id = ?
         ''', (score1, score2, winner_id, data.get('date'), match_id))
-        
-        conn.commit()
-        conn.close()
+        # Swap the old result out of the standings and the new one in
+        standings.apply(conn, [
+            (match, -1),
+            ({**dict(match), 'winner_id': winner_id, 'score_player1': score1, 'score_player2': score2}, 1),
+        ])
+        # Re-rated in place while it is still both players' latest result
+        if ratings.unrate_match(conn, match_id):
+            ratings.rate_matches(conn, [
+                {**dict(match), 'id': match_id, 'score_player1': score1, 'score_player2': score2}])
+        brackets.change_result(conn, match_id, winner_id)
+        return match['tournament_id'], winner_id, score1, score2
+    
+    try:
+        updated = writer.run(update)
+        if not updated:
+            return jsonify({'error': 'Match not found'}), 404
+        tournament_id, winner_id, score1, score2 = updated
+        events.publish(f"tournament:{tournament_id}", 'match_updated', match_id=match_id,
+                       winner_id=winner_id, score1=score1, score2=score2)
         
         return jsonify({'success': True, 'message': 'Match updated'})
+    except brackets.BracketConflict as e:
+        return jsonify({'error': str(e)}), 409
     except Exception as e:
-        conn.close()
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/matches/<int:match_id>', methods=['DELETE'])
 def delete_match_result(match_id):
-    conn = get_db_connection()
+    def delete(conn):
+        # Before the delete: the foreign key would clear the bracket link
+        brackets.unlink_result(conn, match_id)
+        ratings.unrate_match(conn, match_id)
+        deleted = conn.execute('''
+            DELETE FROM match_results WHERE id = ?
+            RETURNING tournament_id, player1_id, player2_id, winner_id, score_player1, score_player2
+        ''', (match_id,)).fetchone()
+        if deleted:
+            standings.apply(conn, [(deleted, -1)])
+        return deleted
+    
     try:
-        conn.execute('DELETE FROM match_results WHERE id = ?', (match_id,))
-        conn.commit()
-        conn.close()
+        deleted = writer.run(delete)
+        if deleted:
+            events.publish(f"tournament:{deleted['tournament_id']}", 'match_deleted', match_id=match_id)
         
         return jsonify({'success': True, 'message': 'Match deleted'})
+    except brackets.BracketConflict as e:
+        return jsonify({'error': str(e)}), 409
     except Exception as e:
-        conn.close()
         return jsonify({'error': str(e)}), 500
 
+# ==================== STANDINGS ====================
+
+# Served from the materialized tables (standings.py), best first
+STANDING_FIELDS = ('user_id', 'played', 'wins', 'losses', 'score_for', 'score_against', 'score_diff')
+
+STANDINGS_LIST = ListQuery(
+    source='tournament_standings s JOIN users u ON s.user_id = u.id',
+    fields={'username': 'u.username', **{name: f's.{name}' for name in STANDING_FIELDS}},
+    sort_keys=('s.wins', 's.score_diff', 's.score_for', 's.user_id'),
+    descending=True,
+)
+
+LEADERBOARD_LIST = ListQuery(
+    source='leaderboard l JOIN users u ON l.user_id = u.id',
+    fields={'username': 'u.username', **{name: f'l.{name}' for name in STANDING_FIELDS}},
+    sort_keys=('l.wins', 'l.score_diff', 'l.score_for', 'l.user_id'),
+    descending=True,
+)
+
+@app.route('/api/tournaments/<tournament_id>/standings', methods=['GET'])
+@cached(lambda tournament_id: [('standings', tournament_id), ('users', 0)])
+def get_tournament_standings(tournament_id):
+    conn = get_db_connection()
+    try:
+        rows, next_cursor = STANDINGS_LIST.fetch_page(
+            conn, request.args, 's.tournament_id = ?', (tournament_id,))
+    except InvalidPageRequest as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return page_response(rows, next_cursor)
+
+@app.route('/api/leaderboard', methods=['GET'])
+@cached(lambda: [('leaderboard', 0), ('users', 0)])
+def get_leaderboard():
+    conn = get_db_connection()
+    try:
+        rows, next_cursor = LEADERBOARD_LIST.fetch_page(conn, request.args)
+    except InvalidPageRequest as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return page_response(rows, next_cursor)
+
+# ==================== RATINGS ====================
+
+# Elo ratings kept by the match handlers (ratings.py), highest first
+RATING_LIST = ListQuery(
+    source='player_ratings r JOIN users u ON r.user_id = u.id',
+    fields={'user_id': 'r.user_id', 'username': 'u.username', 'rating': 'r.rating', 'games': 'r.games'},
+    sort_keys=('r.rating', 'r.user_id'),
+    descending=True,
+)
+
+RATING_HISTORY_LIST = ListQuery(
+    source='rating_history h',
+    fields={name: f'h.{name}' for name in (
+        'id', 'match_result_id', 'rating_before', 'rating_after', 'created_at')},
+    sort_keys=('h.id',),
+    descending=True,
+)
+
+@app.route('/api/ratings', methods=['GET'])
+@cached(lambda: [('ratings', 0), ('users', 0)])
+def get_ratings():
+    conn = get_db_connection()
+    try:
+        rows, next_cursor = RATING_LIST.fetch_page(conn, request.args)
+    except InvalidPageRequest as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return page_response(rows, next_cursor)
+
+@app.route('/api/users/<int:user_id>/rating', methods=['GET'])
+def get_user_rating(user_id):
+    """Current rating; players without rated matches have the initial rating"""
+    conn = get_db_connection()
+    if not conn.execute('SELECT 1 FROM users WHERE id = ?', (user_id,)).fetchone():
+        return jsonify({'error': 'User not found'}), 404
+    row = conn.execute('SELECT rating, games, updated_at FROM player_ratings WHERE user_id = ?',
+                       (user_id,)).fetchone()
+    return jsonify({
+        'user_id': user_id,
+        'rating': row['rating'] if row else ratings.INITIAL_RATING,
+        'games': row['games'] if row else 0,
+        'updated_at': row['updated_at'] if row else None,
+        # An edited older result is waiting for `python ratings.py`
+        'stale': ratings.is_stale(conn),
+    })
+
+@app.route('/api/users/<int:user_id>/rating-history', methods=['GET'])
+def get_user_rating_history(user_id):
+    conn = get_db_connection()
+    try:
+        rows, next_cursor = RATING_HISTORY_LIST.fetch_page(conn, request.args, 'h.user_id = ?', (user_id,))
+    except InvalidPageRequest as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return page_response(rows, next_cursor)
+
+# ==================== BRACKETS ====================
+
+BRACKET_MATCH_LIST = ListQuery(
+    source='''bracket_matches bm
+        LEFT JOIN users u1 ON bm.player1_id = u1.id
+        LEFT JOIN users u2 ON bm.player2_id = u2.id''',
+    fields={
+        'id': 'bm.id',
+        'bracket': 'bm.bracket',
+        'round': 'bm.round',
+        'position': 'bm.position',
+        'status': 'bm.status',
+        'player1_id': 'bm.player1_id',
+        'player2_id': 'bm.player2_id',
+        'player1_username': 'u1.username',
+        'player2_username': 'u2.username',
+        'winner_id': 'bm.winner_id',
+        'match_result_id': 'bm.match_result_id',
+        'next_match_id': 'bm.next_match_id',
+        'loser_match_id': 'bm.loser_match_id',
+    },
+    # Ids are assigned round by round, so this is bracket order
+    sort_keys=('bm.id',),
+)
+
+@app.route('/api/tournaments/<tournament_id>/bracket', methods=['POST'])
+def create_bracket(tournament_id):
+    """Seed participants into a bracket: {"format", "seeding", "rounds"}"""
+    data = request.get_json() or {}
+    
+    def generate(conn):
+        if not conn.execute('SELECT 1 FROM tournaments WHERE id = ?', (tournament_id,)).fetchone():
+            return None
+        return brackets.generate(conn, tournament_id, data.get('format', 'single_elimination'),
+                                 data.get('seeding', 'registration'), data.get('rounds'))
+    
+    try:
+        summary = writer.run(generate)
+        if summary is None:
+            return jsonify({'error': f'Tournament {tournament_id} does not exist'}), 404
+    except brackets.BracketError as e:
+        return jsonify({'error': str(e)}), 400
+    except brackets.BracketConflict as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        log.error('create_bracket.failed', exc_info=True, tournament_id=tournament_id)
+        return jsonify({'error': str(e)}), 500
+    
+    events.publish(f'tournament:{tournament_id}', 'bracket_generated', **summary)
+    return jsonify({'success': True, **summary}), 201
+
+@app.route('/api/tournaments/<tournament_id>/bracket', methods=['GET'])
+@cached(lambda tournament_id: [('bracket', tournament_id)])
+def get_bracket(tournament_id):
+    conn = get_db_connection()
+    bracket = conn.execute('''
+        SELECT tournament_id, format, rounds, current_round, status, created_at
+        FROM tournament_brackets WHERE tournament_id = ?
+    ''', (tournament_id,)).fetchone()
+    if not bracket:
+        return jsonify({'error': 'Tournament has no bracket'}), 404
+    
+    counts = conn.execute('''
+        SELECT status, COUNT(*) FROM bracket_matches WHERE tournament_id = ? GROUP BY status
+    ''', (tournament_id,)).fetchall()
+    return jsonify({**dict(bracket), 'matches': {row[0]: row[1] for row in counts}})
+
+@app.route('/api/tournaments/<tournament_id>/bracket/matches', methods=['GET'])
+@cached(lambda tournament_id: [('bracket', tournament_id), ('users', 0)])
+def get_bracket_matches(tournament_id):
+    """Bracket matches in order; ?round=, ?bracket= and ?status= filter"""
+    where = ['bm.tournament_id = ?']
+    params = [tournament_id]
+    for name in ('round', 'bracket', 'status'):
+        if request.args.get(name):
+            where.append(f'bm.{name} = ?')
+            params.append(request.args[name])
+    
+    conn = get_db_connection()
+    try:
+        matches, next_cursor = BRACKET_MATCH_LIST.fetch_page(conn, request.args, ' AND '.join(where), params)
+    except InvalidPageRequest as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return page_response(matches, next_cursor)
+
+@app.route('/api/bracket-matches/<int:bracket_match_id>/result', methods=['POST'])
+def report_bracket_result(bracket_match_id):
+    """Report a ready bracket match: {"score1", "score2", "date"}, scores in slot order"""
+    data = request.get_json() or {}
+    try:
+        score1 = int(data.get('score1', 0))
+        score2 = int(data.get('score2', 0))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def report(conn):
+        # Checked inside the write: a concurrent report of the same match loses with a 409
+        match = conn.execute('''
+            SELECT tournament_id, round, player1_id, player2_id, status
+            FROM bracket_matches WHERE id = ?
+        ''', (bracket_match_id,)).fetchone()
+        if not match:
+            return None
+        if match['status'] != 'ready':
+            raise brackets.BracketConflict(f"Bracket match is {match['status']}")
+        
+        # Same rule as report_match_result: draws go to player 1
+        winner_id = match['player2_id'] if score2 > score1 else match['player1_id']
+        
+        cursor = conn.execute('''
+            INSERT INTO match_results (
+                tournament_id, player1_id, player2_id, winner_id,
+                score_player1, score_player2, match_date, match_round
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            match['tournament_id'],
+            match['player1_id'],
+            match['player2_id'],
+            winner_id,
+            score1,
+            score2,
+            data.get('date', datetime.datetime.now().strftime('%Y-%m-%d')),
+            match['round']
+        ))
+        reported = {
+            'id': cursor.lastrowid, 'tournament_id': match['tournament_id'],
+            'player1_id': match['player1_id'], 'player2_id': match['player2_id'],
+            'winner_id': winner_id, 'score_player1': score1, 'score_player2': score2,
+        }
+        standings.apply(conn, [(reported, 1)])
+        ratings.rate_matches(conn, [reported])
+        ready = brackets.record_result(conn, bracket_match_id, cursor.lastrowid, winner_id)
+        return reported, ready
+    
+    try:
+        outcome = writer.run(report)
+        if outcome is None:
+            return jsonify({'error': 'Bracket match not found'}), 404
+    except brackets.BracketConflict as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    reported, ready = outcome
+    tournament_id = reported['tournament_id']
+    events.publish(f'tournament:{tournament_id}', 'match_reported', match_id=reported['id'],
+                   player1_id=reported['player1_id'], player2_id=reported['player2_id'],
+                   winner_id=reported['winner_id'], score1=score1, score2=score2)
+    events.publish(f'tournament:{tournament_id}', 'bracket_advanced', completed=bracket_match_id, ready=ready)
+    notify_match_players(reported)
+    return jsonify({'success': True, 'match_id': reported['id'], 'winner_id': reported['winner_id'],
+                    'ready': ready})
+
+@app.route('/api/tournaments/<tournament_id>/bracket', methods=['DELETE'])
+def delete_bracket(tournament_id):
+    """Drop the bracket; reported match results are kept"""
+    def delete(conn):
+        deleted = conn.execute('DELETE FROM tournament_brackets WHERE tournament_id = ?', (tournament_id,)).rowcount
+        if deleted:
+            conn.execute('DELETE FROM bracket_matches WHERE tournament_id = ?', (tournament_id,))
+            brackets.reinstate(conn, tournament_id)
+        return deleted
+    
+    try:
+        if not writer.run(delete):
+            return jsonify({'error': 'Tournament has no bracket'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    events.publish(f'tournament:{tournament_id}', 'bracket_deleted')
+    return jsonify({'success': True, 'message': 'Bracket deleted'})
+
 # ==================== TOURNAMENT DISCUSSIONS CRUD ====================
 
+DISCUSSION_LIST = ListQuery(
+    source='tournament_discussions td JOIN users u ON td.creator_id = u.id',
+    fields={
+        'id': 'td.id',
+        'tournament_id': 'td.tournament_id',
+        'creator_id': 'td.creator_id',
+        'title': 'td.title',
+        'description': 'td.description',
+        'is_pinned': 'td.is_pinned',
+        'replies_count': 'td.replies_count',
+        'created_at': 'td.created_at',
+        'creator_username': 'u.username',
+    },
+    sort_keys=('COALESCE(td.is_pinned, 0)', "COALESCE(td.created_at, '')", 'td.id'),
+    descending=True,
+)
+
 @app.route('/api/tournaments/<tournament_id>/discussions', methods=['GET'])
+@cached(lambda tournament_id: [('discussions', tournament_id), ('users', 0)])
 def get_tournament_discussions(tournament_id):
     conn = get_db_connection()
-    discussions = conn.execute('''
-        SELECT td.*, u.username as creator_username
-        FROM tournament_discussions td
-        JOIN users u ON td.creator_id = u.id
-        WHERE td.tournament_id = ?
-        ORDER BY td.is_pinned DESC, td.created_at DESC
-    ''', (tournament_id,)).fetchall()
-    conn.close()
+    try:
+        discussions, next_cursor = DISCUSSION_LIST.fetch_page(
+            conn, request.args, 'td.tournament_id = ?', (tournament_id,))
+    except InvalidPageRequest as e:
+        return jsonify({'error': str(e)}), 400
     
-    return jsonify([dict(row) for row in discussions])
+    return page_response(discussions, next_cursor)
 
 @app.route('/api/tournaments/<tournament_id>/discussions', methods=['POST'])
 def create_discussion(tournament_id):
     data = request.get_json()
     
-    conn = get_db_connection()
-    try:
+    creator_name = data.get('authorName', 'Anonymous')
+    
+    def create(conn):
         # Get or create user
-        creator_name = data.get('authorName', 'Anonymous')
-        user = conn.execute('SELECT id FROM users WHERE username = ?', (creator_name,)).fetchone()
-        if not user:
-            unique_email = generate_unique_email(creator_name, conn)
-            cursor = conn.execute('''
-                INSERT INTO users (username, email, password_hash)
-                VALUES (?, ?, ?)
-            ''', (creator_name, unique_email, "demo_hash"))
-            creator_id = cursor.lastrowid
-        else:
-            creator_id = user['id']
+        creator_id, new_user = get_or_create_user(conn, creator_name)
         
-        conn.execute('''
+        cursor = conn.execute('''
             INSERT INTO tournament_discussions (tournament_id, creator_id, title, description, is_pinned)
             VALUES (?, ?, ?, ?, ?)
         ''', (tournament_id, creator_id, data['title'], data['content'], data.get('isSticky', False)))
-        
-        conn.commit()
-        conn.close()
+        return creator_id, new_user, cursor.lastrowid
+    
+    try:
+        creator_id, new_user, discussion_id = writer.run(create)
+        username_cache.put(creator_name, creator_id)
+        events.publish(f'tournament:{tournament_id}', 'discussion_created',
+                       discussion_id=discussion_id, creator_id=creator_id, title=data['title'])
         
         return jsonify({'success': True, 'message': 'Discussion created'})
     except sqlite3.IntegrityError as e:
-        conn.close()
         if 'UNIQUE constraint failed' in str(e):
             return jsonify({'error': 'A discussion with this title already exists for this tournament'}), 409
         return jsonify({'error': 'Database integrity error'}), 400
     except Exception as e:
-        conn.close()
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/discussions/<int:discussion_id>', methods=['PUT'])
 def update_discussion(discussion_id):
     data = request.get_json()
     
-    conn = get_db_connection()
     try:
-        conn.execute('''
+        updated = writer.execute('''
             UPDATE tournament_discussions 
             SET title = ?, description = ?, is_pinned = ?
             WHERE id = ?
-        ''', (data['title'], data['content'], data.get('isSticky', False), discussion_id))
+            RETURNING tournament_id
+        ''', (data['title'], data['content'], data.get('isSticky', False), discussion_id)).rows
         
-        conn.commit()
-        conn.close()
+        if updated:
+            events.publish(f"tournament:{updated[0]['tournament_id']}", 'discussion_updated',
+                           discussion_id=discussion_id, title=data['title'])
         
         return jsonify({'success': True, 'message': 'Discussion updated'})
     except Exception as e:
-        conn.close()
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/discussions/<int:discussion_id>', methods=['DELETE'])
 def delete_discussion(discussion_id):
-    conn = get_db_connection()
     try:
-        conn.execute('DELETE FROM tournament_discussions WHERE id = ?', (discussion_id,))
-        conn.commit()
-        conn.close()
+        deleted = writer.execute(
+            'DELETE FROM tournament_discussions WHERE id = ? RETURNING tournament_id', (discussion_id,)).rows
+        if deleted:
+            events.publish(f"tournament:{deleted[0]['tournament_id']}", 'discussion_deleted',
+                           discussion_id=discussion_id)
         
         return jsonify({'success': True, 'message': 'Discussion deleted'})
     except Exception as e:
-        conn.close()
         return jsonify({'error': str(e)}), 500
 
 # ==================== DISCUSSION REPLIES CRUD ====================
 
+REPLY_LIST = ListQuery(
+    source='discussion_replies dr JOIN users u ON dr.user_id = u.id',
+    fields={
+        'id': 'dr.id',
+        'discussion_id': 'dr.discussion_id',
+        'user_id': 'dr.user_id',
+        'content': 'dr.content',
+        'created_at': 'dr.created_at',
+        'author_name': 'u.username',
+    },
+    sort_keys=("COALESCE(dr.created_at, '')", 'dr.id'),
+)
+
 @app.route('/api/discussions/<int:discussion_id>/replies', methods=['GET'])
 def get_discussion_replies(discussion_id):
     conn = get_db_connection()
-    replies = conn.execute('''
-        SELECT dr.*, u.username as author_name
-        FROM discussion_replies dr
-        JOIN users u ON dr.user_id = u.id
-        WHERE dr.discussion_id = ?
-        ORDER BY dr.created_at ASC
-    ''', (discussion_id,)).fetchall()
-    conn.close()
+    try:
+        replies, next_cursor = REPLY_LIST.fetch_page(
+            conn, request.args, 'dr.discussion_id = ?', (discussion_id,))
+    except InvalidPageRequest as e:
+        return jsonify({'error': str(e)}), 400
     
-    return jsonify([dict(row) for row in replies])
+    return page_response(replies, next_cursor)
 
 @app.route('/api/discussions/<int:discussion_id>/replies', methods=['POST'])
 def create_reply(discussion_id):
     data = request.get_json()
     
-    conn = get_db_connection()
-    try:
+    author_name = data.get('authorName', 'Anonymous')
+    
+    def create(conn):
         # Get or create user
-        author_name = data.get('authorName', 'Anonymous')
-        user = conn.execute('SELECT id FROM users WHERE username = ?', (author_name,)).fetchone()
-        if not user:
-            unique_email = generate_unique_email(author_name, conn)
-            cursor = conn.execute('''
-                INSERT INTO users (username, email, password_hash)
-                VALUES (?, ?, ?)
-            ''', (author_name, unique_email, "demo_hash"))
-            user_id = cursor.lastrowid
-        else:
-            user_id = user['id']
+        user_id, new_user = get_or_create_user(conn, author_name)
         
         # Insert reply
         cursor = conn.execute('''
             INSERT INTO discussion_replies (discussion_id, user_id, content)
             VALUES (?, ?, ?)
         ''', (discussion_id, user_id, data['content']))
-        
-        reply_id = cursor.lastrowid
-        
-        # Update replies count in discussions table
-        conn.execute('''
-            UPDATE tournament_discussions 
-            SET replies_count = (
-                SELECT COUNT(*) FROM discussion_replies 
-                WHERE discussion_id = ?
-            )
-            WHERE id = ?
-        ''', (discussion_id, discussion_id))
-        
-        conn.commit()
+        # replies_count is bumped by trg_replies_count_insert in this transaction
+        return user_id, new_user, cursor.lastrowid
+    
+    conn = get_db_connection()
+    try:
+        user_id, new_user, reply_id = writer.run(create)
+        username_cache.put(author_name, user_id)
         
         # Get the newly created reply with author info
         reply = conn.execute('''
@@ -720,8 +1459,12 @@ def create_reply(discussion_id):
             JOIN users u ON dr.user_id = u.id
             WHERE dr.id = ?
         ''', (reply_id,)).fetchone()
-        
-        conn.close()
+        events.publish(f'discussion:{discussion_id}', 'reply_created', reply=dict(reply))
+        discussion = conn.execute('SELECT creator_id FROM tournament_discussions WHERE id = ?',
+                                  (discussion_id,)).fetchone()
+        if discussion:
+            notifier.notify(discussion['creator_id'], 'comment_reply', actor_id=user_id,
+                            related_type='discussion', related_id=discussion_id)
         
         return jsonify({
             'success': True, 
@@ -729,46 +1472,215 @@ def create_reply(discussion_id):
             'reply': dict(reply)
         })
     except Exception as e:
-        conn.close()
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/replies/<int:reply_id>', methods=['DELETE'])
 def delete_reply(reply_id):
-    conn = get_db_connection()
     try:
-        # Get discussion_id before deleting
-        reply = conn.execute('SELECT discussion_id FROM discussion_replies WHERE id = ?', (reply_id,)).fetchone()
-        if not reply:
-            conn.close()
+        # trg_replies_count_delete decrements the discussion's replies_count
+        deleted = writer.execute(
+            'DELETE FROM discussion_replies WHERE id = ? RETURNING discussion_id', (reply_id,)).rows
+        if not deleted:
             return jsonify({'error': 'Reply not found'}), 404
         
-        discussion_id = reply['discussion_id']
-        
-        # Delete reply
-        conn.execute('DELETE FROM discussion_replies WHERE id = ?', (reply_id,))
-        
-        # Update replies count
-        conn.execute('''
-            UPDATE tournament_discussions 
-            SET replies_count = (
-                SELECT COUNT(*) FROM discussion_replies 
-                WHERE discussion_id = ?
-            )
-            WHERE id = ?
-        ''', (discussion_id, discussion_id))
-        
-        conn.commit()
-        conn.close()
+        events.publish(f"discussion:{deleted[0]['discussion_id']}", 'reply_deleted', reply_id=reply_id)
         
         return jsonify({'success': True, 'message': 'Reply deleted'})
     except Exception as e:
-        conn.close()
         return jsonify({'error': str(e)}), 500
 
+# ==================== NOTIFICATIONS ====================
+
+NOTIFICATION_LIST = ListQuery(
+    source='notifications n',
+    fields={name: f'n.{name}' for name in (
+        'id', 'type', 'title', 'message', 'related_id', 'related_type', 'event_count',
+        'actor_id', 'is_read', 'created_at')},
+    sort_keys=('n.id',),
+    descending=True,
+)
+
+@app.route('/api/users/<int:user_id>/notifications', methods=['GET'])
+def get_notifications(user_id):
+    """Newest first; ?unread=1 for unread only"""
+    where = 'n.user_id = ?'
+    if request.args.get('unread') in ('1', 'true'):
+        where += ' AND n.is_read = 0'
+    conn = get_db_connection()
+    try:
+        rows, next_cursor = NOTIFICATION_LIST.fetch_page(conn, request.args, where, (user_id,))
+    except InvalidPageRequest as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return page_response(rows, next_cursor)
+
+@app.route('/api/users/<int:user_id>/notifications/unread-count', methods=['GET'])
+def get_unread_count(user_id):
+    # Maintained by triggers on notifications (migration 9)
+    row = get_db_connection().execute('SELECT unread FROM notification_counts WHERE user_id = ?',
+                                      (user_id,)).fetchone()
+    return jsonify({'user_id': user_id, 'unread': row['unread'] if row else 0})
+
+@app.route('/api/users/<int:user_id>/notifications/read', methods=['POST'])
+def mark_notifications_read(user_id):
+    """Mark the given {"ids": [...]} as read, or all of the user's notifications"""
+    data = request.get_json(silent=True) or {}
+    ids = data.get('ids')
+    if ids is not None and (not isinstance(ids, list) or not all(isinstance(i, int) for i in ids)):
+        return jsonify({'error': 'ids must be a list of integers'}), 400
+    
+    try:
+        if ids is None:
+            updated = writer.execute('UPDATE notifications SET is_read = 1 WHERE user_id = ? AND is_read = 0',
+                                     (user_id,)).rowcount
+        else:
+            updated = writer.execute('''
+                UPDATE notifications SET is_read = 1
+                WHERE user_id = ? AND is_read = 0 AND id IN (SELECT value FROM json_each(?))
+            ''', (user_id, json.dumps(ids))).rowcount
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    return jsonify({'success': True, 'updated': updated})
+
+@app.route('/api/notifications/<int:notification_id>', methods=['DELETE'])
+def delete_notification(notification_id):
+    try:
+        deleted = writer.execute('DELETE FROM notifications WHERE id = ?', (notification_id,)).rowcount
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    if not deleted:
+        return jsonify({'error': 'Notification not found'}), 404
+    
+    return jsonify({'success': True, 'message': 'Notification deleted'})
+
+# ==================== SEARCH ====================
+
+@app.route('/api/search', methods=['GET'])
+def search_all():
+    """Full-text search, best match first: ?q=&type=tournament,discussion,reply"""
+    try:
+        types = search.parse_types(request.args.get('type'))
+        limit = parse_limit(request.args.get('limit'), default=20)
+        cursor = decode_cursor(request.args.get('cursor'), 3)
+        if cursor is not None and not (isinstance(cursor[0], (int, float))
+                                       and all(isinstance(value, int) for value in cursor[1:])):
+            raise InvalidPageRequest('invalid cursor')
+        results, after = search.search(get_db_connection(), request.args.get('q'), types, limit, cursor)
+    except (search.InvalidSearch, InvalidPageRequest) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return page_response(results, encode_cursor(after) if after else None)
+
+# ==================== LIVE EVENTS ====================
+
+EVENT_HEARTBEAT_SECONDS = 15
+
+@app.route('/api/events', methods=['GET'])
+def event_stream():
+    """Server-sent events for ?channels=tournament:<id>,discussion:<id>,user:<id>.
+
+    Resumes after the Last-Event-ID header (or ?last_event_id=) when the
+    missed events are still buffered; otherwise the first event is `resync`.
+    """
+    try:
+        channels = events.parse_channels(request.args.get('channels'))
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        subscription = events.hub.subscribe(channels, last_event_id)
+    except events.TooManySubscribers as e:
+        return jsonify({'error': str(e)}), 503
+    
+    def generate():
+        try:
+            yield f'retry: 5000\n: subscribed {",".join(sorted(channels))}\n\n'
+            while True:
+                event = subscription.get(timeout=EVENT_HEARTBEAT_SECONDS)
+                # Comment lines keep proxies from timing out and surface disconnects
+                yield event.to_sse() if event is not None else ': keepalive\n\n'
+        finally:
+            subscription.close()
+    
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 # Health check endpoint
 @app.route('/api/health', methods=['GET'])
 def health_check():
     return jsonify({'status': 'healthy', 'timestamp': datetime.datetime.now().isoformat()})
 
+# Connection pool metrics (size, waits, checkout latency)
+@app.route('/api/metrics/pool', methods=['GET'])
+def pool_metrics():
+    return jsonify(db_pool.get_pool().stats())
+
+# Response cache hits, misses and 304s
+@app.route('/api/metrics/response-cache', methods=['GET'])
+def response_cache_metrics():
+    return jsonify(response_cache.stats())
+
+# Open event streams, published and dropped events
+@app.route('/api/metrics/events', methods=['GET'])
+def event_metrics():
+    return jsonify(events.hub.stats())
+
+# Notification queue depth, batches written, events coalesced or dropped
+@app.route('/api/metrics/notifications', methods=['GET'])
+def notification_metrics():
+    return jsonify(notifier.stats())
+
+# Group commit: operations, groups and their sizes, queue depth
+@app.route('/api/metrics/writes', methods=['GET'])
+def write_metrics():
+    return jsonify(writer.stats())
+
+# Recommendation graph size, overlay and change log position
+@app.route('/api/metrics/recommendations', methods=['GET'])
+def recommendation_metrics():
+    return jsonify(social_graph.stats())
+
+# Username -> id cache hit/miss counters
+@app.route('/api/metrics/user-cache', methods=['GET'])
+def user_cache_metrics():
+    return jsonify(username_cache.stats())
+
+# Per-statement SQL timings with their text, and recent slow queries with plans
+@app.route('/api/metrics/sql', methods=['GET'])
+def sql_metrics():
+    return jsonify(metrics.sql.report())
+
+# Everything above in Prometheus text format, plus route latency histograms
+@app.route('/api/metrics', methods=['GET'])
+def prometheus_metrics():
+    return metrics.prometheus_response()
+
+# Keyset lists page from an index range; warn at startup when one would
+# scan or sort instead (a sort key that no longer matches its index, or a
+# database missing a migration)
+for name, list_query, where in (
+        ('tournaments', TOURNAMENT_LIST, ''),
+        ('users', USER_LIST, ''),
+        ('participants', PARTICIPANT_LIST, 'tp.tournament_id = ?'),
+        ('discussions', DISCUSSION_LIST, 'td.tournament_id = ?'),
+        ('replies', REPLY_LIST, 'dr.discussion_id = ?')):
+    with app.app_context():
+        try:
+            unindexed = list_query.unindexed(get_db_connection(), where, (0,) * where.count('?'))
+        except sqlite3.Error as e:
+            unindexed = [str(e)]
+    if unindexed:
+        log.warning('pagination.unindexed_list', list=name, plan=unindexed)
+
+metrics.register_gauges('pool', lambda: db_pool.get_pool(app).stats())
+metrics.register_gauges('response_cache', response_cache.stats)
+metrics.register_gauges('events', events.hub.stats)
+metrics.register_gauges('notifications', notifier.stats)
+metrics.register_gauges('writes', writer.stats)
+metrics.register_gauges('recommendations', social_graph.stats)
+metrics.register_gauges('user_cache', username_cache.stats)
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000, exclude_patterns=['**/*.db', '*.sqlite*'])
@@ -0,0 +1,506 @@
+"""
+Bracket generation and advancement.
+
+A tournament has at most one bracket (tournament_brackets) and its matches
+live in bracket_matches. Every match has two slots; elimination matches
+also point at the slot their winner (next_match_id/next_slot) and, in
+double elimination, their loser (loser_match_id/loser_slot) moves on to.
+A match becomes `ready` once both of its feeders are resolved; a slot that
+can never be filled (a bye) resolves to NULL and the lone player advances
+straight away, so byes ripple through the tree without anyone reporting
+them.
+
+    single_elimination  whole tree generated up front, top seeds get the byes
+    double_elimination  winners and losers brackets plus a grand final
+                        (no bracket reset)
+    swiss               one round at a time, paired by bracket wins,
+                        avoiding rematches; ceil(log2 n) rounds by default
+    round_robin         circle method, one round at a time
+
+Elimination trees are O(n) matches built in one pass after an O(n log n)
+seed order; Swiss rounds cost one sort plus a bounded look-ahead per
+player. Round-robin and Swiss rounds are generated when the previous round
+is finished, so a 10k field never materializes n^2 pairings.
+
+Results reach the bracket through the match handlers: a reported match
+between the two players of a ready bracket match completes it
+(record_result); update and delete re-route or retract the result as long
+as nothing downstream has been played (BracketConflict otherwise).
+"""
+
+import json
+import math
+import random
+
+import ratings
+
+FORMATS = ('single_elimination', 'double_elimination', 'swiss', 'round_robin')
+ELIMINATION = ('single_elimination', 'double_elimination')
+SEEDINGS = ('registration', 'ranking', 'rating', 'random')
+SWISS_LOOKAHEAD = 64
+
+MATCH_FIELDS = (
+    'id', 'tournament_id', 'bracket', 'round', 'position', 'player1_id', 'player2_id',
+    'slots_filled', 'status', 'winner_id', 'loser_id', 'match_result_id',
+    'next_match_id', 'next_slot', 'loser_match_id', 'loser_slot',
+)
+# Columns that change while a bracket is played
+STATE_FIELDS = ('player1_id', 'player2_id', 'slots_filled', 'status', 'winner_id', 'loser_id', 'match_result_id')
+
+
+class BracketError(ValueError):
+    """Invalid bracket request (unknown format, too few participants, ...)"""
+
+
+class BracketConflict(Exception):
+    """The change would rewrite bracket matches that were already played"""
+
+
+# ---------- pairing ----------
+
+def seed_order(size):
+    """Seed number for each first-round slot of a power-of-two bracket (1 v size, ...)"""
+    order = [1]
+    while len(order) < size:
+        total = len(order) * 2 + 1
+        order = [s for seed in order for s in (seed, total - seed)]
+    return order
+
+
+def round_robin_pairings(players, round_index):
+    """Pairings for one round of the circle method; None marks the bye"""
+    players = list(players) + ([None] if len(players) % 2 else [])
+    size = len(players)
+    rest = players[1:]
+    arranged = [players[0]] + [rest[(i - round_index) % (size - 1)] for i in range(size - 1)]
+    return [(arranged[i], arranged[size - 1 - i]) for i in range(size // 2)]
+
+
+def swiss_pairings(players, scores, played, had_bye, lookahead=SWISS_LOOKAHEAD):
+    """Pair players (in seed order) by score; returns (pairs, bye player or None).
+
+    Each player takes the closest-ranked opponent they have not met within
+    `lookahead` candidates, falling back to a rematch when there is none.
+    """
+    ranked = sorted(players, key=lambda player: -scores.get(player, 0))
+    bye = None
+    if len(ranked) % 2:
+        bye = next((player for player in reversed(ranked) if player not in had_bye), ranked[-1])
+        ranked.remove(bye)
+
+    taken = set()
+    pairs = []
+    for i, player in enumerate(ranked):
+        if player in taken:
+            continue
+        taken.add(player)
+        fallback = opponent = None
+        seen = 0
+        for candidate in ranked[i + 1:]:
+            if candidate in taken:
+                continue
+            if fallback is None:
+                fallback = candidate
+            if frozenset((player, candidate)) not in played:
+                opponent = candidate
+                break
+            seen += 1
+            if seen >= lookahead:
+                break
+        opponent = opponent or fallback
+        taken.add(opponent)
+        pairs.append((player, opponent))
+    return pairs, bye
+
+
+# ---------- match stores ----------
+
+class _Plan:
+    """New matches built in memory, inserted in one executemany"""
+
+    def __init__(self, tournament_id, first_id):
+        self.tournament_id = tournament_id
+        self.next_id = first_id
+        self.matches = {}
+
+    def add(self, bracket, round_number, position):
+        match = dict.fromkeys(MATCH_FIELDS)
+        match.update(id=self.next_id, tournament_id=self.tournament_id, bracket=bracket,
+                     round=round_number, position=position, slots_filled=0, status='pending')
+        self.matches[match['id']] = match
+        self.next_id += 1
+        return match
+
+    def get(self, match_id):
+        return self.matches[match_id]
+
+    def save(self, match):
+        pass
+
+    def insert(self, conn):
+        conn.executemany(f'''
+            INSERT INTO bracket_matches ({', '.join(MATCH_FIELDS)})
+            VALUES ({', '.join('?' for _ in MATCH_FIELDS)})
+        ''', ([match[field] for field in MATCH_FIELDS] for match in self.matches.values()))
+
+
+class _Stored:
+    """Existing matches, loaded on demand and written back by flush()"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.loaded = {}
+        self.dirty = set()
+
+    def get(self, match_id):
+        if match_id not in self.loaded:
+            row = self.conn.execute(
+                f'SELECT {", ".join(MATCH_FIELDS)} FROM bracket_matches WHERE id = ?', (match_id,)).fetchone()
+            self.loaded[match_id] = dict(zip(MATCH_FIELDS, row))
+        return self.loaded[match_id]
+
+    def save(self, match):
+        self.loaded[match['id']] = match
+        self.dirty.add(match['id'])
+
+    def flush(self):
+        assignments = ', '.join(f'{field} = ?' for field in STATE_FIELDS)
+        self.conn.executemany(
+            f'UPDATE bracket_matches SET {assignments} WHERE id = ?',
+            ([self.loaded[match_id][field] for field in STATE_FIELDS] + [match_id] for match_id in self.dirty))
+        self.dirty.clear()
+
+
+# ---------- advancement ----------
+
+def _fill(store, match_id, slot, player_id, ready):
+    match = store.get(match_id)
+    match[f'player{slot}_id'] = player_id
+    match['slots_filled'] += 1
+    store.save(match)
+    if match['slots_filled'] == 2:
+        _settle(store, match, ready)
+
+
+def _settle(store, match, ready):
+    players = [p for p in (match['player1_id'], match['player2_id']) if p is not None]
+    if len(players) == 2:
+        match['status'] = 'ready'
+        store.save(match)
+        ready.append(match['id'])
+        return
+    # Bye: the lone player (if any) moves on without a result
+    match['status'] = 'bye'
+    match['winner_id'] = players[0] if players else None
+    store.save(match)
+    _advance(store, match, ready)
+
+
+def _advance(store, match, ready):
+    if match['next_match_id'] is not None:
+        _fill(store, match['next_match_id'], match['next_slot'], match['winner_id'], ready)
+    if match['loser_match_id'] is not None:
+        _fill(store, match['loser_match_id'], match['loser_slot'], match['loser_id'], ready)
+
+
+def _link(match, target, slot, loser=False):
+    prefix = 'loser' if loser else 'next'
+    match[f'{prefix}_match_id'] = target['id']
+    match[f'{prefix}_slot'] = slot
+
+
+# ---------- generation ----------
+
+def _plan_elimination(plan, seeds, double):
+    size = 1 << max(1, (len(seeds) - 1).bit_length())
+    rounds = size.bit_length() - 1
+    winners = [[plan.add('main', r, p) for p in range(size >> r)] for r in range(1, rounds + 1)]
+    for r in range(rounds - 1):
+        for p, match in enumerate(winners[r]):
+            _link(match, winners[r + 1][p // 2], p % 2 + 1)
+
+    if double:
+        final = plan.add('final', 1, 0)
+        _link(winners[-1][0], final, 1)
+        if rounds == 1:
+            _link(winners[0][0], final, 2, loser=True)
+        else:
+            # Losers round 2j-1 pairs survivors, round 2j adds the losers of winners round j+1
+            losers = [[plan.add('losers', r, p) for p in range(size >> ((r + 1) // 2 + 1))]
+                      for r in range(1, 2 * (rounds - 1) + 1)]
+            for p, match in enumerate(winners[0]):
+                _link(match, losers[0][p // 2], p % 2 + 1, loser=True)
+            for j in range(1, rounds):
+                drop_in = losers[2 * j - 1]
+                for p, match in enumerate(winners[j]):
+                    # Alternate the drop-in order to postpone rematches
+                    _link(match, drop_in[len(drop_in) - 1 - p if j % 2 else p], 2, loser=True)
+                for p, match in enumerate(losers[2 * j - 2]):
+                    _link(match, drop_in[p], 1)
+                if j < rounds - 1:
+                    for p, match in enumerate(drop_in):
+                        _link(match, losers[2 * j][p // 2], p % 2 + 1)
+            _link(losers[-1][0], final, 2)
+
+    ready = []
+    order = seed_order(size)
+    for p, match in enumerate(winners[0]):
+        for slot, seed in ((1, order[2 * p]), (2, order[2 * p + 1])):
+            _fill(plan, match['id'], slot, seeds[seed - 1] if seed <= len(seeds) else None, ready)
+    return rounds
+
+
+def _plan_round(plan, round_number, pairs, bye=None):
+    if bye is not None:
+        pairs = pairs + [(bye, None)]
+    ready = []
+    for position, (player1_id, player2_id) in enumerate(pairs):
+        match = plan.add('main', round_number, position)
+        _fill(plan, match['id'], 1, player1_id, ready)
+        _fill(plan, match['id'], 2, player2_id, ready)
+    return ready
+
+
+def load_seeds(conn, tournament_id, seeding='registration', rng=None):
+    """Participant user ids in seed order"""
+    if seeding == 'ranking':
+        # Global leaderboard first (players without results last), then registration
+        sql = '''
+            SELECT tp.user_id FROM tournament_participants tp
+            LEFT JOIN leaderboard l ON l.user_id = tp.user_id
+            WHERE tp.tournament_id = ?
+            ORDER BY COALESCE(l.wins, -1) DESC, COALESCE(l.score_diff, 0) DESC, tp.registration_date, tp.id
+        '''
+    elif seeding == 'rating':
+        # Elo rating, unrated players at the initial rating
+        sql = f'''
+            SELECT tp.user_id FROM tournament_participants tp
+            LEFT JOIN player_ratings r ON r.user_id = tp.user_id
+            WHERE tp.tournament_id = ?
+            ORDER BY COALESCE(r.rating, {ratings.INITIAL_RATING}) DESC, tp.registration_date, tp.id
+        '''
+    else:
+        sql = '''
+            SELECT user_id FROM tournament_participants
+            WHERE tournament_id = ? ORDER BY registration_date, id
+        '''
+    seeds = [row[0] for row in conn.execute(sql, (tournament_id,))]
+    if seeding == 'random':
+        (rng or random).shuffle(seeds)
+    return seeds
+
+
+def _first_id(conn):
+    return conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM bracket_matches').fetchone()[0]
+
+
+def generate(conn, tournament_id, fmt, seeding='registration', rounds=None, rng=None):
+    """Create the bracket and its first matches in the caller's transaction"""
+    if fmt not in FORMATS:
+        raise BracketError(f"format must be one of: {', '.join(FORMATS)}")
+    if seeding not in SEEDINGS:
+        raise BracketError(f"seeding must be one of: {', '.join(SEEDINGS)}")
+    if conn.execute('SELECT 1 FROM tournament_brackets WHERE tournament_id = ?', (tournament_id,)).fetchone():
+        raise BracketConflict('Tournament already has a bracket')
+
+    seeds = load_seeds(conn, tournament_id, seeding, rng)
+    if len(seeds) < 2:
+        raise BracketError('A bracket needs at least 2 participants')
+
+    plan = _Plan(int(tournament_id), _first_id(conn))
+    if fmt in ELIMINATION:
+        total_rounds = _plan_elimination(plan, seeds, fmt == 'double_elimination')
+    elif fmt == 'swiss':
+        total_rounds = int(rounds or math.ceil(math.log2(len(seeds))))
+        if not 1 <= total_rounds < len(seeds):
+            raise BracketError(f'rounds must be between 1 and {len(seeds) - 1}')
+        _plan_round(plan, 1, *swiss_pairings(seeds, {}, set(), set()))
+    else:
+        total_rounds = len(seeds) - 1 + len(seeds) % 2
+        _plan_round(plan, 1, round_robin_pairings(seeds, 0))
+
+    conn.execute('''
+        INSERT INTO tournament_brackets (tournament_id, format, rounds, seeds)
+        VALUES (?, ?, ?, ?)
+    ''', (tournament_id, fmt, total_rounds, json.dumps(seeds)))
+    plan.insert(conn)
+    return {
+        'format': fmt,
+        'participants': len(seeds),
+        'rounds': total_rounds,
+        'matches': len(plan.matches),
+        'ready': sum(1 for match in plan.matches.values() if match['status'] == 'ready'),
+    }
+
+
+def _bracket(conn, tournament_id):
+    row = conn.execute('''
+        SELECT format, rounds, current_round, seeds, status FROM tournament_brackets WHERE tournament_id = ?
+    ''', (tournament_id,)).fetchone()
+    return dict(zip(('format', 'rounds', 'current_round', 'seeds', 'status'), row))
+
+
+def _next_round(conn, tournament_id, bracket):
+    """Open the next Swiss / round-robin round once the current one is finished"""
+    unfinished = conn.execute('''
+        SELECT COUNT(*) FROM bracket_matches
+        WHERE tournament_id = ? AND round = ? AND status IN ('pending', 'ready')
+    ''', (tournament_id, bracket['current_round'])).fetchone()[0]
+    if unfinished:
+        return []
+    if bracket['current_round'] >= bracket['rounds']:
+        conn.execute("UPDATE tournament_brackets SET status = 'completed' WHERE tournament_id = ?", (tournament_id,))
+        return []
+
+    seeds = json.loads(bracket['seeds'])
+    round_number = bracket['current_round'] + 1
+    plan = _Plan(int(tournament_id), _first_id(conn))
+    if bracket['format'] == 'swiss':
+        scores, played, had_bye = {}, set(), set()
+        for player1_id, player2_id, winner_id in conn.execute('''
+            SELECT player1_id, player2_id, winner_id FROM bracket_matches WHERE tournament_id = ?
+        ''', (tournament_id,)):
+            if winner_id is not None:
+                scores[winner_id] = scores.get(winner_id, 0) + 1
+            if player1_id is None or player2_id is None:
+                had_bye.add(player1_id if player2_id is None else player2_id)
+            else:
+                played.add(frozenset((player1_id, player2_id)))
+        ready = _plan_round(plan, round_number, *swiss_pairings(seeds, scores, played, had_bye))
+    else:
+        ready = _plan_round(plan, round_number, round_robin_pairings(seeds, round_number - 1))
+    plan.insert(conn)
+    conn.execute('UPDATE tournament_brackets SET current_round = ? WHERE tournament_id = ?',
+                 (round_number, tournament_id))
+    bracket['current_round'] = round_number
+    # A round made only of byes finishes immediately
+    return ready + _next_round(conn, tournament_id, bracket)
+
+
+def _eliminate(conn, tournament_id, user_id, placement=None):
+    conn.execute('''
+        UPDATE tournament_participants SET status = 'eliminated', placement = ?
+        WHERE tournament_id = ? AND user_id = ?
+    ''', (placement, tournament_id, user_id))
+
+
+def reinstate(conn, tournament_id, user_id=None):
+    """Undo eliminations and placements (one player, or the whole field)"""
+    conn.execute('''
+        UPDATE tournament_participants
+        SET status = CASE WHEN status = 'eliminated' THEN 'registered' ELSE status END, placement = NULL
+        WHERE tournament_id = ? AND (? IS NULL OR user_id = ?)
+    ''', (tournament_id, user_id, user_id))
+
+
+def _record_outcome(conn, bracket, match):
+    """Participant status/placement and bracket completion after a decided match"""
+    tournament_id = match['tournament_id']
+    if match['loser_match_id'] is None:
+        _eliminate(conn, tournament_id, match['loser_id'], 2 if match['next_match_id'] is None else None)
+    if match['next_match_id'] is None:
+        conn.execute('UPDATE tournament_participants SET placement = 1 WHERE tournament_id = ? AND user_id = ?',
+                     (tournament_id, match['winner_id']))
+        conn.execute("UPDATE tournament_brackets SET status = 'completed' WHERE tournament_id = ?", (tournament_id,))
+
+
+def find_ready_match(conn, tournament_id, player1_id, player2_id):
+    """Id of the ready bracket match between these two players, if any"""
+    row = conn.execute('''
+        SELECT id FROM bracket_matches
+        WHERE tournament_id = ? AND status = 'ready'
+          AND ((player1_id = ? AND player2_id = ?) OR (player1_id = ? AND player2_id = ?))
+        ORDER BY id LIMIT 1
+    ''', (tournament_id, player1_id, player2_id, player2_id, player1_id)).fetchone()
+    return row[0] if row else None
+
+
+def record_result(conn, bracket_match_id, match_result_id, winner_id):
+    """Complete a ready match and advance; returns ids of matches that became ready"""
+    store = _Stored(conn)
+    match = store.get(bracket_match_id)
+    if match['status'] != 'ready':
+        raise BracketConflict(f"Bracket match {bracket_match_id} is {match['status']}")
+    if winner_id not in (match['player1_id'], match['player2_id']):
+        raise BracketError('Winner is not a player of this bracket match')
+    match.update(status='completed', winner_id=winner_id, match_result_id=match_result_id,
+                 loser_id=match['player2_id'] if winner_id == match['player1_id'] else match['player1_id'])
+    store.save(match)
+    ready = []
+    _advance(store, match, ready)
+    store.flush()
+
+    bracket = _bracket(conn, match['tournament_id'])
+    if bracket['format'] in ELIMINATION:
+        _record_outcome(conn, bracket, match)
+    else:
+        ready += _next_round(conn, match['tournament_id'], bracket)
+    return ready
+
+
+def _linked(conn, store, match_result_id):
+    row = conn.execute('SELECT id FROM bracket_matches WHERE match_result_id = ?', (match_result_id,)).fetchone()
+    return store.get(row[0]) if row else None
+
+
+def _check_unplayed(conn, store, match):
+    """Raise BracketConflict if anything fed by this match has been decided"""
+    bracket = _bracket(conn, match['tournament_id'])
+    if bracket['format'] == 'swiss' and bracket['current_round'] > match['round']:
+        raise BracketConflict('A later Swiss round was already paired on this result')
+    for target in (match['next_match_id'], match['loser_match_id']):
+        if target is not None and store.get(target)['status'] in ('completed', 'bye'):
+            raise BracketConflict(f'Bracket match {target} fed by this result was already decided')
+    return bracket
+
+
+def _replace(store, match_id, slot, player_id):
+    target = store.get(match_id)
+    target[f'player{slot}_id'] = player_id
+    store.save(target)
+
+
+def change_result(conn, match_result_id, winner_id):
+    """Re-route a linked bracket match whose winner changed"""
+    store = _Stored(conn)
+    match = _linked(conn, store, match_result_id)
+    if match is None or match['winner_id'] == winner_id:
+        return
+    bracket = _check_unplayed(conn, store, match)
+    if bracket['format'] in ELIMINATION and match['loser_match_id'] is None:
+        # The old loser is back in (and the new one is out)
+        reinstate(conn, match['tournament_id'], match['loser_id'])
+        reinstate(conn, match['tournament_id'], match['winner_id'])
+    match['winner_id'], match['loser_id'] = match['loser_id'], match['winner_id']
+    store.save(match)
+    if match['next_match_id'] is not None:
+        _replace(store, match['next_match_id'], match['next_slot'], match['winner_id'])
+    if match['loser_match_id'] is not None:
+        _replace(store, match['loser_match_id'], match['loser_slot'], match['loser_id'])
+    store.flush()
+    if bracket['format'] in ELIMINATION:
+        _record_outcome(conn, bracket, match)
+
+
+def unlink_result(conn, match_result_id):
+    """Put a linked bracket match back to ready before its result is deleted"""
+    store = _Stored(conn)
+    match = _linked(conn, store, match_result_id)
+    if match is None:
+        return
+    bracket = _check_unplayed(conn, store, match)
+    for target, slot in ((match['next_match_id'], match['next_slot']),
+                         (match['loser_match_id'], match['loser_slot'])):
+        if target is not None:
+            downstream = store.get(target)
+            downstream[f'player{slot}_id'] = None
+            downstream['slots_filled'] -= 1
+            downstream['status'] = 'pending'
+            store.save(downstream)
+    if bracket['format'] in ELIMINATION:
+        for user_id in (match['winner_id'], match['loser_id']):
+            reinstate(conn, match['tournament_id'], user_id)
+    match.update(status='ready', winner_id=None, loser_id=None, match_result_id=None)
+    store.save(match)
+    store.flush()
+    conn.execute("UPDATE tournament_brackets SET status = 'active' WHERE tournament_id = ?", (match['tournament_id'],))
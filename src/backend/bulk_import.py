@@ -0,0 +1,66 @@
+"""
+Request body readers for the bulk endpoints.
+
+Bodies are a JSON array of objects, NDJSON (one object per line,
+Content-Type application/x-ndjson) or CSV with a header row (text/csv).
+NDJSON and CSV are read line by line from the request stream, so they never
+have to be buffered as a whole.
+"""
+
+import csv
+import io
+import json
+
+from streaming import NDJSON_TYPES
+
+MAX_ITEMS = 10000
+CSV_TYPES = ('text/csv', 'application/csv')
+
+
+class BulkParseError(ValueError):
+    """The request body could not be read as a list of records"""
+
+
+def iter_records(req, max_items=MAX_ITEMS):
+    """Yield (index, record) for each object in a JSON array, NDJSON or CSV body"""
+    if req.mimetype in NDJSON_TYPES:
+        records = _iter_ndjson(req.stream)
+    elif req.mimetype in CSV_TYPES:
+        records = _iter_csv(req.stream)
+    else:
+        data = req.get_json(silent=True)
+        if not isinstance(data, list):
+            raise BulkParseError('Body must be a JSON array, NDJSON or CSV')
+        records = iter(data)
+
+    for index, record in enumerate(records):
+        if index >= max_items:
+            raise BulkParseError(f'At most {max_items} items per request')
+        yield index, record
+
+
+def _iter_ndjson(stream):
+    for line_no, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            raise BulkParseError(f'Invalid JSON on line {line_no}')
+
+
+def _iter_csv(stream):
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        for row in csv.DictReader(text):
+            yield row
+    except (csv.Error, UnicodeDecodeError) as e:
+        raise BulkParseError(f'Invalid CSV: {e}')
+
+
+def is_bulk_body(req):
+    """True for CSV, NDJSON or JSON array bodies"""
+    if req.mimetype in CSV_TYPES or req.mimetype in NDJSON_TYPES:
+        return True
+    return isinstance(req.get_json(silent=True), list)
@@ -0,0 +1,81 @@
+"""
+Reconciliation for the denormalized counters.
+
+replies_count, likes_count and comments_count are kept up to date by
+triggers (migration 3) in the same transaction as the write. This job
+recomputes them in small id ranges and rewrites only rows that drifted,
+so each transaction is short and never holds the write lock for long.
+
+    python counters.py [database]
+"""
+
+import sqlite3
+import sys
+import threading
+import time
+
+import request_log as log
+
+BATCH_SIZE = 1000
+
+# (table, counter column, child table, child foreign key)
+COUNTERS = [
+    ('tournament_discussions', 'replies_count', 'discussion_replies', 'discussion_id'),
+    ('social_posts', 'likes_count', 'post_likes', 'post_id'),
+    ('social_posts', 'comments_count', 'comments', 'post_id'),
+]
+
+
+def reconcile_counter(conn, table, column, child, key, batch_size=BATCH_SIZE):
+    """Repair one counter column; returns the number of rows fixed"""
+    fixed = 0
+    last_id = 0
+    while True:
+        row = conn.execute(
+            f'SELECT MAX(id) FROM (SELECT id FROM {table} WHERE id > ? ORDER BY id LIMIT ?)',
+            (last_id, batch_size)).fetchone()
+        if row[0] is None:
+            return fixed
+        upper = row[0]
+        cursor = conn.execute(f'''
+            UPDATE {table}
+            SET {column} = (SELECT COUNT(*) FROM {child} WHERE {child}.{key} = {table}.id)
+            WHERE id > ? AND id <= ?
+              AND {column} IS NOT (SELECT COUNT(*) FROM {child} WHERE {child}.{key} = {table}.id)
+        ''', (last_id, upper))
+        conn.commit()
+        fixed += cursor.rowcount
+        last_id = upper
+
+
+def reconcile(conn, batch_size=BATCH_SIZE):
+    """Repair all counters; returns {'table.column': rows fixed}"""
+    return {
+        f'{table}.{column}': reconcile_counter(conn, table, column, child, key, batch_size)
+        for table, column, child, key in COUNTERS
+    }
+
+
+def start_reconciler(pool, interval):
+    """Run reconcile() every `interval` seconds on a daemon thread"""
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                with pool.connection() as conn:
+                    fixed = reconcile(conn)
+                if any(fixed.values()):
+                    log.warning('counters.drift_repaired', **fixed)
+            except Exception:
+                log.error('counters.reconcile_failed', exc_info=True)
+
+    thread = threading.Thread(target=run, name='counter-reconciler', daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == '__main__':
+    conn = sqlite3.connect(sys.argv[1] if len(sys.argv) > 1 else '../../tournament_app.db')
+    for name, count in reconcile(conn).items():
+        print(f"{name}: {count} row(s) repaired")
+    conn.close()
@@ -0,0 +1,179 @@
+"""
+Bounded, thread-safe SQLite connection pool for the Flask backend.
+
+Connections are opened lazily, configured once when they are created and
+then reused. Inside a request, get_db_connection() checks a connection out
+and stores it on flask.g; the app teardown hook hands it back to the pool
+even if the handler raised.
+"""
+
+import sqlite3
+import threading
+import time
+
+from flask import current_app, g
+
+DEFAULT_PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('foreign_keys', 'ON'),
+    ('busy_timeout', 5000),
+    ('mmap_size', 268435456),  # 256 MB
+)
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes free within the wait timeout"""
+
+
+class ConnectionPool:
+    """Fixed-size pool of pre-configured sqlite3 connections"""
+
+    def __init__(self, database, max_size=8, timeout=10.0, pragmas=DEFAULT_PRAGMAS, factory=sqlite3.Connection):
+        self.database = database
+        self.factory = factory
+        self.max_size = max_size
+        self.timeout = timeout
+        self.pragmas = pragmas
+
+        self._idle = []
+        self._created = 0
+        self._cond = threading.Condition()
+
+        # Metrics
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_seconds = 0.0
+        self._checkout_seconds = 0.0
+        self._checkout_max = 0.0
+        self._timeouts = 0
+
+    def connect(self):
+        """A new connection configured like the pooled ones, not counted against the pool"""
+        conn = sqlite3.connect(self.database, check_same_thread=False, factory=self.factory)
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas:
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def acquire(self):
+        """Check a connection out, creating one if the pool is not full yet"""
+        started = time.perf_counter()
+        waited = False
+        create = False
+
+        with self._cond:
+            while not self._idle and self._created >= self.max_size:
+                remaining = self.timeout - (time.perf_counter() - started)
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(f'No database connection free after {self.timeout}s')
+                waited = True
+                self._cond.wait(remaining)
+
+            if self._idle:
+                conn = self._idle.pop()
+            else:
+                self._created += 1
+                create = True
+
+        if create:
+            try:
+                conn = self.connect()
+            except Exception:
+                with self._cond:
+                    self._created -= 1
+                    self._cond.notify()
+                raise
+
+        elapsed = time.perf_counter() - started
+        with self._cond:
+            self._checkouts += 1
+            self._checkout_seconds += elapsed
+            self._checkout_max = max(self._checkout_max, elapsed)
+            if waited:
+                self._waits += 1
+                self._wait_seconds += elapsed
+        return conn
+
+    def release(self, conn):
+        """Return a connection; anything left uncommitted is rolled back"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # A broken connection is dropped rather than handed out again
+            conn.close()
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            return
+
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def connection(self):
+        """Context manager for work outside a request (scripts, background jobs)"""
+        return _PooledConnection(self)
+
+    def close_all(self):
+        with self._cond:
+            while self._idle:
+                self._idle.pop().close()
+                self._created -= 1
+
+    def stats(self):
+        with self._cond:
+            checkouts = self._checkouts
+            return {
+                'max_size': self.max_size,
+                'size': self._created,
+                'idle': len(self._idle),
+                'in_use': self._created - len(self._idle),
+                'checkouts': checkouts,
+                'waits': self._waits,
+                'timeouts': self._timeouts,
+                'wait_seconds_total': round(self._wait_seconds, 6),
+                'checkout_latency_avg_ms': round(self._checkout_seconds / checkouts * 1000, 3) if checkouts else 0.0,
+                'checkout_latency_max_ms': round(self._checkout_max * 1000, 3),
+            }
+
+
+class _PooledConnection:
+    def __init__(self, pool):
+        self.pool = pool
+        self.conn = None
+
+    def __enter__(self):
+        self.conn = self.pool.acquire()
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.pool.release(self.conn)
+        self.conn = None
+
+
+def init_app(app, database, **kwargs):
+    """Attach a pool to the app and release connections on teardown"""
+    pool = ConnectionPool(database, **kwargs)
+    app.extensions['db_pool'] = pool
+
+    @app.teardown_appcontext
+    def release_db_connection(exc):
+        conn = g.pop('db', None)
+        if conn is not None:
+            pool.release(conn)
+
+    return pool
+
+
+def get_pool(app=None):
+    return (app or current_app).extensions['db_pool']
+
+
+def get_db_connection():
+    """Connection checked out for the current request (one per request)"""
+    if 'db' not in g:
+        g.db = get_pool().acquire()
+    return g.db
@@ -0,0 +1,207 @@
+"""
+In-process publish/subscribe hub behind the /api/events SSE stream.
+
+Write handlers publish after they commit; every open stream holds a
+Subscription to a few channels:
+
+    tournament:<id>        participants, matches and discussions of one tournament
+    discussion:<id>        replies in one discussion
+    user:<id>              connection requests and status changes for a user
+
+Publishing never blocks on subscribers: each one has a bounded queue, and
+a subscriber that falls behind has its backlog dropped and receives a
+single `resync` event telling the client to refetch. Recent events are kept
+in a ring buffer so a reconnecting client (Last-Event-ID) can catch up.
+
+Event ids are `<epoch>-<n>`: the epoch is random per hub, so an id handed
+out before a restart, or by another worker process, is recognised as
+foreign and answered with a resync instead of a replay that would skip
+events.
+
+Waiting subscribers cost a queue and a condition variable, nothing else;
+async servers can consume a Subscription without a thread per client by
+setting its `notify` hook and draining it with get_nowait().
+
+The hub lives in one process; with several worker processes each worker
+only sees the events of the writes it handled.
+"""
+
+import itertools
+import json
+import threading
+import time
+import uuid
+from collections import deque
+
+QUEUE_SIZE = 256
+REPLAY_SIZE = 1024
+MAX_SUBSCRIBERS = 10000
+MAX_CHANNELS = 50
+CHANNEL_KINDS = ('tournament', 'discussion', 'user')
+
+
+class TooManySubscribers(Exception):
+    """Raised by subscribe() when the hub is at MAX_SUBSCRIBERS"""
+
+
+def parse_channels(value):
+    """Parse `tournament:1,user:7` into channel names; raises ValueError"""
+    channels = set()
+    for name in (value or '').split(','):
+        name = name.strip()
+        if not name:
+            continue
+        kind, _, ident = name.partition(':')
+        if kind not in CHANNEL_KINDS or not ident.isdigit():
+            raise ValueError(f'Unknown channel: {name}')
+        channels.add(f'{kind}:{int(ident)}')
+    if not channels:
+        raise ValueError('At least one channel is required')
+    if len(channels) > MAX_CHANNELS:
+        raise ValueError(f'At most {MAX_CHANNELS} channels per stream')
+    return channels
+
+
+class Event:
+    __slots__ = ('epoch', 'id', 'channel', 'type', 'data', 'created')
+
+    def __init__(self, epoch, event_id, channel, event_type, data):
+        self.epoch = epoch
+        self.id = event_id
+        self.channel = channel
+        self.type = event_type
+        self.data = data
+        self.created = time.time()
+
+    def to_sse(self):
+        payload = json.dumps({'channel': self.channel, **self.data}, default=str)
+        return f'id: {self.epoch}-{self.id}\nevent: {self.type}\ndata: {payload}\n\n'
+
+
+class Subscription:
+    """Bounded per-subscriber queue; overflow turns into a resync marker"""
+
+    def __init__(self, hub, channels, queue_size):
+        self.hub = hub
+        self.channels = frozenset(channels)
+        self.queue_size = queue_size
+        self.dropped = 0
+        self._queue = deque()
+        self._lagged = False
+        self._cond = threading.Condition(threading.Lock())
+        # Optional hook for async consumers; called after each put
+        self.notify = None
+
+    def put(self, event):
+        with self._cond:
+            if self._lagged:
+                self.dropped += 1
+                return
+            if len(self._queue) >= self.queue_size:
+                self.dropped += len(self._queue) + 1
+                self._queue.clear()
+                self._lagged = True
+            else:
+                self._queue.append(event)
+            self._cond.notify()
+        if self.notify is not None:
+            self.notify()
+
+    def get_nowait(self):
+        """Next event, a resync Event if we fell behind, or None"""
+        with self._cond:
+            return self._pop()
+
+    def get(self, timeout=None):
+        with self._cond:
+            if not self._queue and not self._lagged:
+                self._cond.wait(timeout)
+            return self._pop()
+
+    def _pop(self):
+        if self._lagged:
+            self._lagged = False
+            return self.hub.resync_event('subscriber fell behind')
+        if self._queue:
+            return self._queue.popleft()
+        return None
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class EventHub:
+    def __init__(self, queue_size=QUEUE_SIZE, replay_size=REPLAY_SIZE, max_subscribers=MAX_SUBSCRIBERS):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._subscriptions = set()
+        self.epoch = uuid.uuid4().hex[:8]
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._by_channel = {}
+        self._recent = deque(maxlen=replay_size)
+        self.last_id = 0
+        self.published = 0
+
+    def resync_event(self, reason):
+        return Event(self.epoch, self.last_id, '*', 'resync', {'reason': reason})
+
+    def subscribe(self, channels, last_event_id=None, queue_size=None):
+        """Subscribe to channels; last_event_id is the raw Last-Event-ID to resume after"""
+        subscription = Subscription(self, channels, queue_size or self.queue_size)
+        with self._lock:
+            if len(self._subscriptions) >= self.max_subscribers:
+                raise TooManySubscribers(f'{self.max_subscribers} event streams already open')
+            self._subscriptions.add(subscription)
+            for channel in subscription.channels:
+                self._by_channel.setdefault(channel, set()).add(subscription)
+            if last_event_id:
+                epoch, _, number = str(last_event_id).rpartition('-')
+                oldest = self._recent[0].id if self._recent else self.last_id + 1
+                if epoch != self.epoch or not number.isdigit() or int(number) > self.last_id:
+                    # Issued before a restart or by another worker: nothing to replay from
+                    subscription.put(self.resync_event('unknown event id'))
+                elif int(number) < oldest - 1:
+                    # Missed events are no longer buffered
+                    subscription.put(self.resync_event('replay window exceeded'))
+                else:
+                    for event in self._recent:
+                        if event.id > int(number) and event.channel in subscription.channels:
+                            subscription.put(event)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+            for channel in subscription.channels:
+                subscribers = self._by_channel.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._by_channel[channel]
+
+    def publish(self, channel, event_type, **data):
+        with self._lock:
+            event = Event(self.epoch, next(self._ids), channel, event_type, data)
+            self.last_id = event.id
+            self.published += 1
+            self._recent.append(event)
+            subscribers = list(self._by_channel.get(channel, ()))
+        for subscription in subscribers:
+            subscription.put(event)
+        return event
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': len(self._subscriptions),
+                'max_subscribers': self.max_subscribers,
+                'channels': len(self._by_channel),
+                'published': self.published,
+                'last_event_id': f'{self.epoch}-{self.last_id}',
+                'dropped': sum(s.dropped for s in self._subscriptions),
+            }
+
+
+hub = EventHub()
+publish = hub.publish
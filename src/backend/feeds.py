@@ -0,0 +1,194 @@
+"""
+Home timelines: fan-out on write with a pull fallback.
+
+Posting pushes the post id into feed_timelines for the author and every
+accepted follower, in the posting transaction, so reading a timeline is a
+range scan on (user_id, post_id). Authors with more than FANOUT_LIMIT
+followers are recorded in feed_pull_authors instead, and their posts are
+merged into each follower's page at read time (one small index scan per
+followed pull author). The flag is sticky: once pulled, an author's feed
+stays pulled, so none of their posts can fall between the two paths.
+
+Timelines keep the newest TIMELINE_SIZE entries. trim() cuts them back in
+small batches of users, from the periodic job or the command line;
+--rebuild refills every timeline from social_posts (run it once after
+migration 8):
+
+    python feeds.py [database] [--rebuild]
+
+Following someone backfills their latest BACKFILL_SIZE posts; unfollowing
+removes their posts from the timeline.
+"""
+
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import request_log as log
+
+FANOUT_LIMIT = int(os.environ.get('FEED_FANOUT_LIMIT', 5000))
+TIMELINE_SIZE = 800
+BACKFILL_SIZE = 50
+BATCH_SIZE = 500
+
+
+def follower_count(conn, user_id, limit=None):
+    """Accepted followers, counting at most `limit` of them"""
+    return conn.execute('''
+        SELECT COUNT(*) FROM (
+            SELECT 1 FROM user_connections
+            WHERE following_id = ? AND connection_type = 'accepted'
+            LIMIT ?
+        )
+    ''', (user_id, -1 if limit is None else limit)).fetchone()[0]
+
+
+def is_pull_author(conn, user_id):
+    return conn.execute('SELECT 1 FROM feed_pull_authors WHERE user_id = ?', (user_id,)).fetchone() is not None
+
+
+def publish_post(conn, post_id, author_id):
+    """Deliver a new post in the caller's transaction; returns the number of timelines written"""
+    if not is_pull_author(conn, author_id) and follower_count(conn, author_id, FANOUT_LIMIT + 1) > FANOUT_LIMIT:
+        conn.execute('INSERT OR IGNORE INTO feed_pull_authors (user_id) VALUES (?)', (author_id,))
+    if is_pull_author(conn, author_id):
+        # Followers pull it; the author's own timeline still gets it
+        conn.execute('INSERT OR IGNORE INTO feed_timelines (user_id, post_id, author_id) VALUES (?, ?, ?)',
+                     (author_id, post_id, author_id))
+        return 1
+    return conn.execute('''
+        INSERT OR IGNORE INTO feed_timelines (user_id, post_id, author_id)
+        SELECT follower_id, :post_id, :author_id FROM user_connections
+        WHERE following_id = :author_id AND connection_type = 'accepted'
+        UNION ALL
+        SELECT :author_id, :post_id, :author_id
+    ''', {'post_id': post_id, 'author_id': author_id}).rowcount
+
+
+def follow(conn, follower_id, author_id):
+    """Backfill the author's latest posts into a new follower's timeline"""
+    if is_pull_author(conn, author_id):
+        return
+    conn.execute('''
+        INSERT OR IGNORE INTO feed_timelines (user_id, post_id, author_id)
+        SELECT ?, id, user_id FROM social_posts
+        WHERE user_id = ?
+        ORDER BY id DESC
+        LIMIT ?
+    ''', (follower_id, author_id, BACKFILL_SIZE))
+
+
+def unfollow(conn, follower_id, author_id):
+    conn.execute('DELETE FROM feed_timelines WHERE user_id = ? AND author_id = ?', (follower_id, author_id))
+
+
+def timeline_page(conn, user_id, limit, before=None):
+    """Post ids for one page, newest first: pushed entries merged with pulled authors' posts"""
+    pulled = [row[0] for row in conn.execute('''
+        SELECT a.user_id FROM feed_pull_authors a
+        JOIN user_connections uc ON uc.following_id = a.user_id
+        WHERE uc.follower_id = ? AND uc.connection_type = 'accepted'
+    ''', (user_id,))]
+
+    before = before if before is not None else sys.maxsize
+    # One bounded index scan per source, so the merge never reads more than limit rows of each
+    branches = ['SELECT * FROM (SELECT post_id FROM feed_timelines WHERE user_id = ? AND post_id < ? '
+                'ORDER BY post_id DESC LIMIT ?)']
+    params = [user_id, before, limit]
+    for author_id in pulled:
+        branches.append('SELECT * FROM (SELECT id FROM social_posts WHERE user_id = ? AND id < ? '
+                        'ORDER BY id DESC LIMIT ?)')
+        params += [author_id, before, limit]
+    # UNION drops posts that were pushed before their author became a pull author
+    sql = f"SELECT post_id FROM ({' UNION '.join(branches)}) ORDER BY post_id DESC LIMIT ?"
+    return [row[0] for row in conn.execute(sql, params + [limit])]
+
+
+def trim(conn, size=TIMELINE_SIZE, batch_size=BATCH_SIZE):
+    """Cut every timeline back to its newest `size` entries; returns rows deleted"""
+    deleted = 0
+    last_id = 0
+    while True:
+        row = conn.execute(
+            'SELECT MAX(id) FROM (SELECT id FROM users WHERE id > ? ORDER BY id LIMIT ?)',
+            (last_id, batch_size)).fetchone()
+        if row[0] is None:
+            return deleted
+        upper = row[0]
+        cursor = conn.execute('''
+            DELETE FROM feed_timelines WHERE (user_id, post_id) IN (
+                SELECT user_id, post_id FROM (
+                    SELECT user_id, post_id,
+                           ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY post_id DESC) AS position
+                    FROM feed_timelines
+                    WHERE user_id > ? AND user_id <= ?
+                )
+                WHERE position > ?
+            )
+        ''', (last_id, upper, size))
+        conn.commit()
+        deleted += cursor.rowcount
+        last_id = upper
+
+
+def rebuild(conn):
+    """Recompute pull authors and every timeline from posts and connections in one transaction"""
+    conn.execute('DELETE FROM feed_timelines')
+    conn.execute('DELETE FROM feed_pull_authors')
+    conn.execute('''
+        INSERT INTO feed_pull_authors (user_id)
+        SELECT following_id FROM user_connections
+        WHERE connection_type = 'accepted'
+        GROUP BY following_id
+        HAVING COUNT(*) > ?
+    ''', (FANOUT_LIMIT,))
+    conn.execute('''
+        INSERT INTO feed_timelines (user_id, post_id, author_id)
+        SELECT user_id, post_id, author_id FROM (
+            SELECT user_id, post_id, author_id,
+                   ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY post_id DESC) AS position
+            FROM (
+                SELECT uc.follower_id AS user_id, p.id AS post_id, p.user_id AS author_id
+                FROM user_connections uc
+                JOIN social_posts p ON p.user_id = uc.following_id
+                WHERE uc.connection_type = 'accepted'
+                  AND uc.following_id NOT IN (SELECT user_id FROM feed_pull_authors)
+                UNION
+                SELECT user_id, id, user_id FROM social_posts
+            )
+        )
+        WHERE position <= ?
+    ''', (TIMELINE_SIZE,))
+    conn.commit()
+
+
+def start_trimmer(pool, interval):
+    """Run trim() every `interval` seconds on a daemon thread"""
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                with pool.connection() as conn:
+                    deleted = trim(conn)
+                if deleted:
+                    log.info('feeds.trimmed', deleted=deleted)
+            except Exception:
+                log.error('feeds.trim_failed', exc_info=True)
+
+    thread = threading.Thread(target=run, name='feed-trimmer', daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == '__main__':
+    args = [arg for arg in sys.argv[1:] if arg != '--rebuild']
+    conn = sqlite3.connect(args[0] if args else '../../tournament_app.db')
+    if '--rebuild' in sys.argv:
+        rebuild(conn)
+        count = conn.execute('SELECT COUNT(*) FROM feed_timelines').fetchone()[0]
+        print(f"Timelines rebuilt: {count} entr(ies)")
+    else:
+        print(f"Timelines trimmed: {trim(conn)} entr(ies) removed")
+    conn.close()
@@ -0,0 +1,328 @@
+"""
+Request latency and SQL profiling, exported in Prometheus text format.
+
+Routes: every request is timed from before_request to after_request and
+counted into a fixed-bucket histogram per (route rule, method), plus a
+counter per status code. Streamed bodies are timed until the handler
+returns, not until the last byte is sent.
+
+SQL: pooled connections are created with TimedConnection, whose
+execute/executemany/executescript run on a TimedCursor. The cursor times
+the execute call and the fetchone/fetchmany/fetchall calls that follow and
+books them on the statement's normalized text, so a statement's time
+includes reading its rows. Rows read by iterating the cursor directly are
+not timed separately; their cost shows up mostly in execute (the first
+step does the sorting and grouping). Distinct statements are capped at
+MAX_STATEMENTS; the rest are booked on one overflow entry.
+
+A statement running longer than SLOW_QUERY_MS is captured with its
+EXPLAIN QUERY PLAN (planned once per statement, on the same connection and
+parameters) in a small ring of recent slow queries, which
+/api/metrics/sql lists alongside the full statement texts.
+
+The cost is two perf_counter() calls and a short locked update per call,
+a few microseconds, so it stays on in production (METRICS=0 turns it off).
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+
+from flask import Response, g, has_request_context, request
+
+ENABLED = os.environ.get('METRICS', '1') != '0'
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+MAX_STATEMENTS = 1000
+SLOW_LOG_SIZE = 100
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+OVERFLOW = '(other statements)'
+
+_WHITESPACE = re.compile(r'\s+')
+_NAME_UNSAFE = re.compile(r'[^a-zA-Z0-9_]')
+
+
+class Histogram:
+    """Fixed-bucket latency histogram per label tuple"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, seconds):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {labels: (list(counts), total, count) for labels, (counts, total, count) in self._series.items()}
+
+
+class RouteStats:
+    def __init__(self):
+        self.latency = Histogram()
+        self.statuses = {}
+        self._lock = threading.Lock()
+
+    def observe(self, route, method, status, seconds):
+        self.latency.observe((route, method), seconds)
+        key = (route, method, str(status))
+        with self._lock:
+            self.statuses[key] = self.statuses.get(key, 0) + 1
+
+
+class SqlStats:
+    """Call count, total and max time per normalized statement, and recent slow queries"""
+
+    def __init__(self, slow_ms=SLOW_QUERY_MS, max_statements=MAX_STATEMENTS):
+        self.slow_seconds = slow_ms / 1000
+        self.max_statements = max_statements
+        self.statements = {}
+        self.slow = deque(maxlen=SLOW_LOG_SIZE)
+        self._normalized = {}
+        self._lock = threading.Lock()
+
+    def key(self, sql):
+        """Normalized text for a statement; the same string object is reused for repeats"""
+        key = self._normalized.get(sql)
+        if key is None:
+            key = _WHITESPACE.sub(' ', sql).strip()
+            if len(self._normalized) < self.max_statements * 4:
+                self._normalized[sql] = key
+        return key
+
+    def record(self, key, seconds, calls, execution_seconds):
+        with self._lock:
+            entry = self.statements.get(key)
+            if entry is None:
+                if len(self.statements) >= self.max_statements:
+                    key = OVERFLOW
+                entry = self.statements.setdefault(key, {
+                    'id': hashlib.sha1(key.encode()).hexdigest()[:12],
+                    'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'slow': 0, 'plan': None,
+                })
+            entry['calls'] += calls
+            entry['seconds'] += seconds
+            if execution_seconds > entry['max_seconds']:
+                entry['max_seconds'] = execution_seconds
+            return entry
+
+    def record_slow(self, conn, key, text, params, seconds):
+        """Book a slow execution, planning the statement the first time it is slow"""
+        entry = self.statements.get(key) or self.statements.get(OVERFLOW)
+        plan = entry['plan'] if entry else None
+        if plan is None and params is not None:
+            try:
+                plan = [row[3] for row in sqlite3.Connection.execute(conn, 'EXPLAIN QUERY PLAN ' + text, params)]
+            except sqlite3.Error:
+                plan = []
+        with self._lock:
+            if entry is not None:
+                entry['slow'] += 1
+                entry['plan'] = plan
+            self.slow.append({
+                'statement_id': entry['id'] if entry else None,
+                'sql': key,
+                'ms': round(seconds * 1000, 3),
+                'plan': plan,
+                'route': request.path if has_request_context() else None,
+                'request_id': g.get('request_id') if has_request_context() else None,
+                'at': time.time(),
+            })
+
+    def report(self):
+        with self._lock:
+            statements = sorted(({'sql': sql, **entry} for sql, entry in self.statements.items()),
+                                key=lambda entry: entry['seconds'], reverse=True)
+            return {'slow_query_ms': self.slow_seconds * 1000, 'statements': statements, 'slow': list(self.slow)}
+
+
+routes = RouteStats()
+sql = SqlStats()
+# (prefix, zero-argument callable returning a flat stats dict)
+_gauges = []
+
+
+def register_gauges(prefix, stats):
+    """Export a component's numeric stats() fields as backend_<prefix>_<field> gauges"""
+    _gauges.append((prefix, stats))
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that books execute and fetch time on its statement"""
+
+    _key = None
+    _sql = None
+    _params = None
+    _seconds = 0.0
+    _reported = False
+
+    def _book(self, seconds, calls=0):
+        self._seconds += seconds
+        sql.record(self._key, seconds, calls, self._seconds)
+        if self._seconds >= sql.slow_seconds and not self._reported:
+            self._reported = True
+            sql.record_slow(self.connection, self._key, self._sql, self._params, self._seconds)
+
+    def execute(self, statement, parameters=()):
+        self._key, self._sql, self._params = sql.key(statement), statement, parameters
+        self._seconds, self._reported = 0.0, False
+        started = time.perf_counter()
+        try:
+            return super().execute(statement, parameters)
+        finally:
+            self._book(time.perf_counter() - started, 1)
+
+    def executemany(self, statement, seq_of_parameters):
+        # Not planned when slow: there is no single parameter set to plan with
+        self._key, self._sql, self._params = sql.key(statement), statement, None
+        self._seconds, self._reported = 0.0, False
+        started = time.perf_counter()
+        try:
+            return super().executemany(statement, seq_of_parameters)
+        finally:
+            self._book(time.perf_counter() - started, 1)
+
+    def executescript(self, script):
+        self._key, self._sql, self._params = sql.key(script), script, None
+        self._seconds, self._reported = 0.0, False
+        started = time.perf_counter()
+        try:
+            return super().executescript(script)
+        finally:
+            self._book(time.perf_counter() - started, 1)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            if self._key is not None:
+                self._book(time.perf_counter() - started)
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        try:
+            return super().fetchmany(self.arraysize if size is None else size)
+        finally:
+            if self._key is not None:
+                self._book(time.perf_counter() - started)
+
+    def fetchall(self):
+        started = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            if self._key is not None:
+                self._book(time.perf_counter() - started)
+
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose shortcut execute methods run on a TimedCursor"""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, statement, parameters=()):
+        return self.cursor().execute(statement, parameters)
+
+    def executemany(self, statement, seq_of_parameters):
+        return self.cursor().executemany(statement, seq_of_parameters)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+
+def connection_factory():
+    """Connection class for the pool: timed unless METRICS=0"""
+    return TimedConnection if ENABLED else sqlite3.Connection
+
+
+def init_app(app):
+    """Time every request into the route histogram"""
+    if not ENABLED:
+        return
+
+    @app.before_request
+    def start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def observe_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            rule = request.url_rule.rule if request.url_rule is not None else '(unmatched)'
+            routes.observe(rule, request.method, response.status_code, time.perf_counter() - started)
+        return response
+
+
+# Prometheus text exposition
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _metric(lines, name, kind, help_text):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} {kind}')
+
+
+def render():
+    """Prometheus text for routes, SQL statements and the registered gauges"""
+    lines = []
+    name = 'backend_http_request_duration_seconds'
+    _metric(lines, name, 'histogram', 'Request latency by route and method')
+    for (route, method), (counts, total, count) in sorted(routes.latency.snapshot().items()):
+        cumulative = 0
+        for bound, bucket in zip(routes.latency.buckets + ('+Inf',), counts):
+            cumulative += bucket
+            lines.append(f'{name}_bucket{_labels(route=route, method=method, le=bound)} {cumulative}')
+        lines.append(f'{name}_sum{_labels(route=route, method=method)} {total:.6f}')
+        lines.append(f'{name}_count{_labels(route=route, method=method)} {count}')
+
+    name = 'backend_http_responses_total'
+    _metric(lines, name, 'counter', 'Responses by route, method and status code')
+    for (route, method, status), count in sorted(routes.statuses.items()):
+        lines.append(f'{name}{_labels(route=route, method=method, status=status)} {count}')
+
+    # Statements are labelled by id; /api/metrics/sql maps ids to their text
+    report = sql.report()
+    for suffix, field, kind, help_text in (
+            ('calls_total', 'calls', 'counter', 'Executions per SQL statement'),
+            ('seconds_total', 'seconds', 'counter', 'Execute and fetch time per SQL statement'),
+            ('max_seconds', 'max_seconds', 'gauge', 'Slowest single execution per SQL statement'),
+            ('slow_total', 'slow', 'counter', f'Executions over {SLOW_QUERY_MS:g} ms per SQL statement')):
+        name = f'backend_sql_statement_{suffix}'
+        _metric(lines, name, kind, help_text)
+        for entry in report['statements']:
+            value = entry[field]
+            lines.append(f"{name}{_labels(statement=entry['id'])} {value:.6f}" if isinstance(value, float)
+                         else f"{name}{_labels(statement=entry['id'])} {value}")
+
+    for prefix, stats in _gauges:
+        for key, value in sorted(stats().items()):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = _NAME_UNSAFE.sub('_', f'backend_{prefix}_{key}')
+            _metric(lines, name, 'gauge', f'{prefix} {key}')
+            lines.append(f'{name} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def prometheus_response():
+    return Response(render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,232 @@
+"""
+Asynchronous, coalescing notification delivery.
+
+Handlers call Notifier.notify() after they commit; that is a put on a
+bounded in-memory queue, so a request never waits on notification writes.
+A background worker drains the queue in batches (FLUSH_SECONDS or
+BATCH_SIZE events, whichever comes first) and writes each batch in one
+transaction:
+
+  - events for the same user and group (all new followers; replies in one
+    discussion; match results in one tournament) collapse into a single
+    notification, "5 new followers" rather than five rows;
+  - a burst that continues an unread notification of the same group from
+    the last COALESCE_MINUTES replaces it with one carrying the total, so
+    the merged notification moves to the top of the list.
+
+Unread counts live in notification_counts, kept by triggers (migration 9),
+so reading one is a primary-key lookup instead of COUNT(*).
+
+If the queue is full, events are dropped and counted rather than blocking
+the handler; events still queued when the process dies are lost, which is
+acceptable for notifications. stop() flushes what is left.
+"""
+
+import json
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+import events
+import request_log as log
+
+FLUSH_SECONDS = 0.5
+BATCH_SIZE = 500
+MAX_QUEUE = 100000
+COALESCE_MINUTES = 60
+
+# type: (title, grouped title, message, grouped message, grouped per related item)
+KINDS = {
+    'new_follower': (
+        'New follower', '{count} new followers',
+        '{actor} started following you', '{actor} and {more} more started following you',
+        False),
+    'match_result': (
+        'Match result', '{count} match results',
+        'Your match against {actor} in {related} was reported',
+        'Your matches against {actor} and {more} more in {related} were reported',
+        True),
+    'comment_reply': (
+        'New reply', '{count} new replies',
+        '{actor} replied to "{related}"', '{actor} and {more} more replied to "{related}"',
+        True),
+}
+
+# related_type: (table, display column)
+RELATED_NAMES = {
+    'tournament': ('tournaments', 'title'),
+    'discussion': ('tournament_discussions', 'title'),
+}
+
+_STOP = object()
+
+
+def group_key(kind, related_type, related_id):
+    return f'{kind}:{related_type}:{related_id}' if KINDS[kind][4] else kind
+
+
+class Notifier:
+    def __init__(self, pool, flush_seconds=FLUSH_SECONDS, batch_size=BATCH_SIZE, max_queue=MAX_QUEUE):
+        self.pool = pool
+        self.flush_seconds = flush_seconds
+        self.batch_size = batch_size
+        self.queue = queue.Queue(max_queue)
+        self.thread = None
+        self._write_lock = threading.Lock()
+        self.counts = {'queued': 0, 'dropped': 0, 'batches': 0, 'written': 0, 'coalesced': 0, 'failed': 0}
+
+    def notify(self, user_id, kind, actor_id=None, related_type=None, related_id=None):
+        """Queue one event for user_id; never blocks"""
+        if kind not in KINDS:
+            raise ValueError(f'Unknown notification type: {kind}')
+        if user_id is None:
+            return
+        user_id, actor_id = int(user_id), (int(actor_id) if actor_id is not None else None)
+        if user_id == actor_id:
+            return
+        try:
+            self.queue.put_nowait((user_id, kind, actor_id, related_type, related_id))
+            self.counts['queued'] += 1
+        except queue.Full:
+            self.counts['dropped'] += 1
+            log.warning('notifications.dropped', user_id=user_id, type=kind)
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='notifier', daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def stop(self, timeout=5.0):
+        """Write everything still queued and stop the worker"""
+        if self.thread is not None:
+            self.queue.put(_STOP)
+            self.thread.join(timeout)
+            self.thread = None
+        self.flush()
+
+    def flush(self):
+        """Write everything queued so far from the calling thread"""
+        batch = []
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                batch.append(item)
+        for start in range(0, len(batch), self.batch_size):
+            self._write(batch[start:start + self.batch_size])
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            stopping = False
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._write(batch)
+            if stopping:
+                return
+
+    def _write(self, batch):
+        if not batch:
+            return
+        try:
+            with self._write_lock, self.pool.connection() as conn:
+                try:
+                    written = write_batch(conn, batch)
+                except Exception:
+                    conn.rollback()
+                    raise
+        except Exception:
+            self.counts['failed'] += len(batch)
+            log.error('notifications.write_failed', exc_info=True, events=len(batch))
+            return
+        self.counts['batches'] += 1
+        self.counts['written'] += len(written)
+        self.counts['coalesced'] += len(batch) - len(written)
+        for user_id in sorted({row['user_id'] for row in written}):
+            events.publish(f'user:{user_id}', 'notifications',
+                           notification_ids=[row['id'] for row in written if row['user_id'] == user_id])
+
+    def stats(self):
+        return {**self.counts, 'pending': self.queue.qsize()}
+
+
+def _names(conn, table, column, ids):
+    if not ids:
+        return {}
+    return dict(conn.execute(
+        f'SELECT id, {column} FROM {table} WHERE id IN (SELECT value FROM json_each(?))',
+        (json.dumps(sorted(ids)),)).fetchall())
+
+
+def write_batch(conn, batch):
+    """Coalesce and insert one batch of (user_id, type, actor_id, related_type, related_id)"""
+    groups = OrderedDict()
+    for user_id, kind, actor_id, related_type, related_id in batch:
+        key = (user_id, group_key(kind, related_type, related_id))
+        group = groups.setdefault(key, {'type': kind, 'count': 0})
+        # The latest event names the notification
+        group.update(count=group['count'] + 1, actor_id=actor_id,
+                     related_type=related_type, related_id=related_id)
+
+    conn.execute('BEGIN IMMEDIATE')
+    # Unread notifications of the same groups from the coalescing window get merged in
+    previous = conn.execute('''
+        SELECT n.id, n.user_id, n.group_key, n.event_count
+        FROM json_each(?) k
+        JOIN notifications n
+          ON n.user_id = json_extract(k.value, '$[0]') AND n.group_key = json_extract(k.value, '$[1]')
+        WHERE n.is_read = 0 AND n.created_at >= datetime('now', ?)
+    ''', (json.dumps(list(groups)), f'-{COALESCE_MINUTES} minutes')).fetchall()
+    for notification_id, user_id, key, count in previous:
+        groups[(user_id, key)]['count'] += count
+    conn.executemany('DELETE FROM notifications WHERE id = ?', [(row[0],) for row in previous])
+
+    actors = _names(conn, 'users', 'username',
+                    {group['actor_id'] for group in groups.values() if group['actor_id'] is not None})
+    related = {}
+    for related_type, (table, column) in RELATED_NAMES.items():
+        ids = {group['related_id'] for group in groups.values() if group['related_type'] == related_type}
+        related[related_type] = _names(conn, table, column, ids)
+
+    rows = []
+    for (user_id, key), group in groups.items():
+        title, group_title, message, group_message, _ = KINDS[group['type']]
+        fields = {
+            'count': group['count'],
+            'more': group['count'] - 1,
+            'actor': actors.get(group['actor_id'], 'Someone'),
+            'related': related.get(group['related_type'], {}).get(group['related_id'], f"a {group['related_type']}"),
+        }
+        single = group['count'] == 1
+        rows.append((user_id, group['type'], (title if single else group_title).format(**fields),
+                     (message if single else group_message).format(**fields),
+                     group['related_id'], group['related_type'], key, group['count'], group['actor_id']))
+
+    last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM notifications').fetchone()[0]
+    conn.executemany('''
+        INSERT INTO notifications (
+            user_id, type, title, message, related_id, related_type, group_key, event_count, actor_id
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    # We hold the write lock, so every id above last_id is ours
+    written = [{'id': row[0], 'user_id': row[1]} for row in conn.execute(
+        'SELECT id, user_id FROM notifications WHERE id > ? ORDER BY id', (last_id,))]
+    conn.commit()
+    return written
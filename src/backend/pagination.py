@@ -0,0 +1,132 @@
+"""
+Keyset pagination helpers.
+
+Cursors are opaque to clients: the sort-key values of the last row on a page,
+JSON encoded and base64url wrapped. The next page is fetched with a
+"(sort keys) < (cursor values)" condition instead of OFFSET, so every page
+costs the same no matter how deep it is.
+"""
+
+import base64
+import json
+
+from streaming import stream_response
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+class InvalidPageRequest(ValueError):
+    """Bad limit or cursor supplied by the client"""
+
+
+def parse_limit(value, default=DEFAULT_LIMIT, maximum=MAX_LIMIT):
+    if value in (None, ''):
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise InvalidPageRequest('limit must be an integer')
+    if limit < 1:
+        raise InvalidPageRequest('limit must be positive')
+    return min(limit, maximum)
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, size):
+    """Decode a cursor and check it carries `size` sort-key values"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidPageRequest('invalid cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidPageRequest('invalid cursor')
+    return values
+
+
+class ListQuery:
+    """Keyset-paginated, projectable SELECT over a fixed source.
+
+    fields maps public field names to SQL expressions; only these can be
+    requested with ?fields=. sort_keys must end in a unique column so the
+    order is stable, and all keys sort in the same direction so the cursor
+    condition is a single row-value comparison. A nullable key must be a
+    COALESCE expression (NULL never compares, so those rows would be skipped)
+    with an index on that exact expression; unindexed() checks the plan.
+    """
+
+    def __init__(self, source, fields, sort_keys, descending=False, default_fields=None):
+        self.source = source
+        self.fields = fields
+        self.sort_keys = sort_keys
+        self.descending = descending
+        self.default_fields = list(default_fields or fields)
+
+    def parse_fields(self, value):
+        if not value:
+            return self.default_fields
+        names = [name.strip() for name in value.split(',') if name.strip()]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise InvalidPageRequest(f"unknown field(s): {', '.join(unknown)}")
+        return names or self.default_fields
+
+    def build(self, args, where='', params=()):
+        """SQL and parameters for one page; returns (sql, params, limit, field names)"""
+        limit = parse_limit(args.get('limit'))
+        names = self.parse_fields(args.get('fields'))
+        cursor = decode_cursor(args.get('cursor'), len(self.sort_keys))
+
+        columns = [f'{self.fields[name]} AS "{name}"' for name in names]
+        columns += [f'{key} AS _k{i}' for i, key in enumerate(self.sort_keys)]
+        conditions = [where] if where else []
+        params = list(params)
+        if cursor is not None:
+            keys = ', '.join(self.sort_keys)
+            marks = ', '.join('?' for _ in self.sort_keys)
+            conditions.append(f"({keys}) {'<' if self.descending else '>'} ({marks})")
+            params.extend(cursor)
+            # Implied by the row value, but SQLite only seeks an index on an
+            # expression (e.g. a COALESCE sort key) from a plain comparison
+            conditions.append(f"{self.sort_keys[0]} {'<=' if self.descending else '>='} ?")
+            params.append(cursor[0])
+
+        direction = 'DESC' if self.descending else 'ASC'
+        sql = (f"SELECT {', '.join(columns)} FROM {self.source}"
+               + (f" WHERE {' AND '.join(conditions)}" if conditions else '')
+               + f" ORDER BY {', '.join(f'{key} {direction}' for key in self.sort_keys)}"
+               + ' LIMIT ?')
+        params.append(limit + 1)
+        return sql, params, limit, names
+
+    def unindexed(self, conn, where='', params=()):
+        """Plan steps of a cursor page that sort or scan instead of reading an index range"""
+        cursor = encode_cursor([0] * len(self.sort_keys))
+        sql, params, _, _ = self.build({'cursor': cursor}, where, params)
+        steps = [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+        return [step for step in steps
+                if 'TEMP B-TREE' in step or (step.startswith('SCAN') and 'INDEX' not in step)]
+
+    def fetch_page(self, conn, args, where='', params=()):
+        """Returns (list of dicts, next cursor or None)"""
+        sql, params, limit, names = self.build(args, where, params)
+        rows = conn.execute(sql, params).fetchmany(limit + 1)
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor(last[f'_k{i}'] for i in range(len(self.sort_keys)))
+        return [{name: row[name] for name in names} for row in rows], next_cursor
+
+
+def page_response(items, next_cursor):
+    """Streamed JSON array (or NDJSON) body; the next page's cursor travels in X-Next-Cursor"""
+    headers = {'X-Next-Cursor': next_cursor} if next_cursor else None
+    return stream_response(items, headers=headers)
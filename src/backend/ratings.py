@@ -0,0 +1,278 @@
+"""
+Elo ratings from match results.
+
+Each rated match moves both players by K * (S - E), where
+E = 1 / (1 + 10 ** ((opponent - rating) / 400)) and S is 1, 0.5 (equal
+scores) or 0. K is K_PROVISIONAL for a player's first PROVISIONAL_GAMES
+games and K_ESTABLISHED after that. Matches are rated in report order
+(match_results.id) and every change is kept in rating_history.
+
+rate_matches() rates new results inside the reporting transaction. An
+updated or deleted match can be undone exactly only while it is the latest
+rated match of both players (unrate_match); otherwise the ratings are
+flagged stale until the next full recompute:
+
+    python ratings.py [database]
+
+recompute() replays the whole history. With NumPy installed it groups the
+matches into waves, consecutive runs in which no player appears twice, and
+rates each wave with one vectorized update; every player still sees their
+matches in order, so the result equals the sequential replay. Histories
+too chained to form wide waves (and installs without NumPy) use the plain
+loop.
+"""
+
+import itertools
+import json
+import sqlite3
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError:  # optional: recompute() falls back to pure Python
+    np = None
+
+INITIAL_RATING = 1500.0
+K_PROVISIONAL = 40.0
+K_ESTABLISHED = 20.0
+PROVISIONAL_GAMES = 30
+# Below this many matches per wave the vectorized path is slower than the loop
+MIN_WAVE_SIZE = 16
+
+
+def expected(rating, opponent):
+    return 1.0 / (1.0 + 10.0 ** ((opponent - rating) / 400.0))
+
+
+def k_factor(games):
+    return K_PROVISIONAL if games < PROVISIONAL_GAMES else K_ESTABLISHED
+
+
+def outcome(score1, score2):
+    """Player 1's score: 1 for a win, 0.5 for equal scores, 0 for a loss"""
+    score1, score2 = score1 or 0, score2 or 0
+    return 1.0 if score1 > score2 else 0.5 if score1 == score2 else 0.0
+
+
+def rate_matches(conn, matches):
+    """Rate new results in order; matches are mappings with id, players and scores"""
+    matches = [m for m in matches if m['player1_id'] != m['player2_id']]
+    if not matches:
+        return
+    players = {player for m in matches for player in (m['player1_id'], m['player2_id'])}
+    state = {row[0]: (row[1], row[2]) for row in conn.execute('''
+        SELECT user_id, rating, games FROM player_ratings
+        WHERE user_id IN (SELECT value FROM json_each(?))
+    ''', (json.dumps(list(players)),))}
+
+    history = []
+    for m in matches:
+        player1_id, player2_id = m['player1_id'], m['player2_id']
+        rating1, games1 = state.get(player1_id, (INITIAL_RATING, 0))
+        rating2, games2 = state.get(player2_id, (INITIAL_RATING, 0))
+        delta = outcome(m['score_player1'], m['score_player2']) - expected(rating1, rating2)
+        new1 = rating1 + k_factor(games1) * delta
+        new2 = rating2 - k_factor(games2) * delta
+        state[player1_id] = (new1, games1 + 1)
+        state[player2_id] = (new2, games2 + 1)
+        history.append((player1_id, m['id'], rating1, new1))
+        history.append((player2_id, m['id'], rating2, new2))
+
+    conn.executemany('''
+        INSERT INTO player_ratings (user_id, rating, games) VALUES (?, ?, ?)
+        ON CONFLICT (user_id) DO UPDATE SET
+            rating = excluded.rating, games = excluded.games, updated_at = CURRENT_TIMESTAMP
+    ''', ((user_id, rating, games) for user_id, (rating, games) in state.items() if user_id in players))
+    conn.executemany('''
+        INSERT INTO rating_history (user_id, match_result_id, rating_before, rating_after)
+        VALUES (?, ?, ?, ?)
+    ''', history)
+
+
+def mark_stale(conn):
+    conn.execute('INSERT INTO rating_state (id, stale) VALUES (1, 1) ON CONFLICT (id) DO UPDATE SET stale = 1')
+
+
+def is_stale(conn):
+    row = conn.execute('SELECT stale FROM rating_state WHERE id = 1').fetchone()
+    return bool(row and row[0])
+
+
+def unrate_match(conn, match_id):
+    """Take a match's rating change back; False (and ratings flagged stale) if it isn't the latest"""
+    rows = conn.execute('''
+        SELECT h.user_id, h.rating_before,
+               EXISTS (SELECT 1 FROM rating_history later
+                       WHERE later.user_id = h.user_id AND later.id > h.id) AS superseded
+        FROM rating_history h
+        WHERE h.match_result_id = ?
+    ''', (match_id,)).fetchall()
+    if not rows:
+        return True
+    if any(row[2] for row in rows):
+        mark_stale(conn)
+        return False
+    conn.executemany('UPDATE player_ratings SET rating = ?, games = games - 1 WHERE user_id = ?',
+                     [(row[1], row[0]) for row in rows])
+    conn.execute('DELETE FROM rating_history WHERE match_result_id = ?', (match_id,))
+    return True
+
+
+# ---------- full recompute ----------
+
+def _replay_loop(player1, player2, outcomes, n_players):
+    """Sequential replay; returns (rating before/after per side, final ratings, games)"""
+    rating = [INITIAL_RATING] * n_players
+    games = [0] * n_players
+    before1, after1, before2, after2 = [], [], [], []
+    for a, b, s in zip(player1, player2, outcomes):
+        rating_a, rating_b = rating[a], rating[b]
+        delta = s - 1.0 / (1.0 + 10.0 ** ((rating_b - rating_a) / 400.0))
+        new_a = rating_a + (K_PROVISIONAL if games[a] < PROVISIONAL_GAMES else K_ESTABLISHED) * delta
+        new_b = rating_b - (K_PROVISIONAL if games[b] < PROVISIONAL_GAMES else K_ESTABLISHED) * delta
+        rating[a], rating[b] = new_a, new_b
+        games[a] += 1
+        games[b] += 1
+        before1.append(rating_a)
+        after1.append(new_a)
+        before2.append(rating_b)
+        after2.append(new_b)
+    return (before1, after1, before2, after2), rating, games
+
+
+def _waves(player1, player2, n_players):
+    """Wave number per match: one more than the latest wave of either player"""
+    last = [0] * n_players
+    waves = []
+    append = waves.append
+    for a, b in zip(player1, player2):
+        wave_a, wave_b = last[a], last[b]
+        last[a] = last[b] = wave = (wave_a if wave_a > wave_b else wave_b) + 1
+        append(wave)
+    return waves
+
+
+def _replay_vectorized(player1, player2, outcomes, n_players, waves):
+    n = len(player1)
+    # K for each side from the player's game count before the match
+    sides = np.concatenate([player1, player2])
+    by_player = np.lexsort((np.tile(np.arange(n), 2), sides))
+    sorted_sides = sides[by_player]
+    group_start = np.flatnonzero(np.r_[True, sorted_sides[1:] != sorted_sides[:-1]])
+    played = np.empty(2 * n, dtype=np.int64)
+    played[by_player] = np.arange(2 * n) - np.repeat(group_start, np.diff(np.r_[group_start, 2 * n]))
+    k = np.where(played < PROVISIONAL_GAMES, K_PROVISIONAL, K_ESTABLISHED)
+
+    # Sorted by wave, every wave is a contiguous slice
+    order = np.argsort(waves, kind='stable')
+    bounds = [0] + (np.flatnonzero(np.diff(waves[order])) + 1).tolist() + [n]
+    a, b, s, k_a, k_b = player1[order], player2[order], outcomes[order], k[:n][order], k[n:][order]
+    rating = np.full(n_players, INITIAL_RATING)
+    before_a, after_a, before_b, after_b = np.empty(n), np.empty(n), np.empty(n), np.empty(n)
+
+    for lo, hi in zip(bounds, bounds[1:]):
+        wave_a, wave_b = a[lo:hi], b[lo:hi]
+        rating_a, rating_b = rating[wave_a], rating[wave_b]
+        delta = s[lo:hi] - 1.0 / (1.0 + 10.0 ** ((rating_b - rating_a) / 400.0))
+        new_a = rating_a + k_a[lo:hi] * delta
+        new_b = rating_b - k_b[lo:hi] * delta
+        # No player appears twice in a wave, so plain fancy assignment is safe
+        rating[wave_a], rating[wave_b] = new_a, new_b
+        before_a[lo:hi], after_a[lo:hi], before_b[lo:hi], after_b[lo:hi] = rating_a, new_a, rating_b, new_b
+
+    columns = []
+    for values in (before_a, after_a, before_b, after_b):
+        unsorted = np.empty(n)
+        unsorted[order] = values
+        columns.append(unsorted.tolist())
+    games = np.bincount(sides, minlength=n_players)
+    return columns, rating.tolist(), games.tolist()
+
+
+def replay(match_ids, player_ids1, player_ids2, scores1, scores2, vectorize=None):
+    """Rate a whole history (parallel lists in report order); returns (history rows, ratings rows, method)"""
+    method = 'loop'
+    if vectorize is not False and np is not None and match_ids:
+        ids, index = np.unique(np.asarray(player_ids1 + player_ids2), return_inverse=True)
+        user_ids = ids.tolist()
+        player1, player2 = index[:len(match_ids)], index[len(match_ids):]
+        outcomes = (np.sign(np.subtract(scores1, scores2)) + 1) / 2.0
+        waves = np.asarray(_waves(player1.tolist(), player2.tolist(), len(user_ids)))
+        if vectorize or len(match_ids) / waves.max() >= MIN_WAVE_SIZE:
+            method = 'vectorized'
+            sides, rating, games = _replay_vectorized(player1, player2, outcomes, len(user_ids), waves)
+        else:
+            player1, player2, outcomes = player1.tolist(), player2.tolist(), outcomes.tolist()
+    else:
+        user_ids = sorted(set(player_ids1) | set(player_ids2))
+        index = {user_id: i for i, user_id in enumerate(user_ids)}
+        player1 = [index[user_id] for user_id in player_ids1]
+        player2 = [index[user_id] for user_id in player_ids2]
+        outcomes = [outcome(score1, score2) for score1, score2 in zip(scores1, scores2)]
+    if method == 'loop':
+        sides, rating, games = _replay_loop(player1, player2, outcomes, len(user_ids))
+
+    before1, after1, before2, after2 = sides
+    history = itertools.chain.from_iterable(
+        ((p1, match_id, b1, a1), (p2, match_id, b2, a2))
+        for match_id, p1, p2, b1, a1, b2, a2
+        in zip(match_ids, player_ids1, player_ids2, before1, after1, before2, after2))
+    ratings = zip(user_ids, rating, games)
+    return history, ratings, method
+
+
+def recompute(conn, vectorize=None):
+    """Replace ratings and history with a replay of every match; returns timings"""
+    started = time.perf_counter()
+    columns = list(zip(*conn.execute('''
+        SELECT id, player1_id, player2_id, COALESCE(score_player1, 0), COALESCE(score_player2, 0)
+        FROM match_results
+        WHERE player1_id IS NOT NULL AND player2_id IS NOT NULL AND player1_id != player2_id
+        ORDER BY id
+    ''').fetchall())) or [(), (), (), (), ()]
+    loaded = time.perf_counter()
+
+    history, ratings, method = replay(*columns, vectorize=vectorize)
+    history = list(history)
+    rated = time.perf_counter()
+
+    conn.execute('BEGIN IMMEDIATE')
+    # Building the history indexes once after the insert beats updating them row by row
+    indexes = conn.execute('''
+        SELECT name, sql FROM sqlite_master
+        WHERE type = 'index' AND tbl_name = 'rating_history' AND sql IS NOT NULL
+    ''').fetchall()
+    for name, _ in indexes:
+        conn.execute(f'DROP INDEX {name}')
+    conn.execute('DELETE FROM rating_history')
+    conn.execute('DELETE FROM player_ratings')
+    conn.executemany('INSERT INTO player_ratings (user_id, rating, games) VALUES (?, ?, ?)', ratings)
+    conn.executemany('''
+        INSERT INTO rating_history (user_id, match_result_id, rating_before, rating_after)
+        VALUES (?, ?, ?, ?)
+    ''', history)
+    for _, sql in indexes:
+        conn.execute(sql)
+    conn.execute('''
+        INSERT INTO rating_state (id, stale, recomputed_at) VALUES (1, 0, CURRENT_TIMESTAMP)
+        ON CONFLICT (id) DO UPDATE SET stale = 0, recomputed_at = CURRENT_TIMESTAMP
+    ''')
+    conn.commit()
+    finished = time.perf_counter()
+
+    return {
+        'matches': len(columns[0]),
+        'method': method,
+        'load_seconds': round(loaded - started, 3),
+        'rate_seconds': round(rated - loaded, 3),
+        'write_seconds': round(finished - rated, 3),
+    }
+
+
+if __name__ == '__main__':
+    conn = sqlite3.connect(sys.argv[1] if len(sys.argv) > 1 else '../../tournament_app.db')
+    result = recompute(conn)
+    print(f"Rated {result['matches']} match(es) ({result['method']}): load {result['load_seconds']}s, "
+          f"rate {result['rate_seconds']}s, write {result['write_seconds']}s")
+    conn.close()
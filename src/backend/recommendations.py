@@ -0,0 +1,237 @@
+"""
+"People you may know": friend-of-friend recommendations.
+
+The accepted follow graph is held in memory as CSR arrays: the users a
+user follows are targets[offsets[u]:offsets[u + 1]], sorted, indexed by
+user id. A recommendation walks two hops out from the user and counts, for
+every candidate, how many of the people the user follows also follow them
+(the mutual connections); the top k by that count are returned. That is a
+few C-level passes over short array slices, so it stays in the
+milliseconds on graphs with millions of edges.
+
+Writes reach the graph through graph_changes, a log filled by triggers on
+user_connections (migration 11). Before each recommendation the graph
+applies the log entries it has not seen into a small per-user overlay of
+added and removed edges, so a follow, an accepted request or a removed
+connection shows up on the next request, in every worker process. The
+periodic job folds a large overlay back into fresh CSR arrays and prunes
+the log; a process that has fallen behind the pruned log reloads.
+
+Print recommendations for a user from the command line:
+
+    python recommendations.py [database] <user id>
+"""
+
+import os
+import sqlite3
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from heapq import nlargest
+
+import request_log as log
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+# Overlay edges that trigger a rebuild of the CSR arrays
+COMPACT_AT = int(os.environ.get('GRAPH_COMPACT_AT', 50000))
+# graph_changes rows kept for processes that are catching up
+LOG_KEEP = 100000
+# Bits per user id in the packed keys load() sorts
+ID_BITS = 32
+
+
+class SocialGraph:
+    """Accepted follow edges as CSR arrays plus an overlay of recent changes"""
+
+    def __init__(self):
+        self.offsets = array('q', [0])
+        self.targets = array('q')
+        self.added = {}
+        self.removed = {}
+        self.overlay_size = 0
+        self.change_id = None
+        self.loaded_at = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self.counts = {'loads': 0, 'changes': 0, 'requests': 0}
+
+    # Loading
+
+    def load(self, conn):
+        """Rebuild the CSR arrays from user_connections; changes after the snapshot are applied by sync()"""
+        with self._load_lock:
+            conn.execute('BEGIN')
+            try:
+                row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'graph_changes'").fetchone()
+                change_id = row[0] if row else 0
+                # A sequential scan and one sort of packed (follower, following)
+                # keys beat walking the unique index, which reads rows at random
+                keys = [row[0] for row in conn.execute(f'''
+                    SELECT follower_id << {ID_BITS} | following_id FROM user_connections NOT INDEXED
+                    WHERE connection_type = 'accepted'
+                ''')]
+            finally:
+                conn.commit()
+            keys.sort()
+            mask = (1 << ID_BITS) - 1
+            targets = array('q', (key & mask for key in keys))
+            size = (keys[-1] >> ID_BITS) + 1 if keys else 0
+            offsets = array('q', (bisect_left(keys, u << ID_BITS) for u in range(size)))
+            offsets.append(len(targets))
+            with self._lock:
+                self.offsets, self.targets = offsets, targets
+                self.added, self.removed, self.overlay_size = {}, {}, 0
+                self.change_id = change_id
+                self.loaded_at = time.time()
+                self.counts['loads'] += 1
+        self.sync(conn)
+
+    def sync(self, conn):
+        """Apply graph_changes written since the last sync; returns the number applied"""
+        if self.change_id is None:
+            self.load(conn)
+            return 0
+        changes = conn.execute(
+            'SELECT id, follower_id, following_id, added FROM graph_changes WHERE id > ? ORDER BY id',
+            (self.change_id,)).fetchall()
+        if changes and changes[0][0] > self.change_id + 1:
+            # The entries we missed were pruned
+            self.load(conn)
+            return 0
+        with self._lock:
+            for change_id, follower_id, following_id, added in changes:
+                if change_id <= self.change_id:
+                    continue
+                self._apply(follower_id, following_id, added)
+                self.change_id = change_id
+            self.counts['changes'] += len(changes)
+        return len(changes)
+
+    def _apply(self, follower_id, following_id, added):
+        in_base = self._base_has(follower_id, following_id)
+        plus, minus = (self.added, self.removed) if added else (self.removed, self.added)
+        # Only edges that differ from the base arrays are kept in the overlay
+        if in_base != bool(added):
+            edges = plus.setdefault(follower_id, set())
+            if following_id not in edges:
+                edges.add(following_id)
+                self.overlay_size += 1
+        edges = minus.get(follower_id)
+        if edges and following_id in edges:
+            edges.discard(following_id)
+            self.overlay_size -= 1
+
+    # Reading (callers hold self._lock)
+
+    def _base(self, user_id):
+        if user_id + 1 >= len(self.offsets):
+            return self.targets[0:0]
+        return self.targets[self.offsets[user_id]:self.offsets[user_id + 1]]
+
+    def _base_has(self, follower_id, following_id):
+        if follower_id + 1 >= len(self.offsets):
+            return False
+        start, end = self.offsets[follower_id], self.offsets[follower_id + 1]
+        position = bisect_left(self.targets, following_id, start, end)
+        return position < end and self.targets[position] == following_id
+
+    def _following(self, user_id):
+        base = self._base(user_id)
+        added, removed = self.added.get(user_id), self.removed.get(user_id)
+        if not added and not removed:
+            return base
+        return (set(base) - (removed or set())) | (added or set())
+
+    def following(self, user_id):
+        with self._lock:
+            return sorted(self._following(user_id))
+
+    def recommend(self, user_id, limit=DEFAULT_LIMIT, exclude=()):
+        """Top `limit` (candidate id, mutual connections) two hops out, most mutuals first"""
+        with self._lock:
+            following = self._following(user_id)
+            mutuals = Counter()
+            for other_id in following:
+                mutuals.update(self._following(other_id))
+        self.counts['requests'] += 1
+        for skipped in (user_id, *following, *exclude):
+            mutuals.pop(skipped, None)
+        return nlargest(limit, mutuals.items(), key=lambda item: (item[1], -item[0]))
+
+    def stats(self):
+        return {
+            **self.counts,
+            'users': len(self.offsets) - 1,
+            'edges': len(self.targets),
+            'overlay_edges': self.overlay_size,
+            'change_id': self.change_id,
+            'loaded_at': self.loaded_at,
+        }
+
+
+def excluded_users(conn, user_id):
+    """Users with a pending request from this user, or who blocked or were blocked by them"""
+    return {row[0] for row in conn.execute('''
+        SELECT following_id FROM user_connections WHERE follower_id = ?
+        UNION
+        SELECT follower_id FROM user_connections WHERE following_id = ? AND connection_type = 'blocked'
+    ''', (user_id, user_id))}
+
+
+def recommend(graph, conn, user_id, limit=DEFAULT_LIMIT):
+    """Recommendations with usernames, after catching the graph up with the change log"""
+    graph.sync(conn)
+    top = graph.recommend(user_id, limit, excluded_users(conn, user_id))
+    names = dict(conn.execute(
+        f"SELECT id, username FROM users WHERE id IN ({', '.join('?' * len(top))})",
+        [candidate for candidate, _ in top]).fetchall()) if top else {}
+    return [{'user_id': candidate, 'username': names[candidate], 'mutual_connections': count}
+            for candidate, count in top if candidate in names]
+
+
+def prune(conn, keep=LOG_KEEP):
+    """Drop all but the newest `keep` change log rows; returns rows deleted"""
+    deleted = conn.execute(
+        'DELETE FROM graph_changes WHERE id <= (SELECT MAX(id) FROM graph_changes) - ?', (keep,)).rowcount
+    conn.commit()
+    return deleted
+
+
+def start_refresher(graph, pool, interval):
+    """Load the graph, then keep it caught up, compacted and the log pruned, on a daemon thread"""
+    def run():
+        while True:
+            try:
+                with pool.connection() as conn:
+                    if graph.change_id is None or graph.overlay_size > COMPACT_AT:
+                        graph.load(conn)
+                        log.info('recommendations.loaded', edges=len(graph.targets))
+                    else:
+                        graph.sync(conn)
+                    prune(conn)
+            except Exception:
+                log.error('recommendations.refresh_failed', exc_info=True)
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name='graph-refresher', daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    conn = sqlite3.connect(args[0] if len(args) > 1 else '../../tournament_app.db')
+    graph = SocialGraph()
+    started = time.perf_counter()
+    graph.load(conn)
+    print(f"Loaded {len(graph.targets)} edge(s) in {time.perf_counter() - started:.2f} s")
+    started = time.perf_counter()
+    results = recommend(graph, conn, int(args[-1]))
+    print(f"Recommended in {(time.perf_counter() - started) * 1000:.1f} ms")
+    for result in results:
+        print(f"  {result['username']} ({result['user_id']}): {result['mutual_connections']} mutual")
+    conn.close()
@@ -0,0 +1,107 @@
+"""
+Structured, level-gated logging for the backend.
+
+Every line is a JSON object carrying the request id, so one request can be
+followed through the log. Debug lines are dropped before any formatting
+happens unless LOG_LEVEL=DEBUG or the request asked for debug output, and
+handlers gate their diagnostic queries on request_debug() so those only run
+when someone is actually looking.
+
+Per-request debug is enabled with an `X-Debug: 1` header or `?debug=1`,
+and only honoured when the app runs in debug mode or ALLOW_REQUEST_DEBUG=1.
+"""
+
+import datetime
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+
+from flask import g, has_request_context, request
+
+logger = logging.getLogger('backend')
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            'level': record.levelname.lower(),
+            'event': record.getMessage(),
+        }
+        if has_request_context():
+            entry['request_id'] = g.get('request_id')
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure(level=None):
+    level = (level or os.environ.get('LOG_LEVEL', 'INFO')).upper()
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter())
+    logger.handlers[:] = [handler]
+    logger.setLevel(level)
+    logger.propagate = False
+
+
+def request_debug():
+    """True when the current request asked for debug output"""
+    return has_request_context() and g.get('debug', False)
+
+
+def debug_enabled():
+    return request_debug() or logger.isEnabledFor(logging.DEBUG)
+
+
+def _emit(level, event, fields, exc_info=None):
+    record = logger.makeRecord(logger.name, level, '(backend)', 0, event, None, exc_info)
+    record.fields = fields
+    logger.handle(record)
+
+
+def debug(event, **fields):
+    if debug_enabled():
+        _emit(logging.DEBUG, event, fields)
+
+
+def info(event, **fields):
+    if logger.isEnabledFor(logging.INFO):
+        _emit(logging.INFO, event, fields)
+
+
+def warning(event, **fields):
+    if logger.isEnabledFor(logging.WARNING):
+        _emit(logging.WARNING, event, fields)
+
+
+def error(event, exc_info=False, **fields):
+    if logger.isEnabledFor(logging.ERROR):
+        _emit(logging.ERROR, event, fields, sys.exc_info() if exc_info else None)
+
+
+def init_app(app):
+    """Assign request ids, honour debug requests and log one access line per request"""
+    configure()
+    allow_debug = os.environ.get('ALLOW_REQUEST_DEBUG') == '1'
+
+    @app.before_request
+    def start_request():
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        g.started = time.perf_counter()
+        wanted = request.headers.get('X-Debug') == '1' or request.args.get('debug') == '1'
+        g.debug = wanted and (allow_debug or app.debug)
+
+    @app.after_request
+    def finish_request(response):
+        response.headers['X-Request-ID'] = g.request_id
+        info('request',
+             method=request.method,
+             path=request.path,
+             endpoint=request.endpoint,
+             status=response.status_code,
+             duration_ms=round((time.perf_counter() - g.started) * 1000, 3))
+        return response
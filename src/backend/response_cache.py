@@ -0,0 +1,156 @@
+"""
+Response cache with ETag / conditional GET for read-heavy endpoints.
+
+Each cached view declares the version scopes it depends on, e.g.
+('participants', tournament_id) and ('users', 0). Triggers (migration 4)
+bump a scope's row in cache_versions on every write, from any process, so
+one primary-key lookup tells us whether a cached body is still current.
+
+The ETag is derived from the request (path, query string, Accept) and the
+scope versions, so If-None-Match is answered with 304 before the view's
+query runs or anything is serialized. Bodies up to MAX_BODY_BYTES are kept
+in an in-process LRU; larger (streamed) bodies are passed through uncached.
+"""
+
+import functools
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from flask import Response, request
+
+from db_pool import get_db_connection
+
+MAX_ENTRIES = 2048
+MAX_BODY_BYTES = 1024 * 1024
+KEPT_HEADERS = ('Content-Type', 'X-Next-Cursor')
+
+
+class ResponseCache:
+    def __init__(self, max_entries=MAX_ENTRIES, max_body_bytes=MAX_BODY_BYTES):
+        self.max_entries = max_entries
+        self.max_body_bytes = max_body_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.uncacheable = 0
+
+    def get(self, key, etag):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != etag:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, etag, status, headers, body):
+        with self._lock:
+            self._entries[key] = (etag, status, headers, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def count_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def count_uncacheable(self):
+        with self._lock:
+            self.uncacheable += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified,
+                'uncacheable': self.uncacheable,
+            }
+
+
+response_cache = ResponseCache()
+
+
+def read_versions(conn, scopes):
+    clauses = ' OR '.join('(scope = ? AND scope_id = ?)' for _ in scopes)
+    params = [value for scope in scopes for value in scope]
+    rows = conn.execute(f'SELECT scope, scope_id, version FROM cache_versions WHERE {clauses}', params)
+    found = {(row[0], str(row[1])): row[2] for row in rows}
+    return [found.get((scope, str(scope_id)), 0) for scope, scope_id in scopes]
+
+
+def _capture(iterable, on_complete, limit):
+    """Pass chunks through, handing the whole body to on_complete if it stays small"""
+    chunks = []
+    size = 0
+    for chunk in iterable:
+        if chunks is not None:
+            size += len(chunk)
+            if size > limit:
+                chunks = None
+                response_cache.count_uncacheable()
+            else:
+                chunks.append(chunk)
+        yield chunk
+    if chunks is not None:
+        on_complete(b''.join(chunks))
+
+
+def cached(dependencies):
+    """Cache a GET view; dependencies(**view_args) returns its (scope, id) pairs"""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(**view_args):
+            scopes = dependencies(**view_args)
+            try:
+                versions = read_versions(get_db_connection(), scopes)
+            except sqlite3.OperationalError:
+                # Database not migrated to version 4 yet: serve uncached
+                return view(**view_args)
+
+            key = (request.path, request.query_string, request.headers.get('Accept', ''))
+            digest = hashlib.sha1(repr((key, versions)).encode()).hexdigest()
+            etag = f'"{digest}"'
+
+            if request.if_none_match.contains_weak(digest):
+                response_cache.count_not_modified()
+                return Response(status=304, headers={'ETag': etag})
+
+            entry = response_cache.get(key, etag)
+            if entry is not None:
+                _, status, headers, body = entry
+                return Response(body, status=status, headers=headers)
+
+            response = view(**view_args)
+            if isinstance(response, tuple) or response.status_code != 200:
+                return response
+
+            headers = [(name, response.headers[name]) for name in KEPT_HEADERS if name in response.headers]
+            headers.append(('ETag', etag))
+            response.headers['ETag'] = etag
+
+            def store(body):
+                response_cache.put(key, etag, 200, headers, body)
+
+            if response.is_streamed:
+                response.response = _capture(response.iter_encoded(), store, response_cache.max_body_bytes)
+            else:
+                body = response.get_data()
+                if len(body) <= response_cache.max_body_bytes:
+                    store(body)
+                else:
+                    response_cache.count_uncacheable()
+            return response
+        return wrapper
+    return decorator
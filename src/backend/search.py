@@ -0,0 +1,137 @@
+"""
+Full-text search over tournaments, discussions and replies.
+
+Each source has an external-content FTS5 index (migration 10) that
+triggers keep in step with its base table. A search runs one MATCH per
+source, each ordered by its BM25 `rank` and cut at the page size, and
+merges them by score; pages continue from a (score, source, id) keyset
+cursor, so a deep page costs about the same as the first.
+
+Free text is turned into an FTS5 query by quoting every word (user input
+can never inject query syntax) and matching all of them; `word*` is a
+prefix match, and so is the last word, which makes search-as-you-type work.
+
+Rebuild the indexes of an existing database, or after bulk edits done with
+the triggers dropped:
+
+    python search.py [database]
+"""
+
+import json
+import re
+import sqlite3
+import sys
+
+MAX_TERMS = 10
+SNIPPET_TOKENS = 12
+# Marks around matched terms in snippets; plain text, safe to render
+HIGHLIGHT = ('[', ']')
+
+# name: (FTS table, base table join, result columns)
+SOURCES = {
+    'tournament': ('tournaments_fts', 'tournaments t ON t.id = tournaments_fts.rowid',
+                   't.id AS tournament_id, NULL AS discussion_id, t.title AS title'),
+    'discussion': ('discussions_fts', 'tournament_discussions d ON d.id = discussions_fts.rowid',
+                   'd.tournament_id AS tournament_id, d.id AS discussion_id, d.title AS title'),
+    'reply': ('replies_fts', """discussion_replies r ON r.id = replies_fts.rowid
+                   JOIN tournament_discussions d ON d.id = r.discussion_id""",
+              'd.tournament_id AS tournament_id, r.discussion_id AS discussion_id, d.title AS title'),
+}
+TERM = re.compile(r'(\w+)(\*?)')
+
+
+class InvalidSearch(ValueError):
+    """Empty or unusable search text, unknown type"""
+
+
+def build_query(text):
+    """FTS5 MATCH expression for free text: all words, quoted; `*` and the last word are prefixes"""
+    terms = TERM.findall(text or '')
+    if not terms:
+        raise InvalidSearch('q must contain at least one word')
+    if len(terms) > MAX_TERMS:
+        raise InvalidSearch(f'at most {MAX_TERMS} words per search')
+    last = len(terms) - 1
+    return ' '.join(f'"{word}"' + ('*' if star or i == last else '')
+                    for i, (word, star) in enumerate(terms))
+
+
+def parse_types(value):
+    if not value:
+        return list(SOURCES)
+    types = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in types if name not in SOURCES]
+    if unknown:
+        raise InvalidSearch(f"unknown type(s): {', '.join(unknown)}")
+    return [name for name in SOURCES if name in types]
+
+
+def search(conn, text, types=None, limit=20, after=None):
+    """One page of results, best first; `after` is the previous page's last (score, source, id)"""
+    query = build_query(text)
+    names = [name for name in SOURCES if not types or name in types]
+
+    # Ranking: per source, the next limit + 1 hits by (rank, rowid), merged by score
+    branches = []
+    params = {'query': query, 'fetch': limit + 1}
+    if after is not None:
+        params['score'], params['source'], params['id'] = after
+    for name in names:
+        fts = SOURCES[name][0]
+        index = list(SOURCES).index(name)
+        keyset = f'AND (rank, {index}, rowid) > (:score, :source, :id)' if after is not None else ''
+        branches.append(f"""
+            SELECT * FROM (
+                SELECT '{name}' AS type, {index} AS source, rank AS score, rowid AS id
+                FROM {fts} WHERE {fts} MATCH :query {keyset}
+                ORDER BY rank, rowid LIMIT :fetch
+            )""")
+    hits = conn.execute(f"""
+        SELECT * FROM ({' UNION ALL '.join(branches)})
+        ORDER BY score, source, id
+        LIMIT :fetch
+    """, params).fetchall()
+    more, hits = len(hits) > limit, hits[:limit]
+
+    # Snippets and base-table fields for the page only
+    details = {}
+    for name in {hit['type'] for hit in hits}:
+        fts, join, columns = SOURCES[name]
+        ids = [hit['id'] for hit in hits if hit['type'] == name]
+        for row in conn.execute(f"""
+            SELECT {fts}.rowid AS id, {columns},
+                   snippet({fts}, -1, ?, ?, '…', ?) AS snippet
+            FROM {fts} JOIN {join}
+            WHERE {fts} MATCH ? AND {fts}.rowid IN (SELECT value FROM json_each(?))
+        """, (*HIGHLIGHT, SNIPPET_TOKENS, query, json.dumps(ids))):
+            details[(name, row['id'])] = row
+
+    results = []
+    for hit in hits:
+        row = details.get((hit['type'], hit['id']))
+        if row is None:
+            continue
+        results.append({
+            'type': hit['type'], 'id': hit['id'], 'tournament_id': row['tournament_id'],
+            'discussion_id': row['discussion_id'], 'title': row['title'], 'snippet': row['snippet'],
+            'score': hit['score'],
+        })
+    cursor = (hits[-1]['score'], hits[-1]['source'], hits[-1]['id']) if more else None
+    return results, cursor
+
+
+def rebuild(conn):
+    """Re-read every FTS index from its base table and merge its segments"""
+    for fts, _, _ in SOURCES.values():
+        conn.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+        conn.execute(f"INSERT INTO {fts} ({fts}) VALUES ('optimize')")
+    conn.commit()
+
+
+if __name__ == '__main__':
+    conn = sqlite3.connect(sys.argv[1] if len(sys.argv) > 1 else '../../tournament_app.db')
+    rebuild(conn)
+    for name, (fts, _, _) in SOURCES.items():
+        count = conn.execute(f'SELECT COUNT(*) FROM {fts}').fetchone()[0]
+        print(f"{fts}: {count} {name} row(s) indexed")
+    conn.close()
@@ -0,0 +1,104 @@
+"""
+Materialized standings and the global leaderboard.
+
+tournament_standings (per tournament) and leaderboard (all tournaments) hold
+one row per player with played/wins/losses and scores for and against. The
+match handlers apply each result as a delta in their own transaction: +1
+for a reported match, -1 for a deleted one, and both for an update, so a
+standings page is an index range scan instead of an aggregation over
+match_results. Wins and losses follow the stored winner_id.
+
+rebuild() recomputes everything from match_results (run it once after
+migration 5, or whenever the tables are suspected to have drifted):
+
+    python standings.py [database]
+"""
+
+import sqlite3
+import sys
+from collections import defaultdict
+
+# table: primary key columns
+TABLES = {
+    'tournament_standings': ('tournament_id', 'user_id'),
+    'leaderboard': ('user_id',),
+}
+
+STAT_COLUMNS = ('played', 'wins', 'losses', 'score_for', 'score_against', 'score_diff')
+# match_results columns a delta is computed from
+MATCH_COLUMNS = ('tournament_id', 'player1_id', 'player2_id', 'winner_id', 'score_player1', 'score_player2')
+
+
+def match_deltas(match, sign=1):
+    """Per-player stat deltas for one match row (mapping or Row with backend column names)"""
+    player1_id, player2_id = match['player1_id'], match['player2_id']
+    score1, score2 = match['score_player1'] or 0, match['score_player2'] or 0
+    for user_id, scored, conceded in ((player1_id, score1, score2), (player2_id, score2, score1)):
+        won = 1 if match['winner_id'] == user_id else 0
+        yield match['tournament_id'], user_id, (
+            sign, sign * won, sign * (1 - won), sign * scored, sign * conceded, sign * (scored - conceded))
+
+
+def apply(conn, changes):
+    """Apply (match, sign) pairs to both tables in the caller's transaction"""
+    per_tournament = defaultdict(lambda: [0] * len(STAT_COLUMNS))
+    per_user = defaultdict(lambda: [0] * len(STAT_COLUMNS))
+    for match, sign in changes:
+        for tournament_id, user_id, delta in match_deltas(match, sign):
+            for totals in (per_tournament[(int(tournament_id), user_id)], per_user[(user_id,)]):
+                for i, value in enumerate(delta):
+                    totals[i] += value
+
+    for table, deltas in (('tournament_standings', per_tournament), ('leaderboard', per_user)):
+        keys = TABLES[table]
+        rows = [key + tuple(totals) for key, totals in deltas.items() if any(totals)]
+        if not rows:
+            continue
+        columns = ', '.join(keys + STAT_COLUMNS)
+        marks = ', '.join('?' for _ in keys + STAT_COLUMNS)
+        updates = ', '.join(f'{column} = {column} + excluded.{column}' for column in STAT_COLUMNS)
+        conn.executemany(f'''
+            INSERT INTO {table} ({columns}) VALUES ({marks})
+            ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {updates}
+        ''', rows)
+        # Players whose last match was removed drop out of the table
+        match_key = ' AND '.join(f'{column} = ?' for column in keys)
+        conn.executemany(f'DELETE FROM {table} WHERE {match_key} AND played <= 0',
+                         [row[:len(keys)] for row in rows])
+
+
+def rebuild(conn):
+    """Recompute both tables from match_results in one transaction"""
+    columns = ', '.join(STAT_COLUMNS)
+    conn.execute('DELETE FROM tournament_standings')
+    conn.execute('DELETE FROM leaderboard')
+    conn.execute(f'''
+        INSERT INTO tournament_standings (tournament_id, user_id, {columns})
+        SELECT tournament_id, user_id, COUNT(*), SUM(won), COUNT(*) - SUM(won),
+               SUM(scored), SUM(conceded), SUM(scored) - SUM(conceded)
+        FROM (
+            SELECT tournament_id, player1_id AS user_id, winner_id = player1_id AS won,
+                   COALESCE(score_player1, 0) AS scored, COALESCE(score_player2, 0) AS conceded
+            FROM match_results
+            UNION ALL
+            SELECT tournament_id, player2_id, winner_id = player2_id,
+                   COALESCE(score_player2, 0), COALESCE(score_player1, 0)
+            FROM match_results
+        )
+        GROUP BY tournament_id, user_id
+    ''')
+    conn.execute(f'''
+        INSERT INTO leaderboard (user_id, {columns})
+        SELECT user_id, SUM(played), SUM(wins), SUM(losses), SUM(score_for), SUM(score_against), SUM(score_diff)
+        FROM tournament_standings
+        GROUP BY user_id
+    ''')
+    conn.commit()
+
+
+if __name__ == '__main__':
+    conn = sqlite3.connect(sys.argv[1] if len(sys.argv) > 1 else '../../tournament_app.db')
+    rebuild(conn)
+    count = conn.execute('SELECT COUNT(*) FROM leaderboard').fetchone()[0]
+    print(f"Standings rebuilt: {count} player(s) on the leaderboard")
+    conn.close()
@@ -0,0 +1,57 @@
+"""
+Streaming JSON responses.
+
+Rows are encoded one at a time straight from the sqlite3 cursor and sent in
+~64 KB chunks, so neither the row list, a list of dicts nor the full JSON
+string is ever held in memory. The format follows the Accept header: a JSON
+array by default, or newline-delimited JSON for application/x-ndjson.
+"""
+
+import json
+
+from flask import Response, request, stream_with_context
+
+CHUNK_SIZE = 64 * 1024
+NDJSON_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+
+def wants_ndjson():
+    best = request.accept_mimetypes.best_match(('application/json',) + NDJSON_TYPES)
+    return best in NDJSON_TYPES
+
+
+def _encode(items, opener, separator, closer, terminator=''):
+    buffer = [opener]
+    size = len(opener)
+    for index, item in enumerate(items):
+        piece = json.dumps(item, separators=(',', ':')) + terminator
+        buffer.append(separator + piece if index else piece)
+        size += len(piece) + 1
+        if size >= CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    buffer.append(closer)
+    yield ''.join(buffer)
+
+
+def iter_json_array(items):
+    return _encode(items, '[', ',', ']')
+
+
+def iter_ndjson(items):
+    return _encode(items, '', '', '', terminator='\n')
+
+
+def stream_response(rows, fields=None, headers=None):
+    """Stream rows (sqlite3.Row or dicts) as a JSON array or NDJSON"""
+    if fields is None:
+        items = (dict(row) for row in rows)
+    else:
+        items = ({name: row[name] for name in fields} for row in rows)
+
+    if wants_ndjson():
+        body, mimetype = iter_ndjson(items), 'application/x-ndjson'
+    else:
+        body, mimetype = iter_json_array(items), 'application/json'
+    return Response(stream_with_context(body), mimetype=mimetype, headers=headers)
@@ -0,0 +1,173 @@
+"""
+Username -> user id lookups with an in-process LRU/TTL cache.
+
+The write handlers resolve player/author names before doing any real work;
+the cache saves that round trip. Entries are only written after the
+transaction that resolved, created or renamed the user has committed, so a
+rolled back insert never leaves a dangling id behind: the functions below
+only fill the cache outside a transaction, and the write handlers put the
+ids they resolved once their write has committed. The TTL bounds staleness
+from writers outside this process (e.g. the Node backend).
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+INSERT_USER = '''
+    INSERT INTO users (username, email, password_hash)
+    VALUES (?, ?, 'demo_hash')
+    ON CONFLICT (username) DO NOTHING
+    RETURNING id
+'''
+
+
+class UsernameCache:
+    """Bounded, thread-safe LRU mapping username -> user id with expiry"""
+
+    def __init__(self, maxsize=10000, ttl=300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, username):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None or entry[1] < now:
+                if entry is not None:
+                    del self._entries[username]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(username)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, username, user_id):
+        with self._lock:
+            self._entries[username] = (user_id, time.monotonic() + self.ttl)
+            self._entries.move_to_end(username)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, username):
+        with self._lock:
+            self._entries.pop(username, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+username_cache = UsernameCache()
+
+
+def lookup_user_id(conn, username):
+    """User id for username, or None if no such user"""
+    user_id = username_cache.get(username)
+    if user_id is not None:
+        return user_id
+
+    row = conn.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone()
+    if row is None:
+        return None
+    # Inside a transaction the row may be our own uncommitted insert
+    if not conn.in_transaction:
+        username_cache.put(username, row[0])
+    return row[0]
+
+
+def get_or_create_user(conn, username):
+    """Resolve username to an id, creating a placeholder user if needed.
+
+    Returns (user_id, created). Existing users cost one cached lookup or
+    SELECT. New users are created with a single
+    INSERT ... ON CONFLICT (username) DO NOTHING RETURNING statement, so two
+    requests racing on the same new name both end up with the same row
+    instead of one failing on the UNIQUE constraint, and no email probing is
+    needed. Callers should username_cache.put() the id once their
+    transaction commits.
+    """
+    user_id = lookup_user_id(conn, username)
+    if user_id is not None:
+        return user_id, False
+
+    email = f'{username}@example.com'
+    try:
+        rows = conn.execute(INSERT_USER, (username, email)).fetchall()
+    except sqlite3.IntegrityError:
+        # The address belongs to a different user; a random suffix won't collide
+        email = f'{username}.{uuid.uuid4().hex[:12]}@example.com'
+        rows = conn.execute(INSERT_USER, (username, email)).fetchall()
+    if rows:
+        return rows[0][0], True
+
+    # Another request created the name since our lookup: use its row
+    user_id = conn.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone()[0]
+    return user_id, False
+
+
+def get_or_create_users(conn, usernames):
+    """Set-based get_or_create_user for bulk imports.
+
+    Returns ({username: user_id}, [(username, user_id) created]). Known
+    names are resolved with one query, the missing ones inserted with one
+    executemany, and only names whose default email is taken fall back to
+    get_or_create_user. Nothing is cached: even "existing" rows may be
+    uncommitted inserts of the same transaction, so callers put the
+    resolved ids once it commits.
+    """
+    names = list(dict.fromkeys(name for name in usernames if name))
+    resolved = {}
+    missing = []
+    for name in names:
+        user_id = username_cache.get(name)
+        if user_id is None:
+            missing.append(name)
+        else:
+            resolved[name] = user_id
+    if not missing:
+        return resolved, []
+
+    select_ids = 'SELECT username, id FROM users WHERE username IN (SELECT value FROM json_each(?))'
+    for username, user_id in conn.execute(select_ids, (json.dumps(missing),)):
+        resolved[username] = user_id
+    new_names = [name for name in missing if name not in resolved]
+
+    created = []
+    if new_names:
+        conn.executemany('''
+            INSERT OR IGNORE INTO users (username, email, password_hash)
+            VALUES (?, ?, 'demo_hash')
+        ''', ((name, f'{name}@example.com') for name in new_names))
+        for username, user_id in conn.execute(select_ids, (json.dumps(new_names),)):
+            resolved[username] = user_id
+            created.append((username, user_id))
+        for name in new_names:
+            if name not in resolved:
+                user_id, was_created = get_or_create_user(conn, name)
+                resolved[name] = user_id
+                if was_created:
+                    created.append((name, user_id))
+    return resolved, created
@@ -0,0 +1,189 @@
+"""
+Group commit for request writes.
+
+SQLite has a single writer. When every handler commits its own
+transaction, concurrent writers queue on the database lock: each polls
+with busy_timeout's backoff sleeps, then pays for a commit of its own.
+
+Handlers instead pass their write to WriteQueue.run(operation, *args), or
+a single statement to WriteQueue.execute(sql, parameters). One
+writer thread owns a dedicated connection, takes everything queued (up to
+BATCH_SIZE operations) and runs it as one BEGIN IMMEDIATE transaction,
+each operation inside its own savepoint:
+
+  - an operation that raises is rolled back to its savepoint and the
+    exception is re-raised in the handler that submitted it; the rest of
+    the group still commits;
+  - operations queued while a group commits make up the next group, so
+    groups grow with the load and an idle server adds no delay;
+  - run() returns the operation's result only once its group committed,
+    so handlers publish events and fill caches afterwards exactly as
+    before. If BEGIN or COMMIT fails, every operation in the group gets
+    that error.
+
+Operations receive the writer's connection as their first argument. They
+must not commit or roll back, and should be short: the queue is strictly
+serial. They run on the writer thread, outside the request context.
+Bulk imports read and validate their whole body before submitting, so
+the queue only ever waits on database work. Background workers
+(notifications, counter repair, timeline trimming) and other processes
+keep their own connections; busy_timeout orders them with the writer.
+"""
+
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
+
+import request_log as log
+
+BATCH_SIZE = 256
+MAX_QUEUE = 10000
+TIMEOUT = 30.0
+
+_STOP = object()
+
+
+class WriterStopped(RuntimeError):
+    """The writer thread is not running; nothing can be queued"""
+
+# What execute() hands back: rows from RETURNING (or a SELECT), rowcount, lastrowid
+Result = namedtuple('Result', 'rows rowcount lastrowid')
+
+
+def _execute(conn, sql, parameters):
+    cursor = conn.execute(sql, parameters)
+    return Result(cursor.fetchall(), cursor.rowcount, cursor.lastrowid)
+
+
+class WriteQueue:
+    def __init__(self, connect, batch_size=BATCH_SIZE, max_queue=MAX_QUEUE, timeout=TIMEOUT):
+        self.connect = connect
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.queue = queue.Queue(max_queue)
+        self.thread = None
+        self.counts = {'operations': 0, 'failed': 0, 'cancelled': 0, 'groups': 0, 'failed_groups': 0,
+                       'largest_group': 0}
+        self._commit_seconds = 0.0
+
+    def submit(self, operation, *args):
+        """Queue operation(conn, *args); returns a Future for its result"""
+        if self.thread is None or not self.thread.is_alive():
+            raise WriterStopped('database writer is not running')
+        future = Future()
+        self.queue.put((operation, args, future), timeout=self.timeout)
+        return future
+
+    def run(self, operation, *args):
+        """Run operation(conn, *args) in the next group; returns its result once committed"""
+        future = self.submit(operation, *args)
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            if future.cancel():
+                raise
+        # Already running: it is about to commit or fail, report which
+        return future.result()
+
+    def execute(self, sql, parameters=()):
+        """Run a single statement in the next group; returns a Result once committed"""
+        return self.run(_execute, sql, parameters)
+
+    def start(self):
+        conn = self.connect()
+        # Transactions are managed explicitly: BEGIN IMMEDIATE per group
+        conn.isolation_level = None
+        self.thread = threading.Thread(target=self._run, args=(conn,), name='db-writer', daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def stop(self, timeout=5.0):
+        """Write everything queued so far and stop the writer"""
+        if self.thread is not None:
+            self.queue.put(_STOP)
+            self.thread.join(timeout)
+            self.thread = None
+
+    def _run(self, conn):
+        stopping = False
+        while not stopping:
+            group = [self.queue.get()]
+            while len(group) < self.batch_size:
+                try:
+                    group.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if any(item is _STOP for item in group):
+                stopping = True
+                group = [item for item in group if item is not _STOP]
+            if not group:
+                continue
+            try:
+                self._write(conn, group)
+            except Exception as e:
+                # Keep the writer alive; whoever is still waiting gets the error
+                log.error('write_queue.writer_error', exc_info=True, operations=len(group))
+                for _, _, future in group:
+                    if not future.done():
+                        future.set_exception(e)
+        conn.close()
+
+    def _write(self, conn, group):
+        outcomes = []
+        started = time.perf_counter()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for operation, args, future in group:
+                # False once run() gave up on it: skip, it must not be written
+                if not future.set_running_or_notify_cancel():
+                    outcomes.append(None)
+                    continue
+                conn.execute('SAVEPOINT operation')
+                try:
+                    outcomes.append((True, operation(conn, *args)))
+                except Exception as e:
+                    conn.execute('ROLLBACK TO operation')
+                    outcomes.append((False, e))
+                conn.execute('RELEASE operation')
+            conn.execute('COMMIT')
+        except Exception as e:
+            # Nothing in the group was written
+            try:
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+            except Exception:
+                pass
+            log.error('write_queue.group_failed', exc_info=True, operations=len(group))
+            self.counts['failed_groups'] += 1
+            for _, _, future in group:
+                if not future.done():
+                    self.counts['failed'] += 1
+                    future.set_exception(e)
+            return
+
+        self._commit_seconds += time.perf_counter() - started
+        written = sum(outcome is not None for outcome in outcomes)
+        self.counts['groups'] += 1
+        self.counts['operations'] += written
+        self.counts['cancelled'] += len(group) - written
+        self.counts['largest_group'] = max(self.counts['largest_group'], written)
+        for (_, _, future), outcome in zip(group, outcomes):
+            if outcome is None:
+                continue
+            succeeded, value = outcome
+            if succeeded:
+                future.set_result(value)
+            else:
+                self.counts['failed'] += 1
+                future.set_exception(value)
+
+    def stats(self):
+        groups = self.counts['groups']
+        return {
+            **self.counts,
+            'pending': self.queue.qsize(),
+            'average_group': round(self.counts['operations'] / groups, 2) if groups else 0.0,
+            'group_ms_avg': round(self._commit_seconds / groups * 1000, 3) if groups else 0.0,
+        }
@@ -1,12 +1,13 @@
-
 import sqlite3
+import sys
 
-# Connect to SQLite DB (creates if not exists)
-conn = sqlite3.connect('tournament_app.db')
-cursor = conn.cursor()
+DATABASE = 'tournament_app.db'
 
-# Create tables
-cursor.executescript("""
+# Versioned schema migrations. Each entry is (version, description, sql) and is
+# applied once, in order, inside its own transaction. The applied version is
+# stored in PRAGMA user_version so re-running this script is a no-op.
+MIGRATIONS = [
+    (1, 'initial schema', """
 CREATE TABLE IF NOT EXISTS users (
     id INTEGER PRIMARY KEY,
     username TEXT UNIQUE NOT NULL,
@@ -124,6 +125,16 @@ CREATE TABLE IF NOT EXISTS tournament_discussions (
     UNIQUE(tournament_id, title)
 );
 
+CREATE TABLE IF NOT EXISTS discussion_replies (
+    id INTEGER PRIMARY KEY,
+    discussion_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (discussion_id) REFERENCES tournament_discussions(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
 CREATE TABLE IF NOT EXISTS notifications (
     id INTEGER PRIMARY KEY,
     user_id INTEGER NOT NULL,
@@ -148,9 +159,698 @@ CREATE TABLE IF NOT EXISTS user_achievements (
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
     FOREIGN KEY (tournament_id) REFERENCES tournaments(id) ON DELETE SET NULL
 );
+"""),
+
+    (2, 'indexes for hot lookup columns', """
+-- users.username already has the UNIQUE autoindex, which also covers "SELECT id"
+
+-- Duplicate-join check and per-tournament participant list
+CREATE INDEX IF NOT EXISTS idx_participants_tournament_user
+    ON tournament_participants (tournament_id, user_id);
+CREATE INDEX IF NOT EXISTS idx_participants_tournament_registered
+    ON tournament_participants (tournament_id, registration_date);
+
+-- Followers / incoming requests, and following / outgoing requests, newest first
+CREATE INDEX IF NOT EXISTS idx_connections_following_type
+    ON user_connections (following_id, connection_type, created_at);
+CREATE INDEX IF NOT EXISTS idx_connections_follower_type
+    ON user_connections (follower_id, connection_type, created_at);
+
+-- Discussion list: pinned first, then newest
+CREATE INDEX IF NOT EXISTS idx_discussions_tournament_pinned
+    ON tournament_discussions (tournament_id, is_pinned, created_at);
+
+-- Replies per discussion in order (also serves the replies_count recount)
+CREATE INDEX IF NOT EXISTS idx_replies_discussion_created
+    ON discussion_replies (discussion_id, created_at);
+
+-- Match history per tournament
+CREATE INDEX IF NOT EXISTS idx_matches_tournament_date
+    ON match_results (tournament_id, match_date);
+"""),
+
+    (3, 'triggers maintaining replies/likes/comments counters', """
+-- Counters are adjusted by +/-1 in the writing transaction instead of being
+-- recounted; counters.py repairs any drift (e.g. from direct edits).
+CREATE INDEX IF NOT EXISTS idx_comments_post ON comments (post_id);
+
+CREATE TRIGGER IF NOT EXISTS trg_replies_count_insert AFTER INSERT ON discussion_replies
+BEGIN
+    UPDATE tournament_discussions SET replies_count = replies_count + 1 WHERE id = NEW.discussion_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_replies_count_delete AFTER DELETE ON discussion_replies
+BEGIN
+    UPDATE tournament_discussions SET replies_count = replies_count - 1 WHERE id = OLD.discussion_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_replies_count_move AFTER UPDATE OF discussion_id ON discussion_replies
+WHEN NEW.discussion_id IS NOT OLD.discussion_id
+BEGIN
+    UPDATE tournament_discussions SET replies_count = replies_count - 1 WHERE id = OLD.discussion_id;
+    UPDATE tournament_discussions SET replies_count = replies_count + 1 WHERE id = NEW.discussion_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_likes_count_insert AFTER INSERT ON post_likes
+BEGIN
+    UPDATE social_posts SET likes_count = likes_count + 1 WHERE id = NEW.post_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_likes_count_delete AFTER DELETE ON post_likes
+BEGIN
+    UPDATE social_posts SET likes_count = likes_count - 1 WHERE id = OLD.post_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_comments_count_insert AFTER INSERT ON comments
+BEGIN
+    UPDATE social_posts SET comments_count = comments_count + 1 WHERE id = NEW.post_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_comments_count_delete AFTER DELETE ON comments
+BEGIN
+    UPDATE social_posts SET comments_count = comments_count - 1 WHERE id = OLD.post_id;
+END;
+
+-- Start from exact values
+UPDATE tournament_discussions SET replies_count = (
+    SELECT COUNT(*) FROM discussion_replies WHERE discussion_id = tournament_discussions.id);
+UPDATE social_posts SET
+    likes_count = (SELECT COUNT(*) FROM post_likes WHERE post_id = social_posts.id),
+    comments_count = (SELECT COUNT(*) FROM comments WHERE post_id = social_posts.id);
+"""),
+
+    (4, 'version counters for the response cache', """
+-- Bumped by triggers on every write, so any process writing the database
+-- invalidates cached responses (see src/backend/response_cache.py).
+CREATE TABLE IF NOT EXISTS cache_versions (
+    scope TEXT NOT NULL,
+    scope_id INTEGER NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (scope, scope_id)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_tournaments_insert AFTER INSERT ON tournaments
+BEGIN
+    INSERT INTO cache_versions (scope, scope_id) VALUES ('tournaments', 0) ON CONFLICT DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_tournaments_update AFTER UPDATE ON tournaments
+BEGIN
+    INSERT INTO cache_versions (scope, scope_id) VALUES ('tournaments', 0) ON CONFLICT DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_tournaments_delete AFTER DELETE ON tournaments
+BEGIN
+    INSERT INTO cache_versions (scope, scope_id) VALUES ('tournaments', 0) ON CONFLICT DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_participants_insert AFTER INSERT ON tournament_participants
+BEGIN
+    INSERT INTO cache_versions (scope, scope_id) VALUES ('participants', NEW.tournament_id) ON CONFLICT DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_participants_update AFTER UPDATE ON tournament_participants
+BEGIN
+    INSERT INTO cache_versions (scope, scope_id) VALUES ('participants', OLD.tournament_id) ON CONFLICT DO UPDATE SET version = version + 1;
+    INSERT INTO cache_versions (scope, scope_id) VALUES ('participants', NEW.tournament_id) ON CONFLICT DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_participants_delete AFTER DELETE ON tournament_participants
+BEGIN
+    INSERT INTO cache_versions (scope, scope_id) VALUES ('participants', OLD.tournament_id) ON CONFLICT DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_matches_insert AFTER INSERT ON match_results
+BEGIN
+    INSERT INTO cache_versions (scope, scope_id) VALUES ('matches', NEW.tournament_id) ON CONFLICT DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_matches_update AFTER UPDATE ON match_results
+BEGIN
+    INSERT INTO cache_versions (scope, scope_id) VALUES ('matches', OLD.tournament_id) ON CONFLICT DO UPDATE SET version = version + 1;
+    INSERT INTO cache_versions (scope, scope_id) VALUES ('matches', NEW.tournament_id) ON CONFLICT DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_matches_delete AFTER DELETE ON match_results
+BEGIN
+    INSERT INTO cache_versions (scope, scope_id) VALUES ('matches', OLD.tournament_id) ON CONFLICT DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_discussions_insert AFTER INSERT ON tournament_discussions
+BEGIN
+    INSERT INTO cache_versions (scope, scope_id) VALUES ('discussions', NEW.tournament_id) ON CONFLICT DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_discussions_update AFTER UPDATE ON tournament_discussions
+BEGIN
+    INSERT INTO cache_versions (scope, scope_id) VALUES ('discussions', OLD.tournament_id) ON CONFLICT DO UPDATE SET version = version + 1;
+    INSERT INTO cache_versions (scope, scope_id) VALUES ('discussions', NEW.tournament_id) ON CONFLICT DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_discussions_delete AFTER DELETE ON tournament_discussions
+BEGIN
+    INSERT INTO cache_versions (scope, scope_id) VALUES ('discussions', OLD.tournament_id) ON CONFLICT DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_users_rename AFTER UPDATE OF username ON users
+BEGIN
+    INSERT INTO cache_versions (scope, scope_id) VALUES ('users', 0) ON CONFLICT DO UPDATE SET version = version + 1;
+END;
+"""),
+
+    (5, 'materialized tournament standings and global leaderboard', """
+-- Maintained by the match handlers (src/backend/standings.py); fill existing
+-- databases once with `python standings.py`.
+CREATE TABLE IF NOT EXISTS tournament_standings (
+    tournament_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    played INTEGER NOT NULL DEFAULT 0,
+    wins INTEGER NOT NULL DEFAULT 0,
+    losses INTEGER NOT NULL DEFAULT 0,
+    score_for INTEGER NOT NULL DEFAULT 0,
+    score_against INTEGER NOT NULL DEFAULT 0,
+    score_diff INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (tournament_id, user_id),
+    FOREIGN KEY (tournament_id) REFERENCES tournaments(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS leaderboard (
+    user_id INTEGER PRIMARY KEY,
+    played INTEGER NOT NULL DEFAULT 0,
+    wins INTEGER NOT NULL DEFAULT 0,
+    losses INTEGER NOT NULL DEFAULT 0,
+    score_for INTEGER NOT NULL DEFAULT 0,
+    score_against INTEGER NOT NULL DEFAULT 0,
+    score_diff INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- Ranking order: wins, then score difference, then points scored
+CREATE INDEX IF NOT EXISTS idx_standings_rank
+    ON tournament_standings (tournament_id, wins, score_diff, score_for, user_id);
+CREATE INDEX IF NOT EXISTS idx_leaderboard_rank
+    ON leaderboard (wins, score_diff, score_for, user_id);
+
+CREATE TRIGGER IF NOT EXISTS trg_version_standings_insert AFTER INSERT ON tournament_standings
+BEGIN
+    INSERT INTO cache_versions (scope, scope_id) VALUES ('standings', NEW.tournament_id) ON CONFLICT DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_standings_update AFTER UPDATE ON tournament_standings
+BEGIN
+    INSERT INTO cache_versions (scope, scope_id) VALUES ('standings', NEW.tournament_id) ON CONFLICT DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_standings_delete AFTER DELETE ON tournament_standings
+BEGIN
+    INSERT INTO cache_versions (scope, scope_id) VALUES ('standings', OLD.tournament_id) ON CONFLICT DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_leaderboard_insert AFTER INSERT ON leaderboard
+BEGIN
+    INSERT INTO cache_versions (scope, scope_id) VALUES ('leaderboard', 0) ON CONFLICT DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_leaderboard_update AFTER UPDATE ON leaderboard
+BEGIN
+    INSERT INTO cache_versions (scope, scope_id) VALUES ('leaderboard', 0) ON CONFLICT DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_leaderboard_delete AFTER DELETE ON leaderboard
+BEGIN
+    INSERT INTO cache_versions (scope, scope_id) VALUES ('leaderboard', 0) ON CONFLICT DO UPDATE SET version = version + 1;
+END;
+"""),
+
+    (6, 'tournament brackets', """
+-- Generated and advanced by src/backend/brackets.py. seeds is the JSON list
+-- of user ids in seed order (Swiss and round-robin rounds are paired from it).
+CREATE TABLE IF NOT EXISTS tournament_brackets (
+    tournament_id INTEGER PRIMARY KEY,
+    format TEXT NOT NULL CHECK (format IN ('single_elimination', 'double_elimination', 'swiss', 'round_robin')),
+    rounds INTEGER NOT NULL,
+    current_round INTEGER NOT NULL DEFAULT 1,
+    seeds TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'active' CHECK (status IN ('active', 'completed')),
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (tournament_id) REFERENCES tournaments(id) ON DELETE CASCADE
+);
+
+-- next_*/loser_* point at the match and slot (1 or 2) the winner/loser moves
+-- to; slots_filled counts resolved feeders, a NULL player in a resolved slot is a bye.
+CREATE TABLE IF NOT EXISTS bracket_matches (
+    id INTEGER PRIMARY KEY,
+    tournament_id INTEGER NOT NULL,
+    bracket TEXT NOT NULL DEFAULT 'main' CHECK (bracket IN ('main', 'losers', 'final')),
+    round INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    player1_id INTEGER,
+    player2_id INTEGER,
+    slots_filled INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'ready', 'completed', 'bye')),
+    winner_id INTEGER,
+    loser_id INTEGER,
+    match_result_id INTEGER,
+    next_match_id INTEGER,
+    next_slot INTEGER,
+    loser_match_id INTEGER,
+    loser_slot INTEGER,
+    FOREIGN KEY (tournament_id) REFERENCES tournament_brackets(tournament_id) ON DELETE CASCADE,
+    FOREIGN KEY (match_result_id) REFERENCES match_results(id) ON DELETE SET NULL,
+    UNIQUE (tournament_id, bracket, round, position)
+);
+
+-- Linking a reported match to its bracket match, and a result back to it
+CREATE INDEX IF NOT EXISTS idx_bracket_matches_ready
+    ON bracket_matches (tournament_id, player1_id, player2_id) WHERE status = 'ready';
+CREATE INDEX IF NOT EXISTS idx_bracket_matches_result
+    ON bracket_matches (match_result_id) WHERE match_result_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_bracket_matches_round
+    ON bracket_matches (tournament_id, round, status);
+
+CREATE TRIGGER IF NOT EXISTS trg_version_brackets_insert AFTER INSERT ON tournament_brackets
+BEGIN
+    INSERT INTO cache_versions (scope, scope_id) VALUES ('bracket', NEW.tournament_id) ON CONFLICT DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_brackets_update AFTER UPDATE ON tournament_brackets
+BEGIN
+    INSERT INTO cache_versions (scope, scope_id) VALUES ('bracket', NEW.tournament_id) ON CONFLICT DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_brackets_delete AFTER DELETE ON tournament_brackets
+BEGIN
+    INSERT INTO cache_versions (scope, scope_id) VALUES ('bracket', OLD.tournament_id) ON CONFLICT DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_bracket_matches_insert AFTER INSERT ON bracket_matches
+BEGIN
+    INSERT INTO cache_versions (scope, scope_id) VALUES ('bracket', NEW.tournament_id) ON CONFLICT DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_bracket_matches_update AFTER UPDATE ON bracket_matches
+BEGIN
+    INSERT INTO cache_versions (scope, scope_id) VALUES ('bracket', NEW.tournament_id) ON CONFLICT DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_bracket_matches_delete AFTER DELETE ON bracket_matches
+BEGIN
+    INSERT INTO cache_versions (scope, scope_id) VALUES ('bracket', OLD.tournament_id) ON CONFLICT DO UPDATE SET version = version + 1;
+END;
+"""),
+
+    (7, 'player ratings and rating history', """
+-- Maintained by the match handlers (src/backend/ratings.py); fill existing
+-- databases once with `python ratings.py`.
+CREATE TABLE IF NOT EXISTS player_ratings (
+    user_id INTEGER PRIMARY KEY,
+    rating REAL NOT NULL,
+    games INTEGER NOT NULL DEFAULT 0,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS rating_history (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    match_result_id INTEGER NOT NULL,
+    rating_before REAL NOT NULL,
+    rating_after REAL NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (match_result_id) REFERENCES match_results(id) ON DELETE CASCADE
+);
+
+-- Single row: stale is set when an edit could not be undone incrementally
+CREATE TABLE IF NOT EXISTS rating_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    stale INTEGER NOT NULL DEFAULT 0,
+    recomputed_at DATETIME
+);
+
+CREATE INDEX IF NOT EXISTS idx_player_ratings_rank ON player_ratings (rating, user_id);
+CREATE INDEX IF NOT EXISTS idx_rating_history_user ON rating_history (user_id, id);
+CREATE INDEX IF NOT EXISTS idx_rating_history_match ON rating_history (match_result_id);
+
+CREATE TRIGGER IF NOT EXISTS trg_version_ratings_insert AFTER INSERT ON player_ratings
+BEGIN
+    INSERT INTO cache_versions (scope, scope_id) VALUES ('ratings', 0) ON CONFLICT DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_ratings_update AFTER UPDATE ON player_ratings
+BEGIN
+    INSERT INTO cache_versions (scope, scope_id) VALUES ('ratings', 0) ON CONFLICT DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_ratings_delete AFTER DELETE ON player_ratings
+BEGIN
+    INSERT INTO cache_versions (scope, scope_id) VALUES ('ratings', 0) ON CONFLICT DO UPDATE SET version = version + 1;
+END;
+"""),
+
+    (8, 'home timelines', """
+-- Written by the post and connection handlers (src/backend/feeds.py); fill
+-- existing databases once with `python feeds.py --rebuild`.
+CREATE TABLE IF NOT EXISTS feed_timelines (
+    user_id INTEGER NOT NULL,
+    post_id INTEGER NOT NULL,
+    author_id INTEGER NOT NULL,
+    PRIMARY KEY (user_id, post_id),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (post_id) REFERENCES social_posts(id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+-- Authors whose posts are pulled at read time instead of fanned out
+CREATE TABLE IF NOT EXISTS feed_pull_authors (
+    user_id INTEGER PRIMARY KEY,
+    since DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- Deleting a post (cascade), and an author's newest posts (pull, backfill)
+CREATE INDEX IF NOT EXISTS idx_feed_timelines_post ON feed_timelines (post_id);
+CREATE INDEX IF NOT EXISTS idx_posts_user ON social_posts (user_id, id);
+"""),
+
+    (9, 'notification grouping and unread counters', """
+-- Written in batches by src/backend/notifications.py. group_key identifies
+-- events that collapse into one notification; event_count is how many did.
+ALTER TABLE notifications ADD COLUMN group_key TEXT;
+ALTER TABLE notifications ADD COLUMN event_count INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE notifications ADD COLUMN actor_id INTEGER;
+
+-- Newest first per user, and the unread row a new burst merges into
+CREATE INDEX IF NOT EXISTS idx_notifications_user ON notifications (user_id, id);
+CREATE INDEX IF NOT EXISTS idx_notifications_unread_group
+    ON notifications (user_id, group_key) WHERE is_read = 0;
+
+CREATE TABLE IF NOT EXISTS notification_counts (
+    user_id INTEGER PRIMARY KEY,
+    unread INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+INSERT OR REPLACE INTO notification_counts (user_id, unread)
+SELECT user_id, COUNT(*) FROM notifications WHERE NOT COALESCE(is_read, 0) GROUP BY user_id;
+
+CREATE TRIGGER IF NOT EXISTS trg_unread_count_insert AFTER INSERT ON notifications
+WHEN NOT COALESCE(NEW.is_read, 0)
+BEGIN
+    INSERT INTO notification_counts (user_id, unread) VALUES (NEW.user_id, 1)
+    ON CONFLICT DO UPDATE SET unread = unread + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_unread_count_delete AFTER DELETE ON notifications
+WHEN NOT COALESCE(OLD.is_read, 0)
+BEGIN
+    UPDATE notification_counts SET unread = unread - 1 WHERE user_id = OLD.user_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_unread_count_read AFTER UPDATE OF is_read ON notifications
+WHEN COALESCE(OLD.is_read, 0) != COALESCE(NEW.is_read, 0)
+BEGIN
+    UPDATE notification_counts SET unread = unread + (CASE WHEN NEW.is_read THEN -1 ELSE 1 END)
+    WHERE user_id = NEW.user_id;
+END;
+"""),
+
+    (10, 'full-text search', """
+-- External-content FTS5 indexes (src/backend/search.py) over the base
+-- tables, kept in sync by the triggers below. Update triggers fire only for
+-- indexed columns, so counter updates never touch the index. Two- and
+-- three-character prefix indexes serve prefix queries; `rank` is BM25 with
+-- per-column weights (titles count most).
+
+CREATE VIRTUAL TABLE IF NOT EXISTS tournaments_fts USING fts5(
+    title, game_type, description,
+    content='tournaments', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+INSERT INTO tournaments_fts (tournaments_fts, rank) VALUES ('rank', 'bm25(10.0, 5.0, 1.0)');
+INSERT INTO tournaments_fts (tournaments_fts) VALUES ('rebuild');
+
+CREATE TRIGGER IF NOT EXISTS trg_fts_tournaments_insert AFTER INSERT ON tournaments
+BEGIN
+    INSERT INTO tournaments_fts (rowid, title, game_type, description) VALUES (NEW.id, NEW.title, NEW.game_type, NEW.description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_fts_tournaments_delete AFTER DELETE ON tournaments
+BEGIN
+    INSERT INTO tournaments_fts (tournaments_fts, rowid, title, game_type, description) VALUES ('delete', OLD.id, OLD.title, OLD.game_type, OLD.description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_fts_tournaments_update AFTER UPDATE OF title, game_type, description ON tournaments
+BEGIN
+    INSERT INTO tournaments_fts (tournaments_fts, rowid, title, game_type, description) VALUES ('delete', OLD.id, OLD.title, OLD.game_type, OLD.description);
+    INSERT INTO tournaments_fts (rowid, title, game_type, description) VALUES (NEW.id, NEW.title, NEW.game_type, NEW.description);
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS discussions_fts USING fts5(
+    title, description,
+    content='tournament_discussions', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+INSERT INTO discussions_fts (discussions_fts, rank) VALUES ('rank', 'bm25(4.0, 1.0)');
+INSERT INTO discussions_fts (discussions_fts) VALUES ('rebuild');
+
+CREATE TRIGGER IF NOT EXISTS trg_fts_discussions_insert AFTER INSERT ON tournament_discussions
+BEGIN
+    INSERT INTO discussions_fts (rowid, title, description) VALUES (NEW.id, NEW.title, NEW.description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_fts_discussions_delete AFTER DELETE ON tournament_discussions
+BEGIN
+    INSERT INTO discussions_fts (discussions_fts, rowid, title, description) VALUES ('delete', OLD.id, OLD.title, OLD.description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_fts_discussions_update AFTER UPDATE OF title, description ON tournament_discussions
+BEGIN
+    INSERT INTO discussions_fts (discussions_fts, rowid, title, description) VALUES ('delete', OLD.id, OLD.title, OLD.description);
+    INSERT INTO discussions_fts (rowid, title, description) VALUES (NEW.id, NEW.title, NEW.description);
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS replies_fts USING fts5(
+    content,
+    content='discussion_replies', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+INSERT INTO replies_fts (replies_fts, rank) VALUES ('rank', 'bm25(1.0)');
+INSERT INTO replies_fts (replies_fts) VALUES ('rebuild');
+
+CREATE TRIGGER IF NOT EXISTS trg_fts_replies_insert AFTER INSERT ON discussion_replies
+BEGIN
+    INSERT INTO replies_fts (rowid, content) VALUES (NEW.id, NEW.content);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_fts_replies_delete AFTER DELETE ON discussion_replies
+BEGIN
+    INSERT INTO replies_fts (replies_fts, rowid, content) VALUES ('delete', OLD.id, OLD.content);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_fts_replies_update AFTER UPDATE OF content ON discussion_replies
+BEGIN
+    INSERT INTO replies_fts (replies_fts, rowid, content) VALUES ('delete', OLD.id, OLD.content);
+    INSERT INTO replies_fts (rowid, content) VALUES (NEW.id, NEW.content);
+END;
+"""),
+
+    (11, 'social graph change log', """
+-- Every change to the accepted follow graph, in commit order, for the
+-- in-memory recommendation graph (src/backend/recommendations.py) of each
+-- process to catch up from. AUTOINCREMENT keeps ids from being reused once
+-- old rows are pruned.
+
+CREATE TABLE IF NOT EXISTS graph_changes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    follower_id INTEGER NOT NULL,
+    following_id INTEGER NOT NULL,
+    added BOOLEAN NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_graph_connection_insert AFTER INSERT ON user_connections
+WHEN NEW.connection_type = 'accepted'
+BEGIN
+    INSERT INTO graph_changes (follower_id, following_id, added) VALUES (NEW.follower_id, NEW.following_id, 1);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_graph_connection_delete AFTER DELETE ON user_connections
+WHEN OLD.connection_type = 'accepted'
+BEGIN
+    INSERT INTO graph_changes (follower_id, following_id, added) VALUES (OLD.follower_id, OLD.following_id, 0);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_graph_connection_update
+AFTER UPDATE OF follower_id, following_id, connection_type ON user_connections
+WHEN OLD.connection_type = 'accepted' OR NEW.connection_type = 'accepted'
+BEGIN
+    INSERT INTO graph_changes (follower_id, following_id, added)
+    SELECT OLD.follower_id, OLD.following_id, 0 WHERE OLD.connection_type = 'accepted';
+    INSERT INTO graph_changes (follower_id, following_id, added)
+    SELECT NEW.follower_id, NEW.following_id, 1 WHERE NEW.connection_type = 'accepted';
+END;
+"""),
+
+    (12, 'indexes for the keyset-paginated list endpoints', """
+-- The sort keys of TOURNAMENT_LIST and USER_LIST in backend_api.py. They keep
+-- the COALESCE (a NULL would drop rows from the cursor comparison), so the
+-- indexes are on the exact same expressions; each page is then an index range
+-- instead of a scan and sort of the whole table.
+CREATE INDEX IF NOT EXISTS idx_tournaments_start_date
+    ON tournaments (COALESCE(start_date, ''), id);
+CREATE INDEX IF NOT EXISTS idx_users_created_at
+    ON users (COALESCE(created_at, ''), id);
+"""),
+
+    (13, 'player-id match results', """
+-- The initial match_results recorded team names; the backend, standings,
+-- ratings and brackets all work on player ids. Rebuild the table with the
+-- player columns. A team name becomes the user registered under it in that
+-- tournament, else the user of that name; names matching neither are kept as
+-- NULL. migrate() runs this with foreign keys off, so dropping the old table
+-- leaves bracket_matches and rating_history alone.
+
+CREATE TABLE match_results_new (
+    id INTEGER PRIMARY KEY,
+    tournament_id INTEGER NOT NULL,
+    player1_id INTEGER,
+    player2_id INTEGER,
+    winner_id INTEGER,
+    score_player1 INTEGER,
+    score_player2 INTEGER,
+    match_date DATETIME,
+    match_round INTEGER DEFAULT 1,
+    match_type TEXT DEFAULT 'standard' CHECK (match_type IN ('standard', 'semifinal', 'final')),
+    FOREIGN KEY (tournament_id) REFERENCES tournaments(id) ON DELETE CASCADE,
+    FOREIGN KEY (player1_id) REFERENCES users(id),
+    FOREIGN KEY (player2_id) REFERENCES users(id),
+    FOREIGN KEY (winner_id) REFERENCES users(id)
+);
+
+CREATE TEMP TABLE match_team_users AS
+SELECT tournament_id, name, COALESCE(
+    (SELECT MIN(tp.user_id) FROM tournament_participants tp
+     WHERE tp.tournament_id = names.tournament_id AND tp.team_name = names.name),
+    (SELECT u.id FROM users u WHERE u.username = names.name)) AS user_id
+FROM (
+    SELECT tournament_id, team1_name AS name FROM match_results
+    UNION SELECT tournament_id, team2_name FROM match_results
+    UNION SELECT tournament_id, winner_name FROM match_results
+) names;
+
+INSERT INTO match_results_new (
+    id, tournament_id, player1_id, player2_id, winner_id,
+    score_player1, score_player2, match_date, match_round, match_type
+)
+SELECT m.id, m.tournament_id, p1.user_id, p2.user_id, w.user_id,
+       m.score_team1, m.score_team2, m.match_date, 1, m.match_type
+FROM match_results m
+LEFT JOIN match_team_users p1 ON p1.tournament_id = m.tournament_id AND p1.name = m.team1_name
+LEFT JOIN match_team_users p2 ON p2.tournament_id = m.tournament_id AND p2.name = m.team2_name
+LEFT JOIN match_team_users w ON w.tournament_id = m.tournament_id AND w.name = m.winner_name;
+
+DROP TABLE match_team_users;
+DROP TABLE match_results;
+ALTER TABLE match_results_new RENAME TO match_results;
+
+CREATE INDEX IF NOT EXISTS idx_matches_tournament_date
+    ON match_results (tournament_id, match_date);
+
+CREATE TRIGGER IF NOT EXISTS trg_version_matches_insert AFTER INSERT ON match_results
+BEGIN
+    INSERT INTO cache_versions (scope, scope_id) VALUES ('matches', NEW.tournament_id) ON CONFLICT DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_matches_update AFTER UPDATE ON match_results
+BEGIN
+    INSERT INTO cache_versions (scope, scope_id) VALUES ('matches', OLD.tournament_id) ON CONFLICT DO UPDATE SET version = version + 1;
+    INSERT INTO cache_versions (scope, scope_id) VALUES ('matches', NEW.tournament_id) ON CONFLICT DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_matches_delete AFTER DELETE ON match_results
+BEGIN
+    INSERT INTO cache_versions (scope, scope_id) VALUES ('matches', OLD.tournament_id) ON CONFLICT DO UPDATE SET version = version + 1;
+END;
+
+-- Standings and ratings were built from results they could not read: redo
+-- the standings here (as standings.rebuild() does) and flag the ratings for
+-- the next full recompute
+DELETE FROM tournament_standings;
+DELETE FROM leaderboard;
+INSERT INTO tournament_standings (tournament_id, user_id, played, wins, losses, score_for, score_against, score_diff)
+SELECT tournament_id, user_id, COUNT(*), SUM(won), COUNT(*) - SUM(won),
+       SUM(scored), SUM(conceded), SUM(scored) - SUM(conceded)
+FROM (
+    SELECT tournament_id, player1_id AS user_id, winner_id = player1_id AS won,
+           COALESCE(score_player1, 0) AS scored, COALESCE(score_player2, 0) AS conceded
+    FROM match_results WHERE player1_id IS NOT NULL
+    UNION ALL
+    SELECT tournament_id, player2_id, winner_id = player2_id,
+           COALESCE(score_player2, 0), COALESCE(score_player1, 0)
+    FROM match_results WHERE player2_id IS NOT NULL
+)
+GROUP BY tournament_id, user_id;
+INSERT INTO leaderboard (user_id, played, wins, losses, score_for, score_against, score_diff)
+SELECT user_id, SUM(played), SUM(wins), SUM(losses), SUM(score_for), SUM(score_against), SUM(score_diff)
+FROM tournament_standings
+GROUP BY user_id;
+INSERT INTO rating_state (id, stale) VALUES (1, 1) ON CONFLICT (id) DO UPDATE SET stale = 1;
+"""),
+
+    (14, 'null-safe keyset indexes for participants, discussions and replies', """
+-- PARTICIPANT_LIST, DISCUSSION_LIST and REPLY_LIST sort on nullable columns.
+-- Like migration 12 their sort keys are COALESCE expressions (a NULL drops
+-- out of the cursor comparison), and these indexes are on the same
+-- expressions, ending in id, so a page is an index range after the equality
+-- on the parent id. They replace the plain-column indexes of migration 2,
+-- whose other uses (per-parent lookups and counts) the leading column covers.
+DROP INDEX IF EXISTS idx_participants_tournament_registered;
+CREATE INDEX IF NOT EXISTS idx_participants_tournament_registered
+    ON tournament_participants (tournament_id, COALESCE(registration_date, ''), id);
+
+DROP INDEX IF EXISTS idx_discussions_tournament_pinned;
+CREATE INDEX IF NOT EXISTS idx_discussions_tournament_pinned
+    ON tournament_discussions (tournament_id, COALESCE(is_pinned, 0), COALESCE(created_at, ''), id);
+
+DROP INDEX IF EXISTS idx_replies_discussion_created;
+CREATE INDEX IF NOT EXISTS idx_replies_discussion_created
+    ON discussion_replies (discussion_id, COALESCE(created_at, ''), id);
+"""),
+]
+
+
+def schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn, target=None):
+    """Apply pending migrations up to target (latest by default), return versions applied"""
+    applied = []
+    current = schema_version(conn)
+    # Table rebuilds (migration 13) must not cascade; this can't change inside a transaction
+    foreign_keys = conn.execute('PRAGMA foreign_keys').fetchone()[0]
+    conn.execute('PRAGMA foreign_keys = OFF')
+
+    try:
+        for version, description, sql in MIGRATIONS:
+            if version <= current or (target is not None and version > target):
+                continue
+            try:
+                conn.executescript(f'BEGIN; {sql}\nPRAGMA user_version = {version}; COMMIT;')
+            except sqlite3.Error:
+                if conn.in_transaction:
+                    conn.rollback()
+                raise
+            applied.append((version, description))
+    finally:
+        conn.execute(f'PRAGMA foreign_keys = {foreign_keys}')
+
+    return applied
+
+
+if __name__ == '__main__':
+    # Connect to SQLite DB (creates if not exists)
+    conn = sqlite3.connect(sys.argv[1] if len(sys.argv) > 1 else DATABASE)
 
-""")
+    for version, description in migrate(conn):
+        print(f"Applied migration {version}: {description}")
+    print(f"Schema is at version {schema_version(conn)}")
 
-# Save and close
-conn.commit()
-conn.close()
+    conn.close()